@@ -1,9 +1,23 @@
 import json
+import time
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator, Dict, List, Optional
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
-from app.models.domain import MatchRequest
+from app.models.domain import MatchRequest, MatchResponse, BatchMatchRequest, BatchMatchResponse
+from app.services.matching import match_queries
+from app.services.tags import tag_filter
+from app.services.concurrency import DependencyOverloaded, saturated_dependency
 from app.services.workflow.graph import vibe_graph
+from app.services.workflow import budget
+from app.core.config import settings
+from app.core.tracing import span
 import logging
+import orjson
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return orjson.dumps(payload) + b"\n"
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -14,58 +28,199 @@ async def chat(request: MatchRequest):
     Streaming chat endpoint that runs the Vibe Matcher LangGraph.
     Returns a stream of JSON events.
     """
-    
-    async def event_generator():
+    # Shed before streaming starts, while a 503 can still be sent
+    limiter = saturated_dependency()
+    if limiter is not None:
+        raise DependencyOverloaded(limiter.name, limiter.retry_after())
+
+    return StreamingResponse(chat_stream(request), media_type="application/x-ndjson")
+
+
+async def chat_stream(request: MatchRequest, mode: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    NDJSON frames for one chat. CHAT_STREAM_MODE "lean" (default) follows
+    only node updates and stylist tokens, coalescing tokens into frames;
+    "events" is the original astream_events filter, one frame per token.
+    The chat span records frames, bytes and process CPU time.
+    The latency budget starts here, so it covers the whole stream.
+    """
+    input_state = {
+        "user_query": request.query,
+        "vibe_filter": tag_filter(request.include_vibes, request.exclude_vibes),
+        **budget.start(request.latency_budget_ms)
+    }
+    mode = mode or settings.CHAT_STREAM_MODE
+    frames = _lean_frames(input_state) if mode == "lean" else _event_frames(input_state)
+    with span("chat", "endpoint", mode=mode) as chat_span:
+        events = 0
+        sent = 0
+        cpu_started = time.process_time()
         try:
-            input_state = {"user_query": request.query}
-            
-            # Using astream_events to capture detailed progress
-            async for event in vibe_graph.astream_events(input_state, version="v1"):
-                kind = event["event"]
-                tags = event.get("tags", [])
-                metadata = event.get("metadata", {})
-                node_name = metadata.get("langgraph_node", "")
-                
-                # 1. Output from Vibe Analyst (Intermediate Step)
-                if kind == "on_chain_end" and node_name == "vibe_analyst":
-                    data = event["data"].get("output")
-                    if data:
-                        yield json.dumps({
-                            "type": "analyst_thoughts",
-                            "data": data.get("analyst_thoughts", "")
-                        }) + "\n"
-                        
-                        # Also yield keywords for debug/ui if needed
-                        yield json.dumps({
-                            "type": "analyst_keywords",
-                            "data": data.get("refined_keywords", [])
-                        }) + "\n"
-                
-                # 2. Output from Retriever
-                elif kind == "on_chain_end" and node_name == "retriever":
-                     data = event["data"].get("output")
-                     if data:
-                        # Yield retrieved products
-                        yield json.dumps({
-                            "type": "retrieved_products",
-                            "data": data.get("retrieved_products", [])
-                        }) + "\n"
-
-                # 3. Stream tokens from Stylist (Final Result)
-                # We want to catch the LLM stream inside the stylist node
-                elif kind == "on_chat_model_stream" and node_name == "stylist":
-                    chunk = event["data"]["chunk"]
-                    if chunk.content:
-                        yield json.dumps({
-                            "type": "token",
-                            "data": chunk.content
-                        }) + "\n"
-                        
+            async for frame in frames:
+                events += 1
+                sent += len(frame)
+                yield frame
+        except DependencyOverloaded as e:
+            logger.warning(f"Streaming shed: {e}")
+            yield _encode({"type": "error", "data": str(e), "retry_after": e.retry_after})
         except Exception as e:
             logger.error(f"Streaming error: {e}")
-            yield json.dumps({
-                "type": "error",
-                "data": str(e)
-            }) + "\n"
+            yield _encode({"type": "error", "data": str(e)})
+        finally:
+            chat_span["events"] = events
+            chat_span["bytes"] = sent
+            # Process-wide, so only meaningful for one chat at a time (benchmarks)
+            chat_span["cpu_ms"] = round((time.process_time() - cpu_started) * 1000, 3)
+
+
+def _node_events(node: str, output: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Client events for a finished graph node.
+    """
+    if not output:
+        return []
+    # 1. Output from Vibe Analyst (Intermediate Step)
+    if node == "vibe_analyst":
+        events = []
+        if output.get("analyst_cache"):
+            events.append({"type": "analyst_cache_hit", "data": output["analyst_cache"]})
+        events.append({"type": "analyst_thoughts", "data": output.get("analyst_thoughts", "")})
+        # Also yield keywords for debug/ui if needed
+        events.append({"type": "analyst_keywords", "data": output.get("refined_keywords", [])})
+        return events
+    # 2. Provisional products from the speculative raw-query search
+    if node == "speculative_retriever":
+        return [{"type": "provisional_products", "data": output.get("provisional_products", [])}]
+    # 3. Output from Retriever (replaces any provisional products)
+    if node == "retriever":
+        event = {"type": "retrieved_products", "data": output.get("retrieved_products", [])}
+        if output.get("retrieval_diversity"):
+            event["diversity"] = output["retrieval_diversity"]
+        return [event]
+    return []
+
+
+async def _lean_frames(input_state: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    Subscribes to node updates and the stylist's stream-writer tokens only.
+    The first token is sent at once (time to first token is what users
+    see); later tokens are buffered until CHAT_TOKEN_FRAME_CHARS characters
+    or CHAT_TOKEN_FRAME_MS after the first buffered one, then sent as one
+    "token" frame. Any other event (node updates, budget_breach) flushes
+    the buffer first.
+    """
+    stream = vibe_graph.astream(input_state, stream_mode=["updates", "custom"]).__aiter__()
+    frame_seconds = settings.CHAT_TOKEN_FRAME_MS / 1000.0
+    buffer: List[str] = []
+    buffered = 0
+    flush_at = 0.0
+    first_token = True
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                # Read ahead in a task so a frame deadline never cancels the graph
+                pending = asyncio.ensure_future(stream.__anext__())
+            if buffer:
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, flush_at - time.perf_counter()))
+                if not done:
+                    yield _encode({"type": "token", "data": "".join(buffer)})
+                    buffer, buffered = [], 0
+                    continue
+            try:
+                stream_mode, chunk = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+
+            # 4. Stream tokens from Stylist (Final Result)
+            if stream_mode == "custom" and chunk.get("type") == "token":
+                if chunk.get("data"):
+                    if not buffer:
+                        flush_at = time.perf_counter() + frame_seconds
+                    buffer.append(chunk["data"])
+                    buffered += len(chunk["data"])
+                    if first_token or buffered >= settings.CHAT_TOKEN_FRAME_CHARS or frame_seconds <= 0:
+                        first_token = False
+                        yield _encode({"type": "token", "data": "".join(buffer)})
+                        buffer, buffered = [], 0
+                continue
 
-    return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+            if buffer:
+                yield _encode({"type": "token", "data": "".join(buffer)})
+                buffer, buffered = [], 0
+            if stream_mode == "custom":
+                # Node events sent through the stream writer (budget_breach)
+                yield _encode(chunk)
+                continue
+            for node, output in chunk.items():
+                for event in _node_events(node, output):
+                    yield _encode(event)
+
+        if buffer:
+            yield _encode({"type": "token", "data": "".join(buffer)})
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(BaseException):
+                await pending
+        await stream.aclose()
+
+
+async def _event_frames(input_state: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    The original path: every LangGraph/LangChain callback event, filtered here.
+    """
+    # Using astream_events to capture detailed progress
+    async for event in vibe_graph.astream_events(input_state, version="v2"):
+        kind = event["event"]
+        metadata = event.get("metadata", {})
+        node_name = metadata.get("langgraph_node", "")
+
+        # Node outputs (match the node's own run, not the prompt/parser runs inside it)
+        if kind == "on_chain_end" and node_name == event.get("name"):
+            for payload in _node_events(node_name, event["data"].get("output")):
+                yield (json.dumps(payload) + "\n").encode("utf-8")
+
+        # The stylist re-dispatches its (possibly shared) LLM stream as
+        # custom events
+        elif kind == "on_custom_event" and event.get("name") == "stylist_token":
+            text = event["data"]["text"]
+            if text:
+                yield (json.dumps({
+                    "type": "token",
+                    "data": text
+                }) + "\n").encode("utf-8")
+
+        # A node missed its share of the latency budget and fell back
+        elif kind == "on_custom_event" and event.get("name") == "budget_breach":
+            yield (json.dumps({"type": "budget_breach", "data": event["data"]}) + "\n").encode("utf-8")
+
+
+@router.post("/match", response_model=MatchResponse)
+async def match(request: MatchRequest):
+    """
+    Retrieval-only match for one query: no stylist pitch, analyst optional.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="query must not be empty")
+    tags = tag_filter(request.include_vibes, request.exclude_vibes)
+    return (await match_queries([request.query], use_analyst=request.use_analyst, top_k=request.top_k, tags=tags))[0]
+
+@router.post("/match/batch", response_model=BatchMatchResponse)
+async def match_batch(request: BatchMatchRequest):
+    """
+    Retrieval-only match for many queries in one call. All queries share
+    batched embedding requests and a single multi-query vector search.
+    """
+    if len(request.queries) > settings.MATCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.MATCH_BATCH_MAX_QUERIES} queries per batch"
+        )
+    if any(not q.strip() for q in request.queries):
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    tags = tag_filter(request.include_vibes, request.exclude_vibes)
+    results = await match_queries(request.queries, use_analyst=request.use_analyst, top_k=request.top_k, tags=tags)
+    return BatchMatchResponse(results=results)
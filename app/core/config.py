@@ -7,14 +7,160 @@ class Settings(BaseSettings):
     
     # OpenAI
     OPENAI_API_KEY: str = "sk-placeholder"
+    # OpenAI-compatible endpoint for embeddings and chat, e.g. the local
+    # stand-in used for load tests (benchmarks.openai_standin); empty = OpenAI
+    OPENAI_BASE_URL: str = ""
     EMBEDDING_MODEL: str = "text-embedding-3-small"
-    
+    # Shorter text-embedding-3 vectors (0 = model default); must match the index
+    EMBEDDING_DIMENSIONS: int = 0
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    # Micro-batching of concurrent query embeddings: uncached texts wait up
+    # to EMBEDDING_BATCH_MAX_WAIT_MS (0 disables) or until
+    # EMBEDDING_BATCH_MAX_SIZE are queued, then share one request.
+    # Larger calls (batch /match, ingestion) are sent as they are.
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5
+    EMBEDDING_BATCH_MAX_SIZE: int = 256
+
+    # Embedding cache (in-process LRU + optional on-disk SQLite store).
+    # EMBEDDING_CACHE_DISK_ENABLED=false keeps it in memory only (an empty
+    # EMBEDDING_CACHE_DB is ignored like any other empty env value)
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL_SECONDS: float = 86400
+    EMBEDDING_CACHE_DISK_ENABLED: bool = True
+    EMBEDDING_CACHE_DB: str = "embedding_cache.db"
+    # Rows past the TTL are never served and are pruned, along with the
+    # oldest rows beyond EMBEDDING_CACHE_DB_MAX_ROWS, at most once a minute
+    EMBEDDING_CACHE_DB_MAX_ROWS: int = 200000
+
+    # Vector store backend: "chroma" or "numpy" (in-process, memory-mapped)
+    VECTOR_BACKEND: str = "chroma"
+    NUMPY_INDEX_DIR: str = "vector_index"
+    # Compressed numpy index: "none", "int8" or "pq" (product quantization).
+    # Compressed scans are re-scored exactly for the top RERANK_CANDIDATES.
+    VECTOR_QUANTIZATION: str = "none"
+    PQ_SUBSPACES: int = 64
+    RERANK_CANDIDATES: int = 100
+
+    # BM25 lexical index over name/desc/vibes, stored next to the vector store.
+    # SEARCH_MODE: "vector", "hybrid" (fuse BM25 and vector scores) or
+    # "prefilter" (vector scan limited to the top BM25 candidates once the
+    # catalog has LEXICAL_PREFILTER_MIN_PRODUCTS; hybrid below that)
+    # Hybrid costs a BM25 lookup per search term plus, for the BM25 hits
+    # the vector top-HYBRID_CANDIDATES missed, one exact scoring pass: in
+    # process on numpy, one extra collection.get per search on Chroma.
+    LEXICAL_INDEX_ENABLED: bool = True
+    SEARCH_MODE: str = "hybrid"
+    HYBRID_LEXICAL_WEIGHT: float = 0.3
+    HYBRID_CANDIDATES: int = 50
+    LEXICAL_PREFILTER_CANDIDATES: int = 2000
+    LEXICAL_PREFILTER_MIN_PRODUCTS: int = 100000
+
     # ChromaDB
     CHROMA_DB_DIR: str = "chroma_db"
     COLLECTION_NAME: str = "fashion_products"
+    # Threads used to run blocking vector store queries off the event loop
+    VECTOR_STORE_MAX_WORKERS: int = 8
+
+    # Retrieval
+    # "multi_query" searches every analyst term and fuses the results,
+    # "combined" joins the terms into one query string.
+    RETRIEVAL_MODE: str = "multi_query"
+    RETRIEVAL_FUSION: str = "rrf"  # "rrf" or "max"
+    RETRIEVAL_TOP_K: int = 3
+    RETRIEVAL_PER_TERM_K: int = 5
+    RETRIEVAL_RRF_K: int = 60
+    # Diversity re-ranking: the best RETRIEVAL_MMR_POOL candidates are
+    # re-ranked by maximal marginal relevance so near-duplicates (two SKUs
+    # of one sneaker) don't fill the top-k. Lambda 1.0 is pure relevance,
+    # lower values favour diversity; a pool <= RETRIEVAL_TOP_K disables it.
+    RETRIEVAL_MMR_LAMBDA: float = 0.7
+    RETRIEVAL_MMR_POOL: int = 50
+    # Search the raw query in parallel with the analyst and stream the
+    # results as provisional_products
+    SPECULATIVE_RETRIEVAL: bool = True
+    ANALYST_TIMEOUT_SECONDS: float = 0  # 0 = no timeout
+    # /chat latency budget per request (MatchRequest.latency_budget_ms
+    # overrides; 0 = none). The analyst gets ANALYST_BUDGET_SHARE of it,
+    # after which retrieval goes ahead on the raw query; the stylist must
+    # finish within the whole budget, or the pitch is completed from a
+    # template. Breaches are logged and streamed as "budget_breach" events.
+    CHAT_LATENCY_BUDGET_MS: int = 15000
+    ANALYST_BUDGET_SHARE: float = 0.35
+
+    # /chat streaming: "lean" follows only node updates and stylist tokens
+    # (LangGraph stream modes), coalescing tokens into frames of up to
+    # CHAT_TOKEN_FRAME_CHARS characters or CHAT_TOKEN_FRAME_MS (0 = a frame
+    # per token); "events" filters the full astream_events firehose
+    CHAT_STREAM_MODE: str = "lean"
+    CHAT_TOKEN_FRAME_MS: float = 25
+    CHAT_TOKEN_FRAME_CHARS: int = 64
+
+    # Retrieval-only /match endpoints
+    MATCH_BATCH_MAX_QUERIES: int = 5000
+    MATCH_EMBED_BATCH_SIZE: int = 2048  # inputs per embeddings request (API max 2048)
+    MATCH_ANALYST_CONCURRENCY: int = 8  # parallel analyst calls when use_analyst is set
+
+    # Upstream protection (per process). OpenAI calls beyond the concurrency
+    # limit queue; a caller finding DEPENDENCY_MAX_QUEUE waiters, or waiting
+    # longer than DEPENDENCY_QUEUE_TIMEOUT_SECONDS, is shed with 503 +
+    # Retry-After. A 429 pauses the dependency for its Retry-After.
+    OPENAI_CHAT_MAX_CONCURRENCY: int = 32
+    OPENAI_EMBEDDING_MAX_CONCURRENCY: int = 32
+    DEPENDENCY_MAX_QUEUE: int = 256
+    DEPENDENCY_QUEUE_TIMEOUT_SECONDS: float = 10
+    # Identical in-flight analyst, embedding and stylist calls share one request
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Semantic cache for Vibe Analyst output
+    ANALYST_CACHE_ENABLED: bool = True
+    ANALYST_CACHE_THRESHOLD: float = 0.92
+    ANALYST_CACHE_MAX_ENTRIES: int = 1000
+    ANALYST_CACHE_TTL_SECONDS: float = 604800
+    ANALYST_CACHE_PERSIST: bool = True  # false keeps it in memory only
+    ANALYST_CACHE_PATH: str = "analyst_cache.npz"
+    ANALYST_CACHE_SAVE_DELAY_SECONDS: float = 5.0  # changes are written at most this often
+
+    # Stylist pitch cache keyed by retrieved product set + analyst keywords;
+    # hits are replayed as token events. Ingestion invalidates pitches of
+    # changed products. PITCH_CACHE_PERSIST=false keeps it in memory only.
+    PITCH_CACHE_ENABLED: bool = True
+    PITCH_CACHE_PERSIST: bool = True
+    PITCH_CACHE_DB: str = "pitch_cache.db"
+    PITCH_CACHE_MAX_ENTRIES: int = 5000
+    PITCH_CACHE_TTL_SECONDS: float = 86400
+
+    # Run mock-catalog ingestion in the background at startup
+    STARTUP_INGESTION: bool = True
+
+    # Streaming ingestion (python -m app.services.ingestion --source catalog.jsonl)
+    INGEST_BATCH_MAX_TOKENS: int = 100000
+    INGEST_BATCH_MAX_ITEMS: int = 1000
+    INGEST_CONCURRENCY: int = 4
+    INGEST_MAX_RETRIES: int = 6
+    INGEST_WRITE_CHUNK_SIZE: int = 500
+    INGEST_CHECKPOINT_PATH: str = "ingest_checkpoint.json"
+
+    # Catalog snapshots (python -m app.services.ingestion export|import DIR):
+    # products are read and written this many at a time
+    SNAPSHOT_PAGE_SIZE: int = 5000
+
+    # Multi-worker deployments (uvicorn --workers N, numpy backend only).
+    # One process at a time holds the ingest lock in SHARED_INDEX_DIR and
+    # writes a new index generation; every worker serves the published
+    # generation read-only (memory-mapped, so workers share the page cache)
+    # and switches to a newer one within SHARED_INDEX_POLL_SECONDS.
+    # Empty keeps the single-process index in NUMPY_INDEX_DIR.
+    SHARED_INDEX_DIR: str = ""
+    SHARED_INDEX_POLL_SECONDS: float = 2.0
+    SHARED_INDEX_KEEP_GENERATIONS: int = 2
     
     # App
     DEBUG_MODE: bool = True
+    # Log every timing span (node, OpenAI call, vector store call) with its
+    # request id. Off by default: a log line per span on every request; the
+    # span durations are always exported as vibe_span_duration_seconds
+    LOG_SPANS: bool = False
     
     model_config = SettingsConfigDict(
         env_file=".env",
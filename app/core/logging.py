@@ -2,6 +2,7 @@ import logging
 import sys
 from pythonjsonlogger import jsonlogger
 from app.core.config import settings
+from app.core.tracing import RequestIdFilter
 
 def setup_logging():
     """
@@ -21,15 +22,17 @@ def setup_logging():
         # For this requirement, "Structured Logging" implies JSON even in debug usually, 
         # but let's stick to JSON for consistency.
         formatter = jsonlogger.JsonFormatter(
-            "%(asctime)s %(levelname)s %(name)s %(message)s"
+            "%(asctime)s %(levelname)s %(name)s %(request_id)s %(message)s"
         )
     else:
         logger.setLevel(logging.INFO)
         formatter = jsonlogger.JsonFormatter(
-            "%(asctime)s %(levelname)s %(name)s %(message)s"
+            "%(asctime)s %(levelname)s %(name)s %(request_id)s %(message)s"
         )
 
     handler.setFormatter(formatter)
+    # Tags every record with the current request id (see app.core.tracing)
+    handler.addFilter(RequestIdFilter())
     logger.addHandler(handler)
     
     # Set log levels for noisy libraries
@@ -0,0 +1,117 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Prometheus metrics, served by /metrics (app.main).
+# Latencies are recorded from app.core.tracing spans.
+
+# 1ms .. 30s: vector queries sit at the bottom, LLM streams at the top
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SPAN_SECONDS = Histogram(
+    "vibe_span_duration_seconds",
+    "Duration of traced operations (graph nodes, OpenAI calls, vector store calls)",
+    ["kind", "name", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "vibe_http_request_duration_seconds",
+    "Time until the response starts (headers sent); streams are covered by the chat span",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+OPENAI_TOKENS = Counter(
+    "vibe_openai_tokens_total",
+    "Tokens reported by OpenAI usage",
+    ["model", "type"],  # type: prompt, completion, embedding
+)
+
+STYLIST_TTFT_SECONDS = Histogram(
+    "vibe_stylist_time_to_first_token_seconds",
+    "Time from the stylist LLM call to its first streamed token",
+    buckets=LATENCY_BUCKETS,
+)
+
+# Upstream protection (app.services.concurrency)
+DEPENDENCY_INFLIGHT = Gauge(
+    "vibe_dependency_inflight",
+    "Calls currently running against an upstream dependency",
+    ["dependency"],
+)
+
+DEPENDENCY_QUEUED = Gauge(
+    "vibe_dependency_queued",
+    "Calls waiting for a dependency slot",
+    ["dependency"],
+)
+
+DEPENDENCY_SHED = Counter(
+    "vibe_dependency_shed_total",
+    "Calls rejected because the dependency queue was full or the wait too long",
+    ["dependency"],
+)
+
+DEPENDENCY_BACKOFF = Counter(
+    "vibe_dependency_backoff_total",
+    "Pauses started by a 429 from the dependency",
+    ["dependency"],
+)
+
+SINGLE_FLIGHT_SHARED = Counter(
+    "vibe_single_flight_shared_total",
+    "Calls served by joining an identical call already in flight",
+    ["call"],  # analyst, embeddings, stylist
+)
+
+# Embedding micro-batcher (app.services.embedding_batcher)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "vibe_embedding_batch_size",
+    "Texts per micro-batched embeddings request",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+
+EMBEDDING_BATCH_FILL = Histogram(
+    "vibe_embedding_batch_fill_ratio",
+    "Micro-batch size as a fraction of EMBEDDING_BATCH_MAX_SIZE",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0),
+)
+
+EMBEDDING_BATCH_QUEUE_SECONDS = Histogram(
+    "vibe_embedding_batch_queue_seconds",
+    "Time a text waited for its micro-batch to be sent",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+EMBEDDING_BATCH_FLUSHES = Counter(
+    "vibe_embedding_batch_flushes_total",
+    "Micro-batches sent, by trigger",
+    ["reason"],  # size, timer, shutdown
+)
+
+PITCH_CACHE_LOOKUPS = Counter(
+    "vibe_pitch_cache_lookups_total",
+    "Stylist pitch cache lookups",
+    ["result"],  # hit, miss
+)
+
+BUDGET_BREACHES = Counter(
+    "vibe_budget_breaches_total",
+    "Graph nodes that missed their share of the /chat latency budget",
+    ["node"],  # vibe_analyst, stylist
+)
+
+
+def record_tokens(model: str, **counts: int):
+    """
+    Adds token counts by type, e.g. record_tokens("gpt-4o", prompt=120, completion=80).
+    """
+    for kind, count in counts.items():
+        if count:
+            OPENAI_TOKENS.labels(model=model, type=kind).inc(count)
+
+
+def render() -> tuple:
+    """
+    Returns (body, content type) in the Prometheus text format.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+
+class StartupTimer:
+    """
+    Records named boot phases (module imports, lifespan steps, background
+    warm-up) so one structured log line shows where cold-start time goes.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "phases_ms": dict(self.phases),
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+        }
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,74 @@
+import time
+import asyncio
+import uuid
+import logging
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator
+
+from app.core.config import settings
+from app.core.metrics import SPAN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Set per HTTP request by the middleware in app.main; "-" outside a request
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps every log record with the current request id.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+@contextmanager
+def span(name: str, kind: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Times a block, records it in the vibe_span_duration_seconds histogram
+    and logs it with the request id.
+
+    Yields a dict the block can add attributes to (token counts, sizes):
+        with span("embeddings.create", "openai", texts=len(texts)) as s:
+            ...
+            s["tokens"] = response.usage.total_tokens
+    """
+    attrs: Dict[str, Any] = dict(attributes)
+    outcome = "ok"
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        outcome = "cancelled" if isinstance(e, (asyncio.CancelledError, GeneratorExit)) else "error"
+        attrs["error"] = repr(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.labels(kind=kind, name=name, outcome=outcome).observe(elapsed)
+        if settings.LOG_SPANS:
+            logger.info(
+                f"span {name} {elapsed * 1000:.1f}ms",
+                extra={"span": {"name": name, "kind": kind, "outcome": outcome,
+                                "duration_ms": round(elapsed * 1000, 3), **attrs}}
+            )
+
+
+def traced_node(name: str):
+    """
+    Wraps an async LangGraph node in a span of kind "node". The wrapper
+    keeps the node's signature, so nodes taking `config` still receive it.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(state, *args, **kwargs):
+            with span(name, "node"):
+                return await func(state, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,31 +1,96 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.core.config import settings
-from app.core.logging import setup_logging
-from app.api.endpoints import router as api_router
-from app.services.ingestion import IngestionPipeline
+from app.core.startup import startup_timer
+
+with startup_timer.phase("import:fastapi"):
+    from fastapi import FastAPI, Request, Response
+    from fastapi.responses import JSONResponse
+    from fastapi.middleware.cors import CORSMiddleware
+with startup_timer.phase("import:core"):
+    from app.core.config import settings
+    from app.core.logging import setup_logging
+    from app.core.metrics import HTTP_REQUEST_SECONDS, render as render_metrics
+    from app.core.tracing import request_id_var, new_request_id
+with startup_timer.phase("import:api"):
+    # Pulls in langgraph/langchain; no clients are built at import time
+    from app.api.endpoints import router as api_router
+with startup_timer.phase("import:ingestion"):
+    from app.services.ingestion import IngestionPipeline
+    from app.services.clients import get_vector_store, get_shared_index, get_analyst_cache, get_embedding_service
+    from app.services.concurrency import DependencyOverloaded
+import time
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+async def warm_up(app: FastAPI):
+    """
+    Background startup: load the index, then run ingestion.
+    The app accepts traffic (and answers /healthz) while this runs;
+    /readyz reports when the index can serve.
+    """
+    try:
+        with startup_timer.phase("background:load_index"):
+            await asyncio.to_thread(get_vector_store)
+        app.state.index_loaded = True
+        logger.info("Vector index loaded.")
+
+        if settings.STARTUP_INGESTION:
+            with startup_timer.phase("background:ingestion"):
+                if get_shared_index() is None:
+                    app.state.ingestion = IngestionPipeline()
+                    await asyncio.to_thread(app.state.ingestion.run)
+                else:
+                    await asyncio.to_thread(ingest_shared, app)
+    except Exception as e:
+        logger.error(f"Startup ingestion failed: {e}")
+        if app.state.ingestion is not None:
+            app.state.ingestion._report(state="failed", error=str(e))
+    logger.info("Background startup finished", extra={"startup": startup_timer.summary()})
+
+def ingest_shared(app: FastAPI):
+    """
+    Startup ingestion with a shared index (SHARED_INDEX_DIR): only the
+    worker that wins the ingest lock ingests; it and every other worker
+    then serve the generation it publishes.
+    """
+    shared = get_shared_index()
+    with shared.writer(blocking=False) as store:
+        if store is None:
+            logger.info("Another process is ingesting; serving the shared index.")
+            return
+        app.state.ingestion = IngestionPipeline(vector_store=store)
+        app.state.ingestion.run()
+    shared.refresh()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
     logger.info("Application startup...")
+    app.state.index_loaded = False
+    app.state.ingestion = None
     
-    # Run ingestion if needed
-    try:
-        pipeline = IngestionPipeline()
-        pipeline.run()
-    except Exception as e:
-        logger.error(f"Startup ingestion failed: {e}")
+    # Index load and ingestion run in the background so the port opens now
+    app.state.warm_up_task = asyncio.create_task(warm_up(app))
+    shared = get_shared_index()
+    # Follows the generations published by whichever worker ingests
+    app.state.index_watcher = asyncio.create_task(shared.watch(settings.SHARED_INDEX_POLL_SECONDS)) if shared else None
+    logger.info("Application accepting traffic", extra={"startup": startup_timer.summary()})
         
     yield
     
     # Shutdown logic
     logger.info("Application shutdown...")
+    if not app.state.warm_up_task.done():
+        app.state.warm_up_task.cancel()
+    if app.state.index_watcher is not None:
+        app.state.index_watcher.cancel()
+    if get_embedding_service.is_initialized():
+        await get_embedding_service().aclose()
+    if get_analyst_cache.is_initialized() and get_analyst_cache() is not None:
+        # Debounced saves still pending
+        await asyncio.to_thread(get_analyst_cache().flush)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -49,8 +114,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Assigns a request id (honouring an incoming X-Request-ID) that every
+    log record and span carries, and times the request.
+    """
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        ).observe(time.perf_counter() - started)
+        request_id_var.reset(token)
+
+@app.exception_handler(DependencyOverloaded)
+async def dependency_overloaded(request: Request, exc: DependencyOverloaded):
+    """
+    Load shedding: an upstream dependency is saturated, ask the client to back off.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
 def root():
     return {"message": "Vibe Matcher AI API is running"}
+
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: the process is up and serving HTTP.
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(response: Response):
+    """
+    Readiness: the index is loaded and has products to serve, either
+    from a previous run or because startup ingestion finished.
+    """
+    ingestion = app.state.ingestion
+    progress = ingestion.progress if ingestion is not None else {"state": "disabled" if not settings.STARTUP_INGESTION else "pending"}
+    count = get_vector_store().count() if app.state.index_loaded else 0
+    ready = app.state.index_loaded and (count > 0 or progress.get("state") == "complete")
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "index_loaded": app.state.index_loaded,
+        "products": count,
+        "ingestion": progress
+    }
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint: span, HTTP, token and time-to-first-token metrics.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,5 +1,5 @@
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class Product(BaseModel):
     id: str
@@ -13,8 +13,29 @@ class Product(BaseModel):
 
 class MatchRequest(BaseModel):
     query: str
+    # Vibe tag filters, applied before top-k: products must carry every
+    # included vibe and none of the excluded ones
+    include_vibes: List[str] = []
+    exclude_vibes: List[str] = []
+    # Retrieval-only /match options (ignored by /chat)
+    use_analyst: bool = False
+    top_k: Optional[int] = Field(default=None, ge=1, le=100)
+    # /chat latency budget override in ms (0 = none); see CHAT_LATENCY_BUDGET_MS
+    latency_budget_ms: Optional[int] = Field(default=None, ge=0, le=300000)
     
 class MatchResponse(BaseModel):
     matches: List[Dict[str, Any]]
     analyst_insights: Optional[Dict[str, Any]] = None
     stylist_pitch: Optional[str] = None
+
+class BatchMatchRequest(BaseModel):
+    queries: List[str]
+    # Applied to every query in the batch
+    include_vibes: List[str] = []
+    exclude_vibes: List[str] = []
+    use_analyst: bool = False
+    top_k: Optional[int] = Field(default=None, ge=1, le=100)
+
+class BatchMatchResponse(BaseModel):
+    # One response per query, in request order
+    results: List[MatchResponse]
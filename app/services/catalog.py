@@ -0,0 +1,157 @@
+import csv
+import json
+import uuid
+import hashlib
+import logging
+from itertools import islice
+from typing import Iterator, Iterable, List, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+_encoder = None
+_encoder_loaded = False
+
+# Fixed namespace so the same product key maps to the same id on every host
+PRODUCT_ID_NAMESPACE = uuid.UUID("5f0c7c1e-8a3b-4b7e-9d0a-6a1f3c2b9e41")
+
+
+def product_text(p: Dict[str, Any]) -> str:
+    """
+    Rich text representation used for embedding:
+    "Name: ... Description: ... Vibes: ..."
+    """
+    return f"Name: {p['name']}. Description: {p['desc']}. Vibes: {', '.join(p['vibes'])}"
+
+
+def product_key(p: Dict[str, Any]) -> str:
+    """
+    Stable business key: the catalog's own id/SKU if present, else the name.
+    """
+    return str(p.get("id") or p.get("sku") or p["name"])
+
+
+def product_id(p: Dict[str, Any]) -> str:
+    """
+    Deterministic vector store id derived from the product key.
+    """
+    return str(uuid.uuid5(PRODUCT_ID_NAMESPACE, product_key(p)))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def product_metadata(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": p["name"],
+        "desc": p["desc"],
+        # Chroma metadata must be flat primitives
+        "vibes": ", ".join(p["vibes"]),
+        # Lets re-runs detect changed products without re-embedding
+        "content_hash": content_hash(product_text(p))
+    }
+
+
+def _parse_vibes(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    if not value:
+        return []
+    value = str(value).strip()
+    if value.startswith("["):
+        return _parse_vibes(json.loads(value))
+    # Delimited string from a CSV cell; prefer "|" or ";" over ","
+    for sep in ("|", ";", ","):
+        if sep in value:
+            return [v.strip() for v in value.split(sep) if v.strip()]
+    return [value]
+
+
+def _normalize(raw: Dict[str, Any]) -> Dict[str, Any]:
+    product = dict(raw)
+    product["name"] = str(raw.get("name", "")).strip()
+    product["desc"] = str(raw.get("desc") or raw.get("description") or "").strip()
+    product["vibes"] = _parse_vibes(raw.get("vibes"))
+    return product
+
+
+def iter_products(path: str, skip: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily reads products from a .jsonl or .csv file, one record at a time.
+    `skip` drops the first N records (used when resuming from a checkpoint).
+    Records without a name are logged and yielded as None, so record
+    offsets stay aligned with the file.
+    """
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        records = _iter_jsonl(path)
+    elif path.endswith(".csv"):
+        records = _iter_csv(path)
+    else:
+        raise ValueError(f"Unsupported catalog format: {path} (expected .jsonl or .csv)")
+
+    for raw in islice(records, skip, None):
+        product = _normalize(raw)
+        if not product["name"]:
+            logger.warning(f"Skipping catalog record without a name: {raw}")
+            yield None
+            continue
+        yield product
+
+
+def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_csv(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count for the embedding model. Uses tiktoken when its encoding is
+    available locally, otherwise a conservative ~3 chars/token estimate.
+    """
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.info(f"tiktoken unavailable, estimating token counts: {e}")
+            _encoder = None
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    return len(text) // 3 + 1
+
+
+def batch_by_tokens(
+    products: Iterable[Dict[str, Any]],
+    max_tokens: int,
+    max_items: int,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Groups products into batches that stay under both a token budget and an
+    item limit. Yields (records_consumed, batch); records_consumed counts
+    skipped placeholder records too, so it can be added to a checkpoint offset.
+    """
+    batch: List[Dict[str, Any]] = []
+    batch_tokens = 0
+    consumed = 0
+    for product in products:
+        consumed += 1
+        if product is None:
+            continue
+        tokens = count_tokens(product_text(product))
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield consumed - 1, batch
+            batch, batch_tokens, consumed = [], 0, 1
+        batch.append(product)
+        batch_tokens += tokens
+    if batch or consumed:
+        yield consumed, batch
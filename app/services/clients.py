@@ -0,0 +1,91 @@
+import logging
+import threading
+from functools import wraps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lazily constructed, process-wide clients.
+# Nothing here runs at import time, so importing the app (and the graph)
+# stays cheap; each client is built on first use and then shared by the
+# workflow nodes, the ingestion pipeline and the API.
+
+
+def _singleton(factory):
+    """
+    Thread-safe lazy singleton: the index may be loading in a background
+    thread while a request asks for it, and it must only be built once.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(factory)
+    def getter():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    def set_instance(value):
+        # Swap in a stand-in (benchmarks, load tests)
+        with lock:
+            instance[:] = [value]
+
+    getter.is_initialized = lambda: bool(instance)
+    getter.set_instance = set_instance
+    return getter
+
+
+@_singleton
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    # stream_usage: streamed responses report token counts too (app.core.metrics)
+    return ChatOpenAI(
+        model="gpt-4o",
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL or None,
+        temperature=0.7,
+        stream_usage=True
+    )
+
+
+@_singleton
+def get_embedding_service():
+    from app.services.embedding import EmbeddingService
+    return EmbeddingService()
+
+
+@_singleton
+def get_vector_store():
+    if settings.SHARED_INDEX_DIR:
+        # Multi-worker mode: the published generation, swapped in place by
+        # SharedIndex.refresh when a newer one appears
+        return get_shared_index().open_current()
+    from app.services.vector_store import VectorStore
+    return VectorStore()
+
+
+@_singleton
+def get_shared_index():
+    if not settings.SHARED_INDEX_DIR:
+        return None
+    from app.services.shared_index import SharedIndex
+    return SharedIndex.from_settings()
+
+
+@_singleton
+def get_analyst_cache():
+    if not settings.ANALYST_CACHE_ENABLED:
+        return None
+    from app.services.semantic_cache import SemanticCache
+    return SemanticCache.from_settings()
+
+
+@_singleton
+def get_pitch_cache():
+    if not settings.PITCH_CACHE_ENABLED:
+        return None
+    from app.services.pitch_cache import PitchCache
+    return PitchCache.from_settings()
@@ -0,0 +1,291 @@
+import time
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import DEPENDENCY_INFLIGHT, DEPENDENCY_QUEUED, DEPENDENCY_SHED, DEPENDENCY_BACKOFF, SINGLE_FLIGHT_SHARED
+
+logger = logging.getLogger(__name__)
+
+# Protection for the upstream OpenAI dependencies under bursts of traffic:
+#
+#   SingleFlight       identical in-flight calls (same analyst query, same
+#                      embedding inputs, same stylist prompt) share one
+#                      upstream request; streamed results are broadcast
+#   DependencyLimiter  at most N concurrent calls per dependency, a bounded
+#                      wait queue, load shedding past it (DependencyOverloaded,
+#                      served as 503 + Retry-After) and a pause honouring the
+#                      Retry-After of a 429
+
+
+class DependencyOverloaded(Exception):
+    """
+    Raised instead of queueing when a dependency is saturated.
+    """
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} is overloaded, retry in {retry_after:.0f}s")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Reads the server's requested delay from a 429/5xx response (or a local
+    shed), if any.
+    """
+    if isinstance(error, DependencyOverloaded):
+        return error.retry_after
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+class DependencyLimiter:
+    """
+    Concurrency limit with a bounded queue for one upstream dependency.
+
+        async with OPENAI_CHAT.slot():
+            await llm.ainvoke(...)
+
+    Callers beyond `max_concurrency` wait; once `max_queue` callers are
+    waiting, or a wait would exceed `queue_timeout`, new callers are shed
+    with DependencyOverloaded. A 429 from inside the slot pauses new calls
+    for the server's Retry-After.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.queued = 0
+        self._blocked_until = 0.0
+        # asyncio primitives bind to the loop they are first used on
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def saturated(self) -> bool:
+        """
+        True when a new caller would be shed right away.
+        """
+        return self.queued >= self.max_queue or self._blocked_until - time.monotonic() > self.queue_timeout
+
+    def retry_after(self) -> float:
+        return max(1.0, self._blocked_until - time.monotonic(), self.queue_timeout / 2)
+
+    def _shed(self):
+        DEPENDENCY_SHED.labels(dependency=self.name).inc()
+        raise DependencyOverloaded(self.name, self.retry_after())
+
+    def backoff(self, seconds: float):
+        """
+        Pauses new calls, e.g. for the Retry-After of a 429.
+        """
+        until = time.monotonic() + seconds
+        if until > self._blocked_until:
+            self._blocked_until = until
+            DEPENDENCY_BACKOFF.labels(dependency=self.name).inc()
+            logger.warning(f"{self.name} rate limited, pausing new calls for {seconds:.1f}s")
+
+    async def _acquire(self):
+        if self.saturated():
+            self._shed()
+        deadline = time.monotonic() + self.queue_timeout
+        self.queued += 1
+        DEPENDENCY_QUEUED.labels(dependency=self.name).inc()
+        try:
+            paused = self._blocked_until - time.monotonic()
+            if paused > 0:
+                await asyncio.sleep(paused)
+            timeout = deadline - time.monotonic()
+            await asyncio.wait_for(self._semaphore().acquire(), timeout=max(timeout, 0) if self.queue_timeout > 0 else None)
+        except asyncio.TimeoutError:
+            self._shed()
+        finally:
+            self.queued -= 1
+            DEPENDENCY_QUEUED.labels(dependency=self.name).dec()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._acquire()
+        self.inflight += 1
+        DEPENDENCY_INFLIGHT.labels(dependency=self.name).inc()
+        try:
+            yield
+        except Exception as e:
+            if _is_rate_limited(e):
+                self.backoff(retry_after_seconds(e) or 1.0)
+            raise
+        finally:
+            self.inflight -= 1
+            DEPENDENCY_INFLIGHT.labels(dependency=self.name).dec()
+            self._semaphore().release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "paused_seconds": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+        }
+
+
+class _Broadcast:
+    """
+    Items of one streamed call, replayed to every subscriber: late joiners
+    get what was already produced, then follow live.
+    """
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls by key.
+
+    The first caller's call runs as its own task, so a caller that goes
+    away (client disconnect) does not cancel it for the others; the key is
+    released as soon as the call finishes, so nothing is cached here.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, Any] = {}
+
+    def _inflight(self, table: Dict[Hashable, Any], key: Hashable):
+        entry = table.get(key)
+        if entry is None:
+            return None
+        task = entry[0] if isinstance(entry, tuple) else entry
+        if task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return entry
+
+    def _release(self, table: Dict[Hashable, Any], key: Hashable, task: asyncio.Future):
+        def done(_):
+            entry = table.get(key)
+            if entry is not None and (entry[0] if isinstance(entry, tuple) else entry) is task:
+                del table[key]
+            if not task.cancelled():
+                # Retrieved here so an unobserved failure isn't logged as lost
+                task.exception()
+        task.add_done_callback(done)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits fn(), or the identical call already in flight.
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await fn()
+        task = self._inflight(self._calls, key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._release(self._calls, key, task)
+        else:
+            SINGLE_FLIGHT_SHARED.labels(call=self.name).inc()
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Iterates factory(), or joins the identical stream already in flight.
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            async for item in factory():
+                yield item
+            return
+        entry = self._inflight(self._streams, key)
+        if entry is None:
+            broadcast = _Broadcast()
+            task = asyncio.ensure_future(broadcast.pump(factory()))
+            self._streams[key] = (task, broadcast)
+            self._release(self._streams, key, task)
+        else:
+            broadcast = entry[1]
+            SINGLE_FLIGHT_SHARED.labels(call=self.name).inc()
+        async for item in broadcast.subscribe():
+            yield item
+
+
+# Per-process limits on the OpenAI dependencies
+OPENAI_CHAT = DependencyLimiter(
+    "openai_chat",
+    settings.OPENAI_CHAT_MAX_CONCURRENCY,
+    settings.DEPENDENCY_MAX_QUEUE,
+    settings.DEPENDENCY_QUEUE_TIMEOUT_SECONDS,
+)
+OPENAI_EMBEDDINGS = DependencyLimiter(
+    "openai_embeddings",
+    settings.OPENAI_EMBEDDING_MAX_CONCURRENCY,
+    settings.DEPENDENCY_MAX_QUEUE,
+    settings.DEPENDENCY_QUEUE_TIMEOUT_SECONDS,
+)
+LIMITERS = (OPENAI_CHAT, OPENAI_EMBEDDINGS)
+
+
+def saturated_dependency() -> Optional[DependencyLimiter]:
+    """
+    The first dependency that would shed a new caller, if any.
+    """
+    for limiter in LIMITERS:
+        if limiter.saturated():
+            return limiter
+    return None
@@ -1,20 +1,143 @@
-from typing import List
+from typing import List, Dict, Optional, Tuple
+import httpx
 import numpy as np
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 from app.core.config import settings
+from app.core.metrics import record_tokens
+from app.core.tracing import span
+from app.services.concurrency import OPENAI_EMBEDDINGS, SingleFlight
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+
+# Output size of each model when EMBEDDING_DIMENSIONS is 0 (not shortened)
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
 
 class EmbeddingService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, cache: Optional[EmbeddingCache] = None):
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL or None)
+        # Async client with its own pooled, keep-alive HTTP connections so
+        # concurrent requests on the event loop don't open a socket each
+        self.async_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                )
+            ),
+        )
         self.model = settings.EMBEDDING_MODEL
+        self.dimensions = settings.EMBEDDING_DIMENSIONS or None
+        # Vectors of different lengths must not share cache entries
+        self.cache_model = f"{self.model}@{self.dimensions}" if self.dimensions else self.model
+        self.cache = cache if cache is not None else EmbeddingCache.from_settings()
+        # Concurrent requests for the same uncached texts share one API call
+        self._flight = SingleFlight("embeddings")
+        # Small concurrent lookups (one query each) are sent together
+        self._batcher = None
+        if settings.EMBEDDING_BATCH_MAX_WAIT_MS > 0:
+            self._batcher = EmbeddingBatcher(self._afetch, settings.EMBEDDING_BATCH_MAX_SIZE, settings.EMBEDDING_BATCH_MAX_WAIT_MS)
 
-    def embed_text(self, text: str) -> List[float]:
-        text = text.replace("\n", " ")
-        return self.client.embeddings.create(input=[text], model=self.model).data[0].embedding
+    async def aclose(self):
+        """
+        Finishes the micro-batches still queued or in flight (shutdown).
+        """
+        if self._batcher is not None:
+            await self._batcher.aclose()
+
+    @staticmethod
+    def _missing(texts: List[str], found: Dict[str, List[float]]) -> List[str]:
+        # Only cache misses go to the API, each unique text once
+        return list(dict.fromkeys(t for t in texts if t not in found))
+
+    def _lookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        texts = [normalize_text(t) for t in texts]
+        found = self.cache.get_many(self.cache_model, texts)
+        return texts, found, self._missing(texts, found)
+
+    async def _alookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        # The cache's disk tier is read off the event loop
+        texts = [normalize_text(t) for t in texts]
+        found = await self.cache.aget_many(self.cache_model, texts)
+        return texts, found, self._missing(texts, found)
 
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        # OpenAI supports batching
-        texts = [t.replace("\n", " ") for t in texts]
-        response = self.client.embeddings.create(input=texts, model=self.model)
+    def _store(self, missing: List[str], response, wait: bool = True) -> Dict[str, List[float]]:
         # Ensure order is preserved (it is by API contract)
-        return [item.embedding for item in response.data]
+        fresh = {t: item.embedding for t, item in zip(missing, response.data)}
+        self.cache.set_many(self.cache_model, fresh, wait=wait)
+        return fresh
+
+    async def _afetch(self, missing: List[str]) -> Dict[str, List[float]]:
+        return self._store(missing, await self._acreate(missing), wait=False)
+
+    def _create_kwargs(self, texts: List[str]) -> Dict:
+        kwargs = {"input": texts, "model": self.model}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        return kwargs
+
+    def _create(self, texts: List[str]):
+        with span("embeddings.create", "openai", model=self.model, texts=len(texts)) as s:
+            response = self.client.embeddings.create(**self._create_kwargs(texts))
+            self._record_usage(response, s)
+        return response
+
+    async def _acreate(self, texts: List[str]):
+        async with OPENAI_EMBEDDINGS.slot():
+            with span("embeddings.create", "openai", model=self.model, texts=len(texts)) as s:
+                response = await self.async_client.embeddings.create(**self._create_kwargs(texts))
+                self._record_usage(response, s)
+        return response
+
+    def _record_usage(self, response, attrs: Dict):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            attrs["tokens"] = usage.total_tokens
+            record_tokens(self.model, embedding=usage.total_tokens)
+
+    def output_dimensions(self) -> int:
+        """
+        Length of the vectors this service returns: EMBEDDING_DIMENSIONS,
+        else the model's native size (one probe call for unknown models).
+        """
+        if self.dimensions:
+            return self.dimensions
+        if self.model in NATIVE_DIMENSIONS:
+            return NATIVE_DIMENSIONS[self.model]
+        return len(self.embed_text("dimension probe"))
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+    def embed_texts(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        if not use_cache:
+            response = self._create([normalize_text(t) for t in texts])
+            return [item.embedding for item in response.data]
+        texts, found, missing = self._lookup(texts)
+        if missing:
+            # OpenAI supports batching
+            found.update(self._store(missing, self._create(missing)))
+        return [found[t] for t in texts]
+
+    async def aembed_text(self, text: str) -> List[float]:
+        return (await self.aembed_texts([text]))[0]
+
+    async def aembed_texts(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        # Bulk catalog embeddings bypass the cache so they don't evict queries
+        if not use_cache:
+            response = await self._acreate([normalize_text(t) for t in texts])
+            return [item.embedding for item in response.data]
+        texts, found, missing = await self._alookup(texts)
+        if missing and self._batcher is not None and len(missing) < self._batcher.max_batch:
+            found.update(await self._batcher.embed(missing))
+        elif missing:
+            found.update(await self._flight.do((self.cache_model, tuple(missing)), lambda: self._afetch(missing)))
+        return [found[t] for t in texts]
+
+    def cache_stats(self):
+        return self.cache.stats()
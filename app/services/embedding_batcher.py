@@ -0,0 +1,125 @@
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.metrics import (
+    EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_FILL, EMBEDDING_BATCH_QUEUE_SECONDS, EMBEDDING_BATCH_FLUSHES, SINGLE_FLIGHT_SHARED
+)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent embedding lookups.
+
+    Each chat request embeds one or two short texts; under load that is
+    thousands of tiny embeddings.create calls that count against the
+    request rate limit. Texts submitted within `max_wait_ms` of each other
+    (or until `max_batch` are waiting) go out as one request, and each
+    caller gets back only its own vectors. A text already waiting or in
+    flight is not sent twice.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Awaitable[Dict[str, List[float]]]],
+                 max_batch: int, max_wait_ms: float):
+        self.fetch = fetch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reset()
+
+    def _reset(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._enqueued: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only holds tasks weakly; keeps each send alive until done
+        self._sends: Set[asyncio.Task] = set()
+
+    async def embed(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Vectors for the given (normalized, uncached) texts.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures belong to one event loop (asyncio.run per CLI call)
+            self._loop = loop
+            self._reset()
+
+        now = time.perf_counter()
+        futures = {}
+        for text in dict.fromkeys(texts):
+            future = self._inflight.get(text)
+            if future is None:
+                future = loop.create_future()
+                # Marks a failure as retrieved even if every caller went away
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._inflight[text] = future
+                self._pending[text] = future
+                self._enqueued[text] = now
+            else:
+                SINGLE_FLIGHT_SHARED.labels(call="embeddings").inc()
+            futures[text] = future
+
+        if len(self._pending) >= self.max_batch:
+            self._flush("size")
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush, "timer")
+
+        # Shielded: a cancelled caller must not fail the batch for the others
+        vectors = await asyncio.gather(*(asyncio.shield(f) for f in futures.values()))
+        return dict(zip(futures, vectors))
+
+    def _flush(self, reason: str):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending = list(self._pending.items())
+        self._pending = {}
+        now = time.perf_counter()
+        for start in range(0, len(pending), self.max_batch):
+            batch = dict(pending[start:start + self.max_batch])
+            EMBEDDING_BATCH_FLUSHES.labels(reason=reason).inc()
+            EMBEDDING_BATCH_SIZE.observe(len(batch))
+            EMBEDDING_BATCH_FILL.observe(len(batch) / self.max_batch)
+            for text in batch:
+                EMBEDDING_BATCH_QUEUE_SECONDS.observe(now - self._enqueued.pop(text, now))
+            task = self._loop.create_task(self._send(batch))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def aclose(self, timeout: float = 5.0):
+        """
+        Sends whatever is still waiting and waits up to `timeout` seconds
+        for the batches in flight; the rest are cancelled, which cancels
+        their callers' futures.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            return
+        if self._pending:
+            self._flush("shutdown")
+        sends = set(self._sends)
+        if not sends:
+            return
+        _, unfinished = await asyncio.wait(sends, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _send(self, batch: Dict[str, asyncio.Future]):
+        try:
+            fresh = await self.fetch(list(batch))
+            for text, future in batch.items():
+                if not future.done():
+                    future.set_result(fresh[text])
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        finally:
+            for text, future in batch.items():
+                if self._inflight.get(text) is future:
+                    del self._inflight[text]
@@ -0,0 +1,275 @@
+import re
+import time
+import asyncio
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Disk schema version (PRAGMA user_version). Version 1 keyed rows on the
+# casefolded text; those rows are dropped on open.
+_DISK_VERSION = 2
+_PRUNE_INTERVAL_SECONDS = 60.0
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses newlines and runs of whitespace into single spaces.
+    This is the exact string we send to the embeddings API.
+    """
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, normalized text). Keys are
+    case-sensitive, like the embedding model.
+
+    Tier 1 is an in-process LRU bounded by size and TTL.
+    Tier 2 is an optional SQLite file that survives restarts and can be
+    shared by several workers on the same host (WAL mode). Async callers
+    (aget_many, set_many with wait=False) reach it through the cache's own
+    thread, so a busy database never stalls the event loop.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 86400, disk_path: Optional[str] = None,
+                 disk_max_rows: int = 200000):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_rows = disk_max_rows
+        self._next_prune = 0.0
+
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        # Separate locks: the loop only ever waits on the memory tier
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path:
+            self._open_disk(disk_path)
+
+    @classmethod
+    def from_settings(cls) -> "EmbeddingCache":
+        return cls(
+            max_size=settings.EMBEDDING_CACHE_SIZE,
+            ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            disk_path=settings.EMBEDDING_CACHE_DB if settings.EMBEDDING_CACHE_DISK_ENABLED else None,
+            disk_max_rows=settings.EMBEDDING_CACHE_DB_MAX_ROWS,
+        )
+
+    def _open_disk(self, path: str):
+        try:
+            self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (model, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+            if self._db.execute("PRAGMA user_version").fetchone()[0] < _DISK_VERSION:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.execute(f"PRAGMA user_version = {_DISK_VERSION}")
+            self._db.commit()
+        except sqlite3.Error as e:
+            # The disk tier is an optimization; never fail the service over it
+            logger.warning(f"Embedding disk cache disabled ({path}): {e}")
+            self._db = None
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+
+    # --- Memory tier ---
+
+    def _memory_get(self, model: str, key: str, now: float) -> Optional[List[float]]:
+        entry = self._memory.get((model, key))
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if expires_at < now:
+            del self._memory[(model, key)]
+            self.evictions += 1
+            return None
+        self._memory.move_to_end((model, key))
+        return vector
+
+    def _memory_put(self, model: str, key: str, vector: List[float], now: float):
+        if self.max_size <= 0:
+            return
+        self._memory[(model, key)] = (now + self.ttl_seconds, vector)
+        self._memory.move_to_end((model, key))
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    # --- Disk tier ---
+
+    def _disk_get_many(self, model: str, keys: List[str], now: float) -> Dict[str, Tuple[float, List[float]]]:
+        if self._db is None or not keys:
+            return {}
+        found = {}
+        fresh_after = now - self.ttl_seconds
+        try:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector, created_at FROM embeddings WHERE model = ? AND created_at >= ? AND key IN ({placeholders})",
+                    [model, fresh_after, *chunk],
+                ).fetchall()
+                for key, blob, created_at in rows:
+                    found[key] = (created_at, np.frombuffer(blob, dtype=np.float32).tolist())
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache read failed: {e}")
+        return found
+
+    def _disk_put_many(self, model: str, items: Dict[str, List[float]], now: float):
+        if self._db is None or not items:
+            return
+        rows = [
+            (model, key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector, created_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if now >= self._next_prune:
+                self._next_prune = now + _PRUNE_INTERVAL_SECONDS
+                self._disk_prune(now)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def _disk_prune(self, now: float):
+        """
+        Drops expired rows, then the oldest rows beyond disk_max_rows.
+        Runs inside the caller's write transaction.
+        """
+        expired = self._db.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        excess = 0
+        if self.disk_max_rows > 0:
+            excess = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.disk_max_rows
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY created_at LIMIT ?)",
+                    (excess,),
+                )
+        if expired or excess > 0:
+            logger.info(f"Embedding disk cache pruned {expired} expired and {max(excess, 0)} excess rows.")
+
+    # --- Public API ---
+
+    def _memory_lookup(self, model: str, texts: List[str], now: float) -> Tuple[Dict[str, List[float]], List[str]]:
+        result = {}
+        pending = []
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                vector = self._memory_get(model, text, now)
+                if vector is not None:
+                    self.hits += 1
+                    result[text] = vector
+                else:
+                    pending.append(text)
+        return result, pending
+
+    def _disk_lookup(self, model: str, pending: List[str], now: float) -> Dict[str, List[float]]:
+        on_disk = {}
+        if self._db is not None:
+            with self._db_lock:
+                on_disk = self._disk_get_many(model, pending, now)
+        found = {}
+        with self._lock:
+            for text in pending:
+                entry = on_disk.get(text)
+                if entry is not None:
+                    created_at, vector = entry
+                    self.disk_hits += 1
+                    # Expires with the disk row, not a fresh TTL
+                    self._memory_put(model, text, vector, created_at)
+                    found[text] = vector
+                else:
+                    self.misses += 1
+        return found
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Looks up normalized texts. Returns {text: vector} for every hit;
+        texts missing from the result must be embedded by the caller.
+        """
+        now = time.time()
+        result, pending = self._memory_lookup(model, texts, now)
+        if pending:
+            result.update(self._disk_lookup(model, pending, now))
+        return result
+
+    async def aget_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        get_many for the event loop: memory hits are answered inline, the
+        disk tier is read on the cache's thread.
+        """
+        now = time.time()
+        result, pending = self._memory_lookup(model, texts, now)
+        if pending and self._executor is not None:
+            loop = asyncio.get_running_loop()
+            result.update(await loop.run_in_executor(self._executor, self._disk_lookup, model, pending, now))
+        elif pending:
+            result.update(self._disk_lookup(model, pending, now))
+        return result
+
+    def _disk_store(self, model: str, items: Dict[str, List[float]], now: float):
+        with self._db_lock:
+            self._disk_put_many(model, items, now)
+
+    def set_many(self, model: str, items: Dict[str, List[float]], wait: bool = True):
+        """
+        Stores freshly embedded {normalized text: vector} pairs in both tiers.
+        With wait=False (async callers) the disk write is queued on the
+        cache's thread and this returns at once.
+        """
+        now = time.time()
+        with self._lock:
+            for text, vector in items.items():
+                self._memory_put(model, text, vector, now)
+        if self._db is None or not items:
+            return
+        if wait:
+            self._disk_store(model, items, now)
+        else:
+            self._executor.submit(self._disk_store, model, items, now)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._memory),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
@@ -1,8 +1,19 @@
-import uuid
+import os
+import json
+import time
+import random
+import asyncio
 import logging
-from typing import List, Dict
-from app.services.embedding import EmbeddingService
-from app.services.vector_store import VectorStore
+from collections import deque
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.core.config import settings
+from app.services.clients import get_embedding_service, get_vector_store, get_pitch_cache
+from app.services.concurrency import DependencyOverloaded, retry_after_seconds
+from app.services.catalog import (
+    iter_products, batch_by_tokens, product_text, product_metadata, product_id, content_hash
+)
+from app.services.snapshot import Snapshot, write_snapshot
 from app.models.domain import Product
 
 logger = logging.getLogger(__name__)
@@ -61,67 +72,393 @@ MOCK_PRODUCTS = [
 ]
 
 class IngestionPipeline:
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
-        self.vector_store = VectorStore()
+    def __init__(self, embedding_service=None, vector_store=None):
+        # Shares the app's clients instead of opening a second store
+        self.embedding_service = embedding_service or get_embedding_service()
+        self.vector_store = vector_store or get_vector_store()
+        # Polled by /readyz while ingestion runs in the background
+        self.progress: Dict[str, Any] = {"state": "pending"}
+
+    def _report(self, **fields):
+        self.progress = {**self.progress, **fields, "updated_at": time.time()}
 
     def run(self):
         """
-        Runs the ingestion pipeline:
-        1. Check if data exists.
-        2. If not, load mock data.
-        3. Embed.
-        4. Store.
+        Runs the ingestion pipeline for the built-in mock catalog.
         """
-        count = self.vector_store.count()
-        if count > 0:
-            logger.info(f"Vector store already contains {count} items. Skipping ingestion.")
-            return
+        return self.sync(MOCK_PRODUCTS)
 
-        logger.info("Starting ingestion pipeline...")
+    def sync(self, catalog: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Delta ingestion for an in-memory catalog:
+        1. Load stored ids and content hashes.
+        2. Embed only new or changed products.
+        3. Upsert them under deterministic ids.
+        4. Delete products that are no longer in the catalog.
+        """
+        self._report(state="running", phase="diffing", done=0, total=len(catalog))
+        existing = self.vector_store.get_content_hashes()
+        logger.info(f"Starting ingestion pipeline ({len(existing)} products stored)...")
         
-        products = []
+        seen = set()
         texts = []
         ids = []
         metadatas = []
         
-        for p in MOCK_PRODUCTS:
+        for p in catalog:
             # Create a rich text representation for embedding
             # "Name: ... Desc: ... Vibes: ..."
-            text_rep = f"Name: {p['name']}. Description: {p['desc']}. Vibes: {', '.join(p['vibes'])}"
-            
-            _id = str(uuid.uuid4())
+            text_rep = product_text(p)
+            metadata = product_metadata(p)
+            _id = product_id(p)
+            seen.add(_id)
+
+            if existing.get(_id) == metadata["content_hash"]:
+                continue
             
-            products.append(p)
             texts.append(text_rep)
             ids.append(_id)
-            metadatas.append({
-                "name": p["name"],
-                "desc": p["desc"],
-                # Chroma metadata must be flat primitives
-                "vibes": ", ".join(p["vibes"])
-            })
-
-        logger.info(f"Generating embeddings for {len(texts)} products...")
-        embeddings = self.embedding_service.embed_texts(texts)
+            metadatas.append(metadata)
+
+        removed = [_id for _id in existing if _id not in seen]
+        stats = {
+            "added": sum(1 for _id in ids if _id not in existing),
+            "updated": sum(1 for _id in ids if _id in existing),
+            "unchanged": len(seen) - len(ids),
+            "deleted": len(removed)
+        }
+
+        if texts:
+            logger.info(f"Generating embeddings for {len(texts)} products...")
+            self._report(phase="embedding", done=stats["unchanged"])
+            embeddings = self.embedding_service.embed_texts(texts, use_cache=False)
+            
+            logger.info("Storing in VectorDB...")
+            self._report(phase="writing")
+            chunk = settings.INGEST_WRITE_CHUNK_SIZE
+            for start in range(0, len(ids), chunk):
+                self.vector_store.upsert_products(
+                    ids=ids[start:start + chunk],
+                    embeddings=embeddings[start:start + chunk],
+                    metadatas=metadatas[start:start + chunk],
+                    documents=texts[start:start + chunk]
+                )
+                self._report(done=stats["unchanged"] + min(start + chunk, len(ids)))
+        if removed:
+            self._report(phase="deleting")
+            self.vector_store.delete_products(removed)
+
+        if texts or removed:
+            self.vector_store.flush_lexical()
+            self._invalidate_pitches(ids + removed)
         
-        logger.info("Storing in VectorDB...")
-        self.vector_store.add_products(
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=texts
+        self._report(state="complete", phase=None, done=len(seen), stats=stats)
+        logger.info(f"Ingestion complete: {stats}")
+        return stats
+
+    async def run_streaming(self, source: str, resume: bool = True, prune: bool = True) -> Dict[str, Any]:
+        """
+        Streams a large JSONL/CSV catalog into the vector store:
+        1. Read products lazily, drop unchanged ones (content hash match) and
+           group the rest into token-bounded batches.
+        2. Embed up to INGEST_CONCURRENCY batches at once, retrying 429s.
+        3. Upsert each batch in chunks, in file order.
+        4. Checkpoint the record offset after every write so a crashed run
+           resumes where it stopped.
+        5. With `prune`, delete stored products missing from the source.
+        """
+        self._report(state="running", phase="streaming", source=source)
+        checkpoint = self._load_checkpoint(source) if resume else None
+        offset = checkpoint["offset"] if checkpoint else 0
+        ingested = checkpoint["products"] if checkpoint else 0
+        if offset:
+            logger.info(f"Resuming ingestion of {source} at record {offset} ({ingested} products already stored).")
+        else:
+            logger.info(f"Starting streaming ingestion of {source}...")
+
+        existing = await asyncio.to_thread(self.vector_store.get_content_hashes)
+        unchanged = 0
+
+        def changed_only(products):
+            nonlocal unchanged
+            for p in products:
+                # Unchanged products become placeholders so offsets stay aligned
+                if p is not None and existing.get(product_id(p)) == content_hash(product_text(p)):
+                    unchanged += 1
+                    p = None
+                yield p
+
+        batches = batch_by_tokens(
+            changed_only(iter_products(source, skip=offset)),
+            max_tokens=settings.INGEST_BATCH_MAX_TOKENS,
+            max_items=settings.INGEST_BATCH_MAX_ITEMS
         )
-        
-        logger.info("Ingestion complete.")
+
+        started = time.perf_counter()
+        session_products = 0
+        # In-flight embedding tasks; committed strictly in file order so the
+        # checkpoint offset always covers a contiguous prefix of the file
+        in_flight = deque()
+
+        async def commit_oldest():
+            nonlocal offset, ingested, session_products
+            consumed, batch, task = in_flight.popleft()
+            embeddings = await task
+            if batch:
+                await asyncio.to_thread(self._write_batch, batch, embeddings)
+            offset += consumed
+            ingested += len(batch)
+            session_products += len(batch)
+            self._save_checkpoint(source, offset, ingested)
+            self._report(done=ingested, records=offset)
+
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"Ingested {ingested} products (record {offset}), "
+                f"{session_products / elapsed if elapsed else 0.0:.1f} products/s"
+            )
+
+        try:
+            for consumed, batch in batches:
+                texts = [product_text(p) for p in batch]
+                task = asyncio.create_task(self._embed_with_retry(texts))
+                in_flight.append((consumed, batch, task))
+                if len(in_flight) >= settings.INGEST_CONCURRENCY:
+                    await commit_oldest()
+            while in_flight:
+                await commit_oldest()
+        except BaseException as e:
+            for _, _, task in in_flight:
+                task.cancel()
+            self._report(state="failed", error=str(e))
+            logger.error(f"Ingestion stopped at record {offset}; rerun to resume from the checkpoint.")
+            raise
+
+        deleted = 0
+        if prune:
+            # Cheap second pass: ids only, no embedding
+            seen = {product_id(p) for p in iter_products(source) if p is not None}
+            removed = [_id for _id in existing if _id not in seen]
+            if removed:
+                await asyncio.to_thread(self.vector_store.delete_products, removed)
+                self._invalidate_pitches(removed)
+            deleted = len(removed)
+
+        lexical = None
+        if session_products or deleted:
+            lexical = await asyncio.to_thread(self.vector_store.flush_lexical)
+
+        self._clear_checkpoint()
+        elapsed = time.perf_counter() - started
+        stats = {
+            "source": source,
+            "products": ingested,
+            "unchanged": unchanged,
+            "deleted": deleted,
+            "records": offset,
+            "seconds": round(elapsed, 3),
+            "products_per_second": round(session_products / elapsed, 1) if elapsed else 0.0,
+            "lexical_index": lexical,
+        }
+        self._report(state="complete", phase=None, stats=stats)
+        logger.info(f"Streaming ingestion complete: {stats}")
+        return stats
+
+    def _write_batch(self, batch: List[Dict[str, Any]], embeddings: List[List[float]]):
+        chunk = settings.INGEST_WRITE_CHUNK_SIZE
+        for start in range(0, len(batch), chunk):
+            products = batch[start:start + chunk]
+            self.vector_store.upsert_products(
+                # Deterministic ids keep a re-written batch idempotent on resume
+                ids=[product_id(p) for p in products],
+                embeddings=embeddings[start:start + chunk],
+                metadatas=[product_metadata(p) for p in products],
+                documents=[product_text(p) for p in products]
+            )
+        self._invalidate_pitches([product_id(p) for p in batch])
+
+    def _invalidate_pitches(self, ids: List[str]):
+        """
+        Cached stylist pitches describing changed or deleted products are stale.
+        """
+        pitch_cache = get_pitch_cache()
+        if pitch_cache is not None and ids:
+            pitch_cache.invalidate_products(ids)
+
+    async def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Deferred: importing openai costs hundreds of ms at app boot
+        import openai
+        for attempt in range(settings.INGEST_MAX_RETRIES + 1):
+            try:
+                return await self.embedding_service.aembed_texts(texts, use_cache=False)
+            except (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError, DependencyOverloaded) as e:
+                if attempt == settings.INGEST_MAX_RETRIES:
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    # Exponential backoff with jitter
+                    delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                logger.warning(f"Embedding batch failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    # --- Snapshots ---
+
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Writes every stored product, vector included, to a portable snapshot
+        (app.services.snapshot) that another node can import instead of
+        re-embedding the catalog.
+        """
+        started = time.perf_counter()
+        self._report(state="running", phase="exporting")
+        manifest = write_snapshot(
+            path, self.vector_store.iter_products(settings.SNAPSHOT_PAGE_SIZE), settings.EMBEDDING_MODEL,
+            dimensions=settings.EMBEDDING_DIMENSIONS
+        )
+        stats = {
+            "path": path,
+            "products": manifest["count"],
+            "dim": manifest["dim"],
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        self._report(state="complete", phase=None, stats=stats)
+        logger.info(f"Snapshot export complete: {stats}")
+        return stats
+
+    def import_snapshot(self, path: str, verify: bool = True, prune: bool = True) -> Dict[str, Any]:
+        """
+        Loads a snapshot without any embedding calls:
+        1. Check the manifest, file checksums and embedding model.
+        2. An empty numpy store takes the snapshot's files directly
+           (VectorStore.load_snapshot: vectors copied whole, records
+           written from the raw JSON; codes and the lexical index are
+           rebuilt once).
+        3. Otherwise upsert products whose content hash differs from the
+           stored one, vectors read from the memory map.
+        4. With `prune`, delete stored products missing from the snapshot.
+        """
+        started = time.perf_counter()
+        self._report(state="running", phase="verifying", source=path)
+        snapshot = Snapshot(path, verify=verify)
+        snapshot.check_model(settings.EMBEDDING_MODEL, self.embedding_service.output_dimensions())
+
+        existing = self.vector_store.get_content_hashes()
+        self._report(phase="importing", done=0, total=snapshot.count)
+        written = 0
+        done = 0
+        pages = snapshot.iter_pages(settings.SNAPSHOT_PAGE_SIZE)
+        if not existing and self.vector_store.load_snapshot(snapshot):
+            written = done = snapshot.count
+            pages = []
+            self._report(done=done)
+        for ids, vectors, metadatas, documents in pages:
+            done += len(ids)
+            changed = [
+                i for i, (_id, metadata) in enumerate(zip(ids, metadatas))
+                if not metadata.get("content_hash") or existing.get(_id) != metadata["content_hash"]
+            ]
+            if len(changed) < len(ids):
+                ids = [ids[i] for i in changed]
+                vectors = vectors[np.asarray(changed, dtype=np.int64)]
+                metadatas = [metadatas[i] for i in changed]
+                documents = [documents[i] for i in changed]
+            if ids:
+                self.vector_store.upsert_products(ids=ids, embeddings=vectors, metadatas=metadatas, documents=documents)
+                self._invalidate_pitches([_id for _id in ids if _id in existing])
+                written += len(ids)
+            self._report(done=done)
+
+        removed = []
+        if prune:
+            seen = set(snapshot.ids)
+            removed = [_id for _id in existing if _id not in seen]
+            if removed:
+                self.vector_store.delete_products(removed)
+                self._invalidate_pitches(removed)
+
+        lexical = self.vector_store.flush_lexical() if written or removed else None
+        stats = {
+            "path": path,
+            "products": snapshot.count,
+            "written": written,
+            "unchanged": snapshot.count - written,
+            "deleted": len(removed),
+            "seconds": round(time.perf_counter() - started, 3),
+            "lexical_index": lexical,
+        }
+        self._report(state="complete", phase=None, stats=stats)
+        logger.info(f"Snapshot import complete: {stats}")
+        return stats
+
+    # --- Checkpointing ---
+
+    def _load_checkpoint(self, source: str) -> Optional[Dict[str, Any]]:
+        path = settings.INGEST_CHECKPOINT_PATH
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("source") != os.path.abspath(source):
+            logger.info(f"Ignoring checkpoint for a different source: {checkpoint.get('source')}")
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, source: str, offset: int, products: int):
+        path = settings.INGEST_CHECKPOINT_PATH
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": os.path.abspath(source),
+                "offset": offset,
+                "products": products,
+                "updated_at": time.time()
+            }, f)
+        # Atomic replace so a crash never leaves a half-written checkpoint
+        os.replace(tmp_path, path)
+
+    def _clear_checkpoint(self):
+        if os.path.exists(settings.INGEST_CHECKPOINT_PATH):
+            os.remove(settings.INGEST_CHECKPOINT_PATH)
+
 
 if __name__ == "__main__":
     # Helper to run manually
     import sys
+    import argparse
     # Include project root in path if run as script
     sys.path.append(".") 
+    from contextlib import nullcontext
     from app.core.logging import setup_logging
+    from app.services.clients import get_shared_index
     setup_logging()
-    
-    pipeline = IngestionPipeline()
-    pipeline.run()
+
+    parser = argparse.ArgumentParser(description="Vibe Matcher catalog ingestion")
+    parser.add_argument("command", nargs="?", choices=["ingest", "export", "import"], default="ingest",
+                        help="ingest a catalog (default), or export/import a snapshot directory")
+    parser.add_argument("snapshot", nargs="?", help="Snapshot directory for export/import")
+    parser.add_argument("--source", help="JSONL or CSV catalog to stream in (default: built-in mock products)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--no-prune", action="store_true", help="Keep stored products missing from the source/snapshot")
+    parser.add_argument("--no-verify", action="store_true", help="Skip snapshot checksum verification on import")
+    args = parser.parse_args()
+    if args.command != "ingest" and not args.snapshot:
+        parser.error(f"{args.command} needs a snapshot directory")
+
+    if args.command == "export":
+        # Read-only: exports whatever the app currently serves
+        IngestionPipeline().export_snapshot(args.snapshot)
+        sys.exit(0)
+
+    # With a shared index, wait for the ingest lock and publish a new
+    # generation for the running workers to pick up
+    shared = get_shared_index()
+    with shared.writer() if shared is not None else nullcontext() as store:
+        pipeline = IngestionPipeline(vector_store=store)
+        if args.command == "import":
+            pipeline.import_snapshot(args.snapshot, verify=not args.no_verify, prune=not args.no_prune)
+        elif args.source:
+            asyncio.run(pipeline.run_streaming(args.source, resume=not args.no_resume, prune=not args.no_prune))
+        else:
+            pipeline.run()
@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it its of on or that the this to with your you".split()
+)
+# Term frequency weight per product field; names and vibes are short and
+# precise, descriptions long and noisy
+FIELD_WEIGHTS = {"name": 2.0, "vibes": 1.5, "desc": 1.0}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric tokens without stopwords, with a light plural
+    strip so "sneakers" matches "sneaker".
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def document_terms(metadata: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Field-weighted term frequencies for a stored product's metadata
+    (name, desc and comma-joined vibes, see catalog.product_metadata).
+    """
+    terms: Dict[str, float] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = metadata.get(field) or ""
+        if isinstance(value, list):
+            value = " ".join(value)
+        for token in tokenize(str(value)):
+            terms[token] = terms.get(token, 0.0) + weight
+    return terms
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over product name/desc/vibes.
+
+    Documents are kept as {id: {term: weighted tf}}; searches run against
+    frozen numpy posting lists (CSR by term) that are rebuilt lazily after
+    writes, so a query is a handful of vectorized slices and adds.
+
+    On-disk layout (next to the vector store):
+      lexical.json     snapshot of every document, written by flush()
+      lexical.jsonl    put/del operations since the snapshot
+      postings/        the frozen posting lists as .npy arrays plus
+                       terms.json (vocabulary, doc ids); written by flush()
+                       when `persist_postings` is set
+
+    A `read_only` index (shared generations) memory-maps postings/ instead
+    of loading every document, so worker processes share the arrays
+    through the page cache. Without up-to-date postings (an older index,
+    or operations logged since the last flush) it loads the documents.
+    """
+
+    _ARRAYS = ("offsets", "postings", "tfs", "idf", "norm")
+
+    def __init__(self, path: Optional[str], k1: float = 1.2, b: float = 0.75, read_only: bool = False,
+                 persist_postings: bool = False):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.read_only = read_only
+        self.persist_postings = persist_postings
+        self._lock = threading.Lock()
+        self._docs: Dict[str, Dict[str, float]] = {}
+        self._frozen = None
+        self.build_ms = 0.0
+        if path:
+            if not read_only:
+                os.makedirs(path, exist_ok=True)
+            if not (read_only and self._load_postings()):
+                self._load()
+
+    # --- Persistence ---
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.path, "lexical.json")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "lexical.jsonl")
+
+    @property
+    def _postings_dir(self) -> str:
+        return os.path.join(self.path, "postings")
+
+    def _load_postings(self) -> bool:
+        """
+        Maps the persisted posting lists if they match the snapshot (no
+        operations logged since). Returns False if there are none to use.
+        """
+        terms_path = os.path.join(self._postings_dir, "terms.json")
+        if not os.path.exists(terms_path) or (os.path.exists(self._log_path) and os.path.getsize(self._log_path)):
+            return False
+        with open(terms_path, "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        if terms.get("format") != FORMAT_VERSION or not terms["doc_ids"]:
+            return False
+        frozen = {"doc_ids": terms["doc_ids"], "vocab": {term: i for i, term in enumerate(terms["vocab"])}}
+        for name in self._ARRAYS:
+            frozen[name] = np.load(os.path.join(self._postings_dir, f"{name}.npy"), mmap_mode="r")
+        self._frozen = frozen
+        logger.info(f"Lexical index mapped: {len(frozen['doc_ids'])} documents, {len(frozen['vocab'])} terms.")
+        return True
+
+    def _write_postings(self):
+        """
+        Persists the frozen posting lists. Caller holds the lock.
+        """
+        frozen = self._frozen or self._freeze()
+        tmp_dir = f"{self._postings_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in self._ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), frozen[name])
+        with open(os.path.join(tmp_dir, "terms.json"), "w", encoding="utf-8") as f:
+            f.write(json.dumps({"format": FORMAT_VERSION, "vocab": list(frozen["vocab"]), "doc_ids": frozen["doc_ids"]}))
+        # Stale postings are ignored anyway until the log is truncated
+        shutil.rmtree(self._postings_dir, ignore_errors=True)
+        os.replace(tmp_dir, self._postings_dir)
+
+    def _load(self):
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("format") != FORMAT_VERSION:
+                logger.warning(f"Ignoring lexical index {self._snapshot_path} with format {snapshot.get('format')}")
+            else:
+                self._docs = snapshot["docs"]
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a crash mid-append
+                        break
+                    if record["op"] == "put":
+                        self._docs[record["id"]] = record["terms"]
+                    else:
+                        self._docs.pop(record["id"], None)
+        logger.info(f"Lexical index loaded: {len(self._docs)} documents.")
+
+    def flush(self):
+        """
+        Writes a snapshot and truncates the operation log.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            tmp_path = f"{self._snapshot_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                # dumps, not dump: json.dump streams through the pure-Python
+                # encoder, several times slower on a large catalog
+                f.write(json.dumps({"format": FORMAT_VERSION, "docs": self._docs}))
+            os.replace(tmp_path, self._snapshot_path)
+            if self.persist_postings:
+                self._write_postings()
+            open(self._log_path, "w").close()
+
+    def _append_log(self, records: List[Dict[str, Any]]):
+        if not self.path:
+            return
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    # --- Writes ---
+
+    def upsert(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        docs = {_id: document_terms(metadata or {}) for _id, metadata in zip(ids, metadatas)}
+        with self._lock:
+            self._append_log([{"op": "put", "id": _id, "terms": terms} for _id, terms in docs.items()])
+            self._docs.update(docs)
+            self._frozen = None
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            removed = [_id for _id in ids if self._docs.pop(_id, None) is not None]
+            self._append_log([{"op": "del", "id": _id} for _id in removed])
+            if removed:
+                self._frozen = None
+
+    def rebuild(self, metadatas: Dict[str, Dict[str, Any]]):
+        """
+        Replaces the whole index, e.g. to backfill a store ingested before
+        the lexical index existed.
+        """
+        docs = {_id: document_terms(metadata or {}) for _id, metadata in metadatas.items()}
+        with self._lock:
+            self._docs = docs
+            self._frozen = None
+        self.flush()
+
+    # --- Reads ---
+
+    def count(self) -> int:
+        if self.read_only and self._frozen is not None:
+            return len(self._frozen["doc_ids"])
+        return len(self._docs)
+
+    def _freeze(self):
+        """
+        Builds the posting lists. Caller holds the lock.
+        """
+        started = time.perf_counter()
+        doc_ids = list(self._docs)
+        vocab: Dict[str, int] = {}
+        term_idx, doc_idx, tfs = [], [], []
+        lengths = np.empty(len(doc_ids), dtype=np.float32)
+        for d, _id in enumerate(doc_ids):
+            terms = self._docs[_id]
+            lengths[d] = sum(terms.values())
+            for term, tf in terms.items():
+                term_idx.append(vocab.setdefault(term, len(vocab)))
+                doc_idx.append(d)
+                tfs.append(tf)
+
+        term_idx = np.asarray(term_idx, dtype=np.int32)
+        order = np.argsort(term_idx, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_idx, minlength=len(vocab)), out=offsets[1:])
+        n = len(doc_ids)
+        df = np.diff(offsets).astype(np.float32)
+        self._frozen = {
+            "doc_ids": doc_ids,
+            "vocab": vocab,
+            "offsets": offsets,
+            "postings": np.asarray(doc_idx, dtype=np.int32)[order],
+            "tfs": np.asarray(tfs, dtype=np.float32)[order],
+            "idf": np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32),
+            # BM25 length normalization per document, precomputed
+            "norm": (self.k1 * (1 - self.b + self.b * lengths / max(float(lengths.mean()) if n else 1.0, 1e-6))).astype(np.float32),
+        }
+        self.build_ms = (time.perf_counter() - started) * 1000
+        return self._frozen
+
+    def _view(self):
+        frozen = self._frozen
+        if frozen is None:
+            with self._lock:
+                frozen = self._frozen or self._freeze()
+        return frozen
+
+    def search(self, text: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Top-k (id, BM25 score) for a query, best first. Products sharing no
+        term with the query are never returned.
+        """
+        frozen = self._view()
+        columns = [frozen["vocab"][t] for t in dict.fromkeys(tokenize(text)) if t in frozen["vocab"]]
+        if not columns or k <= 0:
+            return []
+        scores = np.zeros(len(frozen["doc_ids"]), dtype=np.float32)
+        for col in columns:
+            start, end = frozen["offsets"][col], frozen["offsets"][col + 1]
+            docs = frozen["postings"][start:end]
+            tf = frozen["tfs"][start:end]
+            # Each doc appears once per term's posting list, so += is safe
+            scores[docs] += frozen["idf"][col] * tf * (self.k1 + 1) / (tf + frozen["norm"][docs])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        doc_ids = frozen["doc_ids"]
+        return [(doc_ids[d], float(scores[d])) for d in hits]
+
+    def search_batch(self, texts: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        return [self.search(text, k) for text in texts]
+
+    def stats(self) -> Dict[str, Any]:
+        frozen = self._view()
+        size = sum(frozen[key].nbytes for key in ("offsets", "postings", "tfs", "idf", "norm"))
+        return {
+            "documents": len(frozen["doc_ids"]),
+            "terms": len(frozen["vocab"]),
+            "postings": int(len(frozen["postings"])),
+            "posting_bytes": int(size),
+            "build_ms": round(self.build_ms, 1),
+        }
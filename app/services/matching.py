@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import List, Dict, Optional
+
+from app.core.config import settings
+from app.models.domain import MatchResponse
+from app.services.retrieval import retrieve_many
+from app.services.workflow.nodes import analyze_query
+
+logger = logging.getLogger(__name__)
+
+
+async def match_queries(queries: List[str], use_analyst: bool = False, top_k: Optional[int] = None,
+                        tags: Optional[Dict[str, List[str]]] = None) -> List[MatchResponse]:
+    """
+    Retrieval-only matching for a batch of queries: no stylist pitch.
+
+    With use_analyst, each query is first refined by the Vibe Analyst
+    (bounded by MATCH_ANALYST_CONCURRENCY); otherwise the raw query is the
+    only search term. All search terms are then embedded and searched
+    together (see retrieve_many), filtered by `tags` before top-k.
+    """
+    insights = [None] * len(queries)
+    if use_analyst:
+        semaphore = asyncio.Semaphore(max(1, settings.MATCH_ANALYST_CONCURRENCY))
+
+        async def analyze(query: str):
+            async with semaphore:
+                return await analyze_query(query)
+
+        analyses = await asyncio.gather(*(analyze(q) for q in queries))
+        term_lists = []
+        for i, (query, analysis) in enumerate(zip(queries, analyses)):
+            term_lists.append(analysis.get("refined_keywords") or [query])
+            insights[i] = {
+                "thoughts": analysis.get("analyst_thoughts", ""),
+                "keywords": analysis.get("refined_keywords", []),
+                "cache": analysis.get("analyst_cache"),
+                "failed": bool(analysis.get("analyst_failed")),
+            }
+    else:
+        term_lists = [[q] for q in queries]
+
+    results = await retrieve_many(term_lists, top_k=top_k, tags=tags)
+    logger.info(f"Matched {len(queries)} queries ({sum(len(t) for t in term_lists)} search terms).")
+    return [
+        MatchResponse(matches=matches, analyst_insights=insight)
+        for matches, insight in zip(results, insights)
+    ]
@@ -0,0 +1,694 @@
+import os
+import json
+import mmap
+import shutil
+import threading
+import logging
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.services.quantization import make_quantizer, load_quantizer, save_quantizer
+from app.services.tags import parse_tags
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# The quantizer is refit on a sample of the whole index each time the row
+# count reaches this multiple of the rows it was trained on, until it has
+# been trained on a full train_sample
+QUANTIZER_REFIT_GROWTH = 2
+# Files that are only appended to or replaced whole. A new shared-index
+# generation hard-links them instead of copying, after sealing the
+# generation they come from at its current sizes (see seal)
+APPEND_ONLY_FILES = ("vectors.f32", "records.jsonl", "codes.bin")
+SEAL_FILE = "sealed.json"
+
+
+def seal(path: str):
+    """
+    Records the current sizes of the index's append-only files in
+    sealed.json, so it keeps loading exactly these rows after another
+    index sharing the files (hard links) appends to them. Sealing twice
+    keeps the first sizes.
+    """
+    seal_path = os.path.join(path, SEAL_FILE)
+    if os.path.exists(seal_path):
+        return
+    sizes = {name: os.path.getsize(os.path.join(path, name)) for name in APPEND_ONLY_FILES
+             if os.path.exists(os.path.join(path, name))}
+    tmp_path = f"{seal_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sizes, f)
+    os.replace(tmp_path, seal_path)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _unit_rows(matrix: np.ndarray, tolerance: float = 1e-3) -> bool:
+    for start in range(0, len(matrix), 50000):
+        chunk = np.asarray(matrix[start:start + 50000])
+        if np.any(np.abs(np.einsum("ij,ij->i", chunk, chunk) - 1.0) > tolerance):
+            return False
+    return True
+
+
+def _matches_where(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """
+    Evaluates the subset of Chroma's `where` syntax we use:
+    equality, $eq/$ne/$in/$nin and $and/$or.
+    """
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches_where(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches_where(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op not in ("$eq", "$ne", "$in", "$nin"):
+                    raise ValueError(f"Unsupported where operator for numpy backend: {op}")
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class _RecordColumn:
+    """
+    One field ("metadata" or "document") of the put records in a
+    memory-mapped records.jsonl, parsed on access. Read-only indexes use
+    it instead of lists so worker processes share the page cache rather
+    than each holding every record on its own heap.
+    """
+
+    def __init__(self, data: mmap.mmap, offsets: np.ndarray, field: str):
+        self._data = data
+        self._offsets = offsets
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        start = int(self._offsets[row])
+        end = self._data.find(b"\n", start)
+        return json.loads(self._data[start:end if end >= 0 else len(self._data)])[self._field]
+
+
+class NumpyVectorIndex:
+    """
+    In-process vector index for catalogs that fit in RAM.
+
+    Embeddings are L2-normalized and kept as one contiguous float32 matrix,
+    memory-mapped from disk, so a search is a single matrix multiply plus an
+    argpartition top-k. Scores are true cosine similarity (higher is better).
+
+    On-disk layout (append-only, so chunked ingestion never rewrites the
+    whole matrix):
+      meta.json       format version and vector dimension
+      vectors.f32     raw row-major float32 rows
+      records.jsonl   one line per operation; each "put" line owns the next
+                      vector row, "del" lines remove an id
+    Updated or deleted products leave dead rows behind; they are masked out
+    of searches and dropped by compact().
+
+    Vibe tags are indexed as per-tag row posting lists (rows are append-only,
+    so the lists only grow until compaction) and turned into bitmaps to
+    filter a search before top-k selection.
+
+    Read-only indexes (shared generations) keep only ids, the id-to-row map
+    and tag postings (as arrays) on the heap; metadata and documents are
+    read from the memory-mapped records file when a row is returned.
+
+    With `quantization` set to "int8" or "pq", searches scan compact
+    in-memory codes instead (codes.bin + quantizer.npz) and re-score the
+    top `rerank_candidates` exactly against the full-precision rows, which
+    stay on disk and are only paged in for those candidates.
+    """
+
+    def __init__(self, path: str, compact_ratio: float = 0.3, quantization: str = "none",
+                 pq_subspaces: int = 64, rerank_candidates: int = 100, train_sample: int = 50000,
+                 read_only: bool = False):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.quantization = quantization
+        self.pq_subspaces = pq_subspaces
+        self.rerank_candidates = rerank_candidates
+        self.train_sample = train_sample
+        # Read-only indexes (shared generations, see app.services.shared_index)
+        # never touch their files: no repairs, no re-encoding, codes mapped
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # --- Persistence ---
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.path, "records.jsonl")
+
+    @property
+    def _codes_path(self) -> str:
+        return os.path.join(self.path, "codes.bin")
+
+    @property
+    def _quantizer_path(self) -> str:
+        return os.path.join(self.path, "quantizer.npz")
+
+    def _load(self):
+        self.dim: Optional[int] = None
+        self._ids: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._documents: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._tag_rows: Dict[str, List[int]] = {}
+        self._tag_cache: Dict[str, tuple] = {}
+        self._quantizer = None
+        self._codes: Optional[np.ndarray] = None
+        self._codes_len = 0
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported numpy index format in {self.path}: {meta.get('format')}")
+            self.dim = meta["dim"]
+
+        sealed = {}
+        if os.path.exists(os.path.join(self.path, SEAL_FILE)):
+            with open(os.path.join(self.path, SEAL_FILE), "r", encoding="utf-8") as f:
+                sealed = json.load(f)
+
+        rows_on_disk = 0
+        if self.dim and os.path.exists(self._vectors_path):
+            rows_on_disk = sealed.get("vectors.f32", os.path.getsize(self._vectors_path)) // (4 * self.dim)
+        records_end = sealed.get("records.jsonl")
+
+        lazy = self.read_only and os.path.exists(self._records_path) and os.path.getsize(self._records_path) > 0
+        offsets: List[int] = []
+        if os.path.exists(self._records_path):
+            with open(self._records_path, "rb") as f:
+                position = 0
+                for line in f:
+                    if records_end is not None and position >= records_end:
+                        # Appended by a later generation sharing the file
+                        break
+                    start, position = position, position + len(line)
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record["op"] == "del":
+                        self._id_to_row.pop(record["id"], None)
+                        continue
+                    if len(self._ids) >= rows_on_disk:
+                        # Records written past the last complete vector row
+                        # (crash mid-append); drop them
+                        logger.warning(f"Numpy index {self.path}: ignoring record without a vector row")
+                        break
+                    self._id_to_row[record["id"]] = len(self._ids)
+                    self._index_tags(self._tag_rows, len(self._ids), record["metadata"])
+                    self._ids.append(record["id"])
+                    if lazy:
+                        offsets.append(start)
+                    else:
+                        self._metadatas.append(record["metadata"])
+                        self._documents.append(record["document"])
+
+        if lazy:
+            with open(self._records_path, "rb") as f:
+                records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            offsets = np.asarray(offsets, dtype=np.int64)
+            self._metadatas = _RecordColumn(records, offsets, "metadata")
+            self._documents = _RecordColumn(records, offsets, "document")
+            self._tag_rows = {tag: np.asarray(rows, dtype=np.int64) for tag, rows in self._tag_rows.items()}
+
+        if not self.read_only and self.dim and os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != len(self._ids) * 4 * self.dim:
+            # Vector rows without records (crash between the two appends);
+            # truncate so the next append lines up again
+            logger.warning(f"Numpy index {self.path}: truncating orphaned vector rows")
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(len(self._ids) * 4 * self.dim)
+
+        self._map_vectors(len(self._ids))
+        if self.quantization != "none":
+            self._load_codes()
+        logger.info(f"Numpy index loaded from {self.path}: {len(self._id_to_row)} products, {len(self._ids)} rows.")
+
+    def _map_vectors(self, rows: int):
+        if self.dim and rows:
+            vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+        alive = np.zeros(rows, dtype=bool)
+        if self._id_to_row:
+            alive[np.fromiter(self._id_to_row.values(), dtype=np.int64)] = True
+        codes = self._codes[:rows] if self._codes is not None else None
+        # Swapped as one tuple so readers never see mismatched parts.
+        # id_to_row is included because compaction renumbers rows (it builds
+        # a new dict, so a view keeps the numbering its arrays were built on)
+        self._view = (vectors, alive, codes, self._ids, self._metadatas, self._documents, self._tag_rows, self._id_to_row)
+
+    @staticmethod
+    def _index_tags(tag_rows: Dict[str, List[int]], row: int, metadata: Dict[str, Any]):
+        for tag in parse_tags(metadata.get("vibes")):
+            tag_rows.setdefault(tag, []).append(row)
+
+    def _tag_mask(self, tag_rows: Dict[str, List[int]], tags: Dict[str, List[str]], rows: int) -> np.ndarray:
+        """
+        Row bitmap for a tag filter over the first `rows` rows.
+        """
+        def tag_array(tag: str) -> np.ndarray:
+            postings = tag_rows.get(tag, [])
+            if isinstance(postings, np.ndarray):
+                # Read-only index: postings are already arrays
+                return postings[postings < rows]
+            # Cached per tag until the posting list grows or is rebuilt
+            cached = self._tag_cache.get(tag)
+            if cached is None or cached[0] is not postings or len(cached[1]) != len(postings):
+                cached = (postings, np.array(postings, dtype=np.int64))
+                self._tag_cache[tag] = cached
+            array = cached[1]
+            return array[array < rows]
+
+        include = tags.get("include", [])
+        mask = np.ones(rows, dtype=bool)
+        for i, tag in enumerate(include):
+            tag_bits = np.zeros(rows, dtype=bool)
+            tag_bits[tag_array(tag)] = True
+            mask = tag_bits if i == 0 else mask & tag_bits
+        for tag in tags.get("exclude", []):
+            mask[tag_array(tag)] = False
+        return mask
+
+    # --- Quantized codes ---
+
+    def _load_codes(self):
+        if self.read_only:
+            self._map_codes()
+            return
+        if os.path.exists(self._quantizer_path):
+            self._quantizer = load_quantizer(self._quantizer_path)
+            if self._quantizer.kind != self.quantization:
+                logger.info(f"Numpy index {self.path}: quantization changed to {self.quantization}, rebuilding codes.")
+                self._quantizer = None
+        rows = len(self._ids)
+        if self._quantizer is None:
+            if rows:
+                self._fit_quantizer()
+                self._reencode_all()
+            return
+
+        width = self._quantizer.code_width(self.dim)
+        expected = rows * width * np.dtype(self._quantizer.code_dtype).itemsize
+        if os.path.exists(self._codes_path) and os.path.getsize(self._codes_path) == expected:
+            codes = np.fromfile(self._codes_path, dtype=self._quantizer.code_dtype).reshape(rows, width)
+            self._set_codes(codes)
+        else:
+            self._reencode_all()
+
+    def _map_codes(self):
+        """
+        Memory-maps the codes written by the index's writer, so processes
+        sharing a generation share their pages too. Missing or mismatched
+        codes leave the index on exact search.
+        """
+        rows = len(self._ids)
+        if not rows or not os.path.exists(self._quantizer_path):
+            return
+        quantizer = load_quantizer(self._quantizer_path)
+        width = quantizer.code_width(self.dim)
+        itemsize = np.dtype(quantizer.code_dtype).itemsize
+        if quantizer.kind != self.quantization or not os.path.exists(self._codes_path) \
+                or os.path.getsize(self._codes_path) < rows * width * itemsize:
+            logger.warning(f"Numpy index {self.path}: no usable {self.quantization} codes, searching exactly.")
+            return
+        self._quantizer = quantizer
+        self._codes = np.memmap(self._codes_path, dtype=quantizer.code_dtype, mode="r", shape=(rows, width))
+        self._codes_len = rows
+        self._map_vectors(rows)
+
+    def _fit_quantizer(self, sample: Optional[np.ndarray] = None):
+        if sample is None:
+            vectors = self._view[0]
+            rng = np.random.default_rng(0)
+            rows = np.sort(rng.choice(len(vectors), min(self.train_sample, len(vectors)), replace=False))
+            sample = np.asarray(vectors[rows])
+        self._quantizer = make_quantizer(self.quantization, pq_subspaces=self.pq_subspaces).fit(sample)
+        save_quantizer(self._quantizer, self._quantizer_path)
+        logger.info(f"Numpy index {self.path}: trained {self.quantization} quantizer on {len(sample)} rows.")
+
+    def _refit_due(self, rows: int) -> bool:
+        """
+        Whether the quantizer should be (re)trained now that the index is
+        growing to `rows`: the first batch alone is a poor sample for a
+        large ingest, so training follows the index as it grows.
+        """
+        quantizer = self._quantizer
+        if quantizer is None:
+            return True
+        return quantizer.trained_rows < self.train_sample and rows >= QUANTIZER_REFIT_GROWTH * quantizer.trained_rows
+
+    def _set_codes(self, codes: np.ndarray):
+        # Growable buffer: appends are amortized O(1) instead of a full copy
+        self._codes = np.empty((max(len(codes) * 2, 1024), codes.shape[1]), dtype=codes.dtype)
+        self._codes[:len(codes)] = codes
+        self._codes_len = len(codes)
+        self._map_vectors(len(self._ids))
+
+    def _append_codes(self, codes: np.ndarray):
+        with open(self._codes_path, "ab") as f:
+            f.write(np.ascontiguousarray(codes).tobytes())
+        if self._codes is None:
+            self._set_codes(codes)
+            return
+        needed = self._codes_len + len(codes)
+        if needed > len(self._codes):
+            grown = np.empty((max(needed, len(self._codes) * 2), self._codes.shape[1]), dtype=self._codes.dtype)
+            grown[:self._codes_len] = self._codes[:self._codes_len]
+            self._codes = grown
+        self._codes[self._codes_len:needed] = codes
+        self._codes_len = needed
+
+    def _reencode_all(self):
+        vectors = self._view[0]
+        width = self._quantizer.code_width(self.dim)
+        codes = np.empty((len(vectors), width), dtype=self._quantizer.code_dtype)
+        for start in range(0, len(vectors), 50000):
+            codes[start:start + 50000] = self._quantizer.encode(np.asarray(vectors[start:start + 50000]))
+        tmp_path = f"{self._codes_path}.tmp"
+        codes.tofile(tmp_path)
+        os.replace(tmp_path, self._codes_path)
+        self._set_codes(codes)
+
+    def _write_meta(self):
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": FORMAT_VERSION, "dim": self.dim}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    # --- Writes ---
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Numpy index {self.path} is read-only")
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
+        self._check_writable()
+        if not ids:
+            return
+        matrix = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self._write_meta()
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+
+            # Vectors first: a record is only trusted once its row exists
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(matrix).tobytes())
+            refit = self.quantization != "none" and self._refit_due(len(self._ids) + len(ids))
+            if self.quantization != "none" and not refit:
+                self._append_codes(self._quantizer.encode(matrix))
+            with open(self._records_path, "a", encoding="utf-8") as f:
+                for _id, metadata, document in zip(ids, metadatas, documents):
+                    f.write(json.dumps({"op": "put", "id": _id, "metadata": metadata, "document": document}) + "\n")
+
+            for _id, metadata, document in zip(ids, metadatas, documents):
+                self._id_to_row[_id] = len(self._ids)
+                self._index_tags(self._tag_rows, len(self._ids), metadata)
+                self._ids.append(_id)
+                self._metadatas.append(metadata)
+                self._documents.append(document)
+            if refit:
+                # Exact search until the new codes are in place
+                self._codes = None
+            self._map_vectors(len(self._ids))
+            if refit:
+                self._fit_quantizer()
+                self._reencode_all()
+            self._maybe_compact()
+
+    def add(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
+        self.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def adopt(self, vectors_path: str, dim: int, rows: Iterable[Tuple[str, str, str]]):
+        """
+        Replaces an index with no live products by existing columns: a
+        float32 row-major vector file, copied whole (normalized on the way
+        only if its rows are not unit length), and (id, metadata JSON,
+        document JSON) rows written into the records as they are. Codes
+        are rebuilt once on reload; nothing is encoded row by row.
+        """
+        self._check_writable()
+        with self._lock:
+            if self._id_to_row:
+                raise RuntimeError(f"Numpy index {self.path} is not empty")
+            vectors_tmp = f"{self._vectors_path}.tmp"
+            records_tmp = f"{self._records_path}.tmp"
+            source = np.memmap(vectors_path, dtype=np.float32, mode="r").reshape(-1, dim)
+            if _unit_rows(source):
+                # copy_file_range/sendfile where available
+                shutil.copyfile(vectors_path, vectors_tmp)
+            else:
+                with open(vectors_tmp, "wb") as f:
+                    for start in range(0, len(source), 50000):
+                        f.write(np.ascontiguousarray(_normalize_rows(np.asarray(source[start:start + 50000]))).tobytes())
+            with open(records_tmp, "w", encoding="utf-8") as f:
+                for _id, metadata, document in rows:
+                    f.write(f'{{"op": "put", "id": {json.dumps(_id)}, "metadata": {metadata}, "document": {document}}}\n')
+
+            for stale in (self._codes_path, self._quantizer_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            self.dim = dim
+            self._write_meta()
+            os.replace(vectors_tmp, self._vectors_path)
+            os.replace(records_tmp, self._records_path)
+            self._load()
+
+    def delete(self, ids: List[str]):
+        self._check_writable()
+        with self._lock:
+            with open(self._records_path, "a", encoding="utf-8") as f:
+                for _id in ids:
+                    if self._id_to_row.pop(_id, None) is not None:
+                        f.write(json.dumps({"op": "del", "id": _id}) + "\n")
+            self._map_vectors(len(self._ids))
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._id_to_row)
+        if dead and dead > self.compact_ratio * len(self._ids):
+            self._compact()
+
+    def compact(self):
+        self._check_writable()
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """
+        Rewrites the live rows only. Caller holds the lock.
+        """
+        rows = sorted(self._id_to_row.values())
+        logger.info(f"Compacting numpy index {self.path}: {len(self._ids)} -> {len(rows)} rows.")
+        vectors_tmp = f"{self._vectors_path}.tmp"
+        records_tmp = f"{self._records_path}.tmp"
+        vectors = self._view[0]
+        with open(vectors_tmp, "wb") as f:
+            for start in range(0, len(rows), 10000):
+                f.write(np.ascontiguousarray(vectors[rows[start:start + 10000]]).tobytes())
+        with open(records_tmp, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({"op": "put", "id": self._ids[row], "metadata": self._metadatas[row], "document": self._documents[row]}) + "\n")
+
+        os.replace(vectors_tmp, self._vectors_path)
+        os.replace(records_tmp, self._records_path)
+
+        self._ids = [self._ids[r] for r in rows]
+        self._metadatas = [self._metadatas[r] for r in rows]
+        self._documents = [self._documents[r] for r in rows]
+        self._id_to_row = {_id: i for i, _id in enumerate(self._ids)}
+        # New dict: searches holding the old view keep their old postings
+        self._tag_rows = {}
+        for row, metadata in enumerate(self._metadatas):
+            self._index_tags(self._tag_rows, row, metadata)
+        # Old codes no longer line up with the rows; exact search until re-encoded
+        self._codes = None
+        self._map_vectors(len(self._ids))
+        if self.quantization != "none" and self._ids:
+            self._fit_quantizer()
+            self._reencode_all()
+
+    # --- Reads ---
+
+    def count(self) -> int:
+        return len(self._id_to_row)
+
+    def get_content_hashes(self) -> Dict[str, str]:
+        with self._lock:
+            return {_id: self._metadatas[row].get("content_hash", "") for _id, row in self._id_to_row.items()}
+
+    def get_metadatas(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {_id: self._metadatas[row] for _id, row in self._id_to_row.items()}
+
+    def get_vectors(self, ids: List[str]) -> np.ndarray:
+        """
+        Stored (normalized) vectors for the ids, in order; zero rows for
+        unknown ids.
+        """
+        vectors, id_to_row = self._view[0], self._view[7]
+        rows = np.fromiter((id_to_row.get(_id, -1) for _id in ids), dtype=np.int64, count=len(ids))
+        found = (rows >= 0) & (rows < len(vectors))
+        out = np.zeros((len(ids), self.dim or 0), dtype=np.float32)
+        if found.any():
+            out[found] = vectors[rows[found]]
+        return out
+
+    def iter_rows(self, page_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]], List[str]]]:
+        """
+        Live rows as pages of (ids, vectors, metadatas, documents), read
+        from one snapshot of the index.
+        """
+        vectors, alive, _, ids, metadatas, documents, _, _ = self._view
+        rows = np.flatnonzero(alive)
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            yield (
+                [ids[r] for r in page],
+                np.asarray(vectors[page]),
+                [metadatas[r] for r in page],
+                [documents[r] for r in page]
+            )
+
+    @staticmethod
+    def similarity(score: float) -> float:
+        # Scores are already cosine similarity
+        return score
+
+    def search_batch(self, query_embeddings: List[List[float]], n_results: int = 3, where: Dict[str, Any] = None,
+                     tags: Dict[str, List[str]] = None) -> List[List[Dict[str, Any]]]:
+        # Snapshot so a concurrent upsert or compaction can't shift rows under us
+        vectors, alive, codes, ids, metadatas, documents, tag_rows, _ = self._view
+        quantizer = self._quantizer
+        rows = vectors.shape[0]
+        if rows == 0 or n_results <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = _normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        mask = alive
+        if tags:
+            mask = mask & self._tag_mask(tag_rows, tags, rows)
+        if where:
+            mask = mask & np.fromiter((_matches_where(m, where) for m in metadatas[:rows]), dtype=bool, count=rows)
+        valid = int(mask.sum())
+        k = min(n_results, valid)
+        if k == 0:
+            return [[] for _ in query_embeddings]
+
+        if codes is not None and quantizer is not None:
+            # Approximate scan over the codes, then exact re-rank of the
+            # best candidates against the full-precision rows on disk
+            approx = quantizer.scores(queries, codes)
+            if valid < rows:
+                approx[:, ~mask] = -np.inf
+            candidates, _ = _top_k(approx, min(max(self.rerank_candidates, k), valid))
+            exact = np.einsum("qd,qcd->qc", queries, vectors[candidates])
+            local, top_scores = _top_k(exact, k)
+            top = np.take_along_axis(candidates, local, axis=1)
+        else:
+            scores = queries @ vectors.T  # (queries, rows) cosine similarity
+            if valid < rows:
+                scores[:, ~mask] = -np.inf
+            top, top_scores = _top_k(scores, k)
+
+        batches = []
+        for q in range(len(queries)):
+            batches.append([
+                {
+                    "id": ids[row],
+                    "metadata": metadatas[row],
+                    "document": documents[row],
+                    "score": float(score)
+                }
+                for row, score in zip(top[q], top_scores[q])
+            ])
+        return batches
+
+    def search_ids(self, query_embeddings: List[List[float]], candidate_ids: List[List[str]], n_results: int = 3,
+                   where: Dict[str, Any] = None, tags: Dict[str, List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Exact search limited to each query's own candidate ids; only those
+        rows are read, so the cost is independent of the catalog size.
+        """
+        vectors, alive, _, ids, metadatas, documents, tag_rows, id_to_row = self._view
+        if tags:
+            alive = alive & self._tag_mask(tag_rows, tags, len(alive))
+        queries = _normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        batches = []
+        for query, candidates in zip(queries, candidate_ids):
+            rows = np.fromiter((id_to_row.get(_id, -1) for _id in candidates), dtype=np.int64, count=len(candidates))
+            rows = rows[(rows >= 0) & (rows < len(alive))]
+            rows = rows[alive[rows]]
+            if where and len(rows):
+                rows = rows[[_matches_where(metadatas[r], where) for r in rows]]
+            if not len(rows) or n_results <= 0:
+                batches.append([])
+                continue
+            # Sorted rows read the memmap front to back
+            rows = np.sort(rows)
+            scores = np.asarray(vectors[rows]) @ query
+            top, top_scores = _top_k(scores[None, :], min(n_results, len(rows)))
+            batches.append([
+                {
+                    "id": ids[rows[i]],
+                    "metadata": metadatas[rows[i]],
+                    "document": documents[rows[i]],
+                    "score": float(score)
+                }
+                for i, score in zip(top[0], top_scores[0])
+            ])
+        return batches
+
+
+def _top_k(scores: np.ndarray, k: int):
+    """
+    Row-wise top-k (indices, scores) sorted by descending score.
+    argpartition keeps this O(n) per row instead of a full sort.
+    """
+    n = scores.shape[1]
+    if k < n:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n), scores.shape)
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
@@ -0,0 +1,219 @@
+import re
+import json
+import time
+import hashlib
+import asyncio
+import sqlite3
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.services.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_TERM_SPLIT_RE = re.compile(r"[,;]")
+
+
+def vibe_key(keywords: List[str]) -> str:
+    """
+    Order- and case-insensitive key for the analyst's search terms, so
+    "Cozy Knit, winter" and ["winter", "cozy knit"] share pitches.
+    """
+    terms = {normalize_text(t).casefold() for k in keywords for t in _TERM_SPLIT_RE.split(k or "")}
+    return "|".join(sorted(t for t in terms if t))
+
+
+def pitch_key(products: List[Dict[str, Any]], vibe: str) -> str:
+    """
+    Digest of the retrieved product set (sorted ids with their content
+    hashes, so an edited product never serves an old pitch) and the vibe.
+    """
+    items = sorted(
+        (str(p.get("id", "")), str((p.get("metadata") or {}).get("content_hash", ""))) for p in products
+    )
+    raw = json.dumps({"products": items, "vibe": vibe}, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PitchCache:
+    """
+    Stylist pitches keyed by retrieved product set + vibe (see pitch_key).
+
+    Pitches are stored as the chunks they were streamed in, so a hit is
+    replayed token for token. SQLite (WAL) keeps them across restarts and
+    shares them between workers; beyond `max_entries` the least recently
+    used pitches are dropped, and entries older than `ttl_seconds` expire.
+    A side table maps product ids to entries so ingestion can invalidate
+    every pitch mentioning a changed or deleted product.
+
+    The stylist uses aget and put(wait=False), which run on the cache's own
+    thread so SQLite (and its busy timeout) stays off the event loop.
+    """
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 5000, ttl_seconds: float = 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pitch-cache")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._open(path)
+
+    @classmethod
+    def from_settings(cls) -> "PitchCache":
+        return cls(
+            path=settings.PITCH_CACHE_DB if settings.PITCH_CACHE_PERSIST else ":memory:",
+            max_entries=settings.PITCH_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.PITCH_CACHE_TTL_SECONDS,
+        )
+
+    def _open(self, path: str):
+        try:
+            self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pitches ("
+                " key TEXT PRIMARY KEY,"
+                " chunks TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " used_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pitch_products ("
+                " product_id TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " PRIMARY KEY (product_id, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS pitches_used_at ON pitches (used_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS pitch_products_key ON pitch_products (key)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            # The cache is an optimization; never fail the service over it
+            logger.warning(f"Pitch cache disabled ({path}): {e}")
+            self._db = None
+
+    def _delete(self, keys: List[str]):
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self._db.execute(f"DELETE FROM pitches WHERE key IN ({placeholders})", chunk)
+            self._db.execute(f"DELETE FROM pitch_products WHERE key IN ({placeholders})", chunk)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        The cached pitch chunks, or None.
+        """
+        if self._db is None:
+            return None
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT chunks, created_at FROM pitches WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] + self.ttl_seconds < now:
+                    self._delete([key])
+                    self._db.commit()
+                    self.evictions += 1
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._db.execute("UPDATE pitches SET used_at = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Pitch cache read failed: {e}")
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    async def aget(self, key: str) -> Optional[List[str]]:
+        """
+        get, run on the cache's thread.
+        """
+        if self._db is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.get, key)
+
+    def put(self, key: str, product_ids: List[str], chunks: List[str], wait: bool = True):
+        """
+        Stores a pitch; with wait=False the write is queued on the cache's
+        thread and this returns at once.
+        """
+        if self._db is None or not chunks:
+            return
+        if not wait:
+            self._executor.submit(self.put, key, product_ids, chunks)
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pitches (key, chunks, created_at, used_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(chunks), now, now),
+                )
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO pitch_products (product_id, key) VALUES (?, ?)",
+                    [(str(_id), key) for _id in set(product_ids)],
+                )
+                (count,) = self._db.execute("SELECT COUNT(*) FROM pitches").fetchone()
+                if count > self.max_entries:
+                    stale = [k for (k,) in self._db.execute(
+                        "SELECT key FROM pitches ORDER BY used_at LIMIT ?", (count - self.max_entries,)
+                    )]
+                    self._delete(stale)
+                    self.evictions += len(stale)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Pitch cache write failed: {e}")
+
+    def invalidate_products(self, product_ids: List[str]) -> int:
+        """
+        Drops every pitch that mentions one of the products. Returns the
+        number of pitches removed.
+        """
+        if self._db is None or not product_ids:
+            return 0
+        with self._lock:
+            try:
+                keys = set()
+                for start in range(0, len(product_ids), 500):
+                    chunk = [str(_id) for _id in product_ids[start:start + 500]]
+                    placeholders = ",".join("?" * len(chunk))
+                    keys.update(k for (k,) in self._db.execute(
+                        f"SELECT key FROM pitch_products WHERE product_id IN ({placeholders})", chunk
+                    ))
+                self._delete(list(keys))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Pitch cache invalidation failed: {e}")
+                return 0
+            self.invalidations += len(keys)
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached pitches for {len(product_ids)} changed products.")
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = 0
+            if self._db is not None:
+                try:
+                    (size,) = self._db.execute("SELECT COUNT(*) FROM pitches").fetchone()
+                except sqlite3.Error:
+                    pass
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": size,
+            }
@@ -0,0 +1,170 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per step when scanning codes; bounds the float32 scratch space
+SCAN_CHUNK = 65536
+
+
+class Int8Quantizer:
+    """
+    Per-dimension symmetric int8 scalar quantization.
+    4x smaller than float32; inner products are computed on the fly
+    against the de-scaled query.
+    """
+    kind = "int8"
+
+    def __init__(self, scale: Optional[np.ndarray] = None, trained_rows: int = 0):
+        self.scale = scale
+        self.trained_rows = trained_rows
+
+    def code_width(self, dim: int) -> int:
+        return dim
+
+    @property
+    def code_dtype(self):
+        return np.int8
+
+    def fit(self, sample: np.ndarray) -> "Int8Quantizer":
+        scale = np.abs(sample).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0 / 127.0
+        self.scale = scale.astype(np.float32)
+        self.trained_rows = len(sample)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        scaled = (queries * self.scale).astype(np.float32)
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK):
+            chunk = codes[start:start + SCAN_CHUNK].astype(np.float32)
+            out[:, start:start + len(chunk)] = scaled @ chunk.T
+        return out
+
+    def state(self) -> dict:
+        return {"kind": np.array(self.kind), "scale": self.scale, "trained_rows": np.array(self.trained_rows)}
+
+    @classmethod
+    def from_state(cls, state) -> "Int8Quantizer":
+        return cls(scale=state["scale"], trained_rows=_trained_rows(state))
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the vector is split into `m` subspaces and each
+    sub-vector is replaced by the id of its nearest of 256 centroids, so a
+    row costs `m` bytes. Inner products use asymmetric distance computation
+    (exact query, quantized rows) via per-query lookup tables.
+    """
+    kind = "pq"
+
+    def __init__(self, m: int = 64, centroids: Optional[np.ndarray] = None, iterations: int = 15, seed: int = 0,
+                 trained_rows: int = 0):
+        self.m = m
+        self.centroids = centroids  # (m, ks, dsub)
+        self.trained_rows = trained_rows
+        self.iterations = iterations
+        self.seed = seed
+
+    def code_width(self, dim: int) -> int:
+        return self.m
+
+    @property
+    def code_dtype(self):
+        return np.uint8
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        n, dim = vectors.shape
+        if dim % self.m:
+            raise ValueError(f"PQ subspaces ({self.m}) must divide the vector dimension ({dim})")
+        return vectors.reshape(n, self.m, dim // self.m)
+
+    def fit(self, sample: np.ndarray) -> "ProductQuantizer":
+        rng = np.random.default_rng(self.seed)
+        parts = self._split(sample.astype(np.float32))
+        ks = min(256, len(sample))
+        centroids = np.empty((self.m, ks, parts.shape[2]), dtype=np.float32)
+        for sub in range(self.m):
+            # Contiguous copy: the strided subspace view makes every
+            # assignment step several times slower
+            x = np.ascontiguousarray(parts[:, sub, :])
+            c = x[rng.choice(len(x), ks, replace=False)].copy()
+            for _ in range(self.iterations):
+                assign = self._nearest(x, c)
+                # Vectorized centroid update; empty clusters keep their centroid
+                counts = np.bincount(assign, minlength=ks)[:, None]
+                sums = np.stack([np.bincount(assign, weights=x[:, j], minlength=ks) for j in range(x.shape[1])], axis=1)
+                c = np.where(counts > 0, sums / np.maximum(counts, 1), c).astype(np.float32)
+            centroids[sub] = c
+        self.centroids = centroids
+        self.trained_rows = len(sample)
+        return self
+
+    @staticmethod
+    def _nearest(x: np.ndarray, c: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2), in place
+        scores = x @ c.T
+        scores -= 0.5 * (c * c).sum(axis=1)
+        return np.argmax(scores, axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(vectors.astype(np.float32))
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for sub in range(self.m):
+            codes[:, sub] = self._nearest(parts[:, sub, :], self.centroids[sub])
+        return codes
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        q_parts = self._split(queries.astype(np.float32))
+        # tables[q, m, k] = <query sub-vector m, centroid k of subspace m>
+        tables = np.einsum("qmd,mkd->qmk", q_parts, self.centroids)
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        sub_index = np.arange(self.m)
+        for start in range(0, len(codes), SCAN_CHUNK):
+            chunk = codes[start:start + SCAN_CHUNK]
+            for q in range(len(queries)):
+                out[q, start:start + len(chunk)] = tables[q][sub_index, chunk].sum(axis=1)
+        return out
+
+    def state(self) -> dict:
+        return {"kind": np.array(self.kind), "centroids": self.centroids, "trained_rows": np.array(self.trained_rows)}
+
+    @classmethod
+    def from_state(cls, state) -> "ProductQuantizer":
+        centroids = state["centroids"]
+        return cls(m=centroids.shape[0], centroids=centroids, trained_rows=_trained_rows(state))
+
+
+def _trained_rows(state) -> int:
+    # Files saved before the training size was recorded count as untrained
+    # on any sample, so the index refits them on its next write
+    return int(state["trained_rows"]) if "trained_rows" in state.files else 0
+
+
+def make_quantizer(kind: str, pq_subspaces: int = 64):
+    if kind == "int8":
+        return Int8Quantizer()
+    if kind == "pq":
+        return ProductQuantizer(m=pq_subspaces)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def load_quantizer(path: str):
+    with np.load(path) as state:
+        kind = str(state["kind"])
+        if kind == "int8":
+            return Int8Quantizer.from_state(state)
+        if kind == "pq":
+            return ProductQuantizer.from_state(state)
+    raise ValueError(f"Unknown quantizer in {path}: {kind}")
+
+
+def save_quantizer(quantizer, path: str):
+    # np.savez appends .npz unless the name already ends with it
+    with open(path, "wb") as f:
+        np.savez(f, **quantizer.state())
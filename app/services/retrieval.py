@@ -0,0 +1,252 @@
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def fuse_results(
+    result_lists: List[List[Dict[str, Any]]],
+    terms: List[str],
+    method: str = "rrf",
+    top_k: int = 3,
+    rrf_k: int = 60,
+    similarity: Callable[[float], float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Merges per-term search results into a single ranked list.
+
+    - "rrf": reciprocal-rank fusion, sum over terms of 1 / (rrf_k + rank).
+      Rewards products that several search terms agree on.
+    - "max": max-score fusion, each product keeps its best similarity
+      (hybrid score for hybrid search) across terms. Rewards the single
+      strongest match.
+
+    Each returned match keeps the fields of its best-scoring hit and adds
+    "fused_score" and "matched_terms".
+    """
+    if method not in ("rrf", "max"):
+        raise ValueError(f"Unknown fusion method: {method}")
+    similarity = similarity or (lambda score: score)
+
+    fused: Dict[str, Dict[str, Any]] = {}
+    for term, matches in zip(terms, result_lists):
+        for rank, match in enumerate(matches, start=1):
+            # Hybrid matches are ranked by their BM25 + vector score
+            sim = match["hybrid_score"] if "hybrid_score" in match else similarity(match["score"])
+            entry = fused.get(match["id"])
+            if entry is None:
+                entry = fused[match["id"]] = {
+                    "match": match,
+                    "best_sim": sim,
+                    "rrf": 0.0,
+                    "terms": [],
+                }
+            elif sim > entry["best_sim"]:
+                entry["match"] = match
+                entry["best_sim"] = sim
+            entry["rrf"] += 1.0 / (rrf_k + rank)
+            entry["terms"].append(term)
+
+    key = "rrf" if method == "rrf" else "best_sim"
+    # Ties broken by best single-term similarity
+    ranked = sorted(fused.values(), key=lambda e: (e[key], e["best_sim"]), reverse=True)
+
+    results = []
+    for entry in ranked[:top_k]:
+        match = dict(entry["match"])
+        match["fused_score"] = entry[key]
+        match["matched_terms"] = entry["terms"]
+        results.append(match)
+    return results
+
+
+def mmr_rerank(
+    relevance: np.ndarray,
+    candidate_vectors: np.ndarray,
+    top_k: int,
+    lambda_mult: float = 0.7,
+) -> Tuple[List[int], List[float]]:
+    """
+    Maximal marginal relevance: repeatedly picks the candidate maximizing
+
+        lambda * relevance - (1 - lambda) * max similarity to those picked
+
+    where relevance is the candidate's upstream ranking score (fused,
+    hybrid or vector), min-max normalized over the pool so tiny RRF sums
+    and raw similarities weigh the same against redundancy, and
+    similarity is the cosine between stored product vectors. Returns the picked candidate indices
+    in order and their MMR scores.
+
+    Only matrix-vector products against the pool, one per pick, so
+    O(top_k * pool * dim) with no pool x pool matrix and no normalized
+    copy of the pool.
+    """
+    n = len(candidate_vectors)
+    k = min(top_k, n)
+    if k <= 0:
+        return [], []
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", candidates, candidates))
+    norms[norms == 0] = 1.0
+    relevance = np.asarray(relevance, dtype=np.float32)
+    spread = relevance.max() - relevance.min()
+    # A flat pool has no relevance signal left; diversity alone decides
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+    def similarity_to(row: int) -> np.ndarray:
+        return (candidates @ candidates[row]) / (norms * norms[row])
+
+    picked = [int(np.argmax(relevance))]
+    scores = [float(lambda_mult * relevance[picked[0]])]
+    redundancy = similarity_to(picked[0])
+    available = np.ones(n, dtype=bool)
+    available[picked[0]] = False
+    for _ in range(1, k):
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        picked.append(best)
+        scores.append(float(mmr[best]))
+        available[best] = False
+        np.maximum(redundancy, similarity_to(best), out=redundancy)
+    return picked, scores
+
+
+def _ranking_score(match: Dict[str, Any], similarity: Callable[[float], float]) -> float:
+    """
+    The score a match was ranked by upstream: fused across terms, then
+    hybrid (BM25 + vector), then plain vector similarity.
+    """
+    if "fused_score" in match:
+        return match["fused_score"]
+    if "hybrid_score" in match:
+        return match["hybrid_score"]
+    return similarity(match["score"])
+
+
+async def _diversify(
+    pools: List[List[Dict[str, Any]]],
+    top_k: int,
+    vector_store,
+) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    MMR re-ranks each query's candidate pool down to top_k, keeping the
+    pool's own ranking as the relevance term. The pools' stored vectors
+    are fetched in one local lookup. Returns the picks and a summary
+    (lambda, pool size, timings) per query.
+    """
+    lambda_mult = settings.RETRIEVAL_MMR_LAMBDA
+    ids = list(dict.fromkeys(m["id"] for pool in pools for m in pool))
+    started = time.perf_counter()
+    vectors = await vector_store.aget_vectors(ids) if ids else None
+    vectors_ms = round((time.perf_counter() - started) * 1000, 3)
+    rows = {_id: i for i, _id in enumerate(ids)}
+
+    results = []
+    summaries = []
+    for pool in pools:
+        started = time.perf_counter()
+        if len(pool) > top_k:
+            relevance = [_ranking_score(m, vector_store.similarity) for m in pool]
+            picked, scores = mmr_rerank(relevance, vectors[[rows[m["id"]] for m in pool]], top_k, lambda_mult)
+            results.append([{**pool[i], "mmr_score": round(score, 4)} for i, score in zip(picked, scores)])
+        else:
+            # Nothing to choose between
+            results.append(pool)
+        summaries.append({
+            "lambda": lambda_mult,
+            "pool": len(pool),
+            "mmr_ms": round((time.perf_counter() - started) * 1000, 3),
+            "vectors_ms": vectors_ms,
+        })
+    return results, summaries
+
+
+async def retrieve_many(
+    term_lists: List[List[str]],
+    top_k: int = None,
+    mode: str = None,
+    tags: Dict[str, List[str]] = None,
+    diversity: Optional[List[Dict[str, Any]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Retrieves products for several queries at once, one list of search
+    terms per query. Returns one ranked match list per query, in order.
+
+    Every distinct search string across all queries is embedded in batched
+    calls and searched in a single multi-query vector store call, so cost
+    grows with the number of distinct strings rather than with the number
+    of callers. In "multi_query" mode queries with several terms are fused
+    (see fuse_results); otherwise each query's terms are joined into one
+    search string. `tags` is a vibe filter applied before top-k.
+
+    With RETRIEVAL_MMR_POOL above top_k, each query's best pool candidates
+    are re-ranked for diversity (mmr_rerank); the MMR summary of every
+    query is appended to `diversity` if given.
+    """
+    # Imported here to keep this module free of client construction
+    from app.services.clients import get_embedding_service, get_vector_store
+
+    top_k = top_k or settings.RETRIEVAL_TOP_K
+    mode = mode or settings.RETRIEVAL_MODE
+
+    plans = []
+    for terms in term_lists:
+        terms = [t for t in terms if t and t.strip()]
+        if mode == "multi_query" and len(terms) > 1:
+            plans.append(terms)
+        else:
+            plans.append([" ".join(terms)] if terms else [])
+
+    # Distinct search strings, in first-seen order
+    texts = list(dict.fromkeys(t for plan in plans for t in plan))
+    if not texts:
+        return [[] for _ in term_lists]
+
+    embedding_service = get_embedding_service()
+    vector_store = get_vector_store()
+
+    batch_size = max(1, settings.MATCH_EMBED_BATCH_SIZE)
+    chunks = await asyncio.gather(*(
+        embedding_service.aembed_texts(texts[start:start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    ))
+    embeddings = [vector for chunk in chunks for vector in chunk]
+
+    # Diversity re-ranking picks top_k out of a wider pool
+    diversifying = settings.RETRIEVAL_MMR_POOL > top_k and settings.RETRIEVAL_MMR_LAMBDA < 1
+    keep = settings.RETRIEVAL_MMR_POOL if diversifying else top_k
+    per_term_k = max(settings.RETRIEVAL_PER_TERM_K, keep) if diversifying else settings.RETRIEVAL_PER_TERM_K
+
+    fusing = any(len(plan) > 1 for plan in plans)
+    n_results = max(keep, per_term_k) if fusing else keep
+    searched = await vector_store.asearch_batch(query_embeddings=embeddings, n_results=n_results, query_texts=texts, tags=tags)
+    by_text = dict(zip(texts, searched))
+
+    results = []
+    for plan in plans:
+        if len(plan) > 1:
+            results.append(fuse_results(
+                [by_text[t][:per_term_k] for t in plan],
+                terms=plan,
+                method=settings.RETRIEVAL_FUSION,
+                top_k=keep,
+                rrf_k=settings.RETRIEVAL_RRF_K,
+                similarity=vector_store.similarity
+            ))
+        elif plan:
+            results.append(by_text[plan[0]][:keep])
+        else:
+            results.append([])
+
+    if diversifying:
+        results, summaries = await _diversify(results, top_k, vector_store)
+        if diversity is not None:
+            diversity.extend(summaries)
+    return results
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Small vector index of previously answered queries.
+
+    A lookup embeds nothing itself: callers pass the query embedding, and
+    the best stored query above `threshold` cosine similarity is a hit.
+    Entries expire after `ttl_seconds`; beyond `max_entries` the least
+    recently used entry is evicted. Vectors live in a preallocated matrix
+    that grows in doubling steps, so an insert is O(dim). State persists
+    to a single .npz file (vectors + JSON entries), written atomically
+    `save_delay` seconds after a change: off the event loop (to_thread)
+    when one is running, inline otherwise. flush() writes pending changes
+    now (called at shutdown).
+    """
+
+    def __init__(self, path: Optional[str], threshold: float = 0.92, max_entries: int = 1000, ttl_seconds: float = 604800,
+                 save_delay: float = 5.0):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        # Rows [0, len(_entries)) of _buffer are live; _created mirrors
+        # each entry's created_at for vectorized expiry
+        self._buffer = np.zeros((0, 0), dtype=np.float32)
+        self._created = np.zeros(0, dtype=np.float64)
+        self._dirty = False
+        self._save_scheduled = False
+        self._save_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path and os.path.exists(path):
+            self._load()
+
+    @classmethod
+    def from_settings(cls) -> "SemanticCache":
+        return cls(
+            path=settings.ANALYST_CACHE_PATH if settings.ANALYST_CACHE_PERSIST else None,
+            threshold=settings.ANALYST_CACHE_THRESHOLD,
+            max_entries=settings.ANALYST_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANALYST_CACHE_TTL_SECONDS,
+            save_delay=settings.ANALYST_CACHE_SAVE_DELAY_SECONDS,
+        )
+
+    @property
+    def _vectors(self) -> np.ndarray:
+        return self._buffer[:len(self._entries)]
+
+    def _reset(self, dim: int = 0):
+        self._entries = []
+        self._buffer = np.zeros((0, dim), dtype=np.float32)
+        self._created = np.zeros(0, dtype=np.float64)
+
+    def _load(self):
+        try:
+            with np.load(self.path) as data:
+                self._buffer = data["vectors"].astype(np.float32)
+                self._entries = json.loads(str(data["entries"]))
+            self._created = np.array([e["created_at"] for e in self._entries], dtype=np.float64)
+            logger.info(f"Loaded {len(self._entries)} semantic cache entries from {self.path}.")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable semantic cache {self.path}: {e}")
+            self._reset()
+
+    # --- Persistence ---
+
+    def _changed(self):
+        """
+        Marks unsaved changes and schedules one debounced save. Caller
+        holds the lock.
+        """
+        if not self.path:
+            return
+        self._dirty = True
+        if self._save_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            # Sync callers (scripts, ingestion threads) save inline
+            self._write(*self._snapshot())
+            return
+        self._save_scheduled = True
+        loop.call_later(self.save_delay, self._start_save)
+
+    def _start_save(self):
+        self._save_task = asyncio.ensure_future(asyncio.to_thread(self.flush))
+
+    def _snapshot(self) -> Tuple[np.ndarray, str]:
+        self._dirty = False
+        self._save_scheduled = False
+        return self._vectors.copy(), json.dumps(self._entries)
+
+    def _write(self, vectors: np.ndarray, entries: str):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, vectors=vectors, entries=np.array(entries))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Semantic cache save failed: {e}")
+
+    def flush(self):
+        """
+        Writes pending changes now. Blocking; async callers use to_thread.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                self._save_scheduled = False
+                return
+            vectors, entries = self._snapshot()
+        self._write(vectors, entries)
+
+    # --- Storage ---
+
+    def _drop(self, keep: np.ndarray):
+        n = int(keep.sum())
+        self._buffer[:n] = self._vectors[keep]
+        self._created = self._created[keep]
+        self._entries = [e for e, k in zip(self._entries, keep) if k]
+
+    def _expire(self, now: float) -> bool:
+        if not self._entries or self._created.min() >= now - self.ttl_seconds:
+            return False
+        keep = self._created >= now - self.ttl_seconds
+        self.evictions += int((~keep).sum())
+        self._drop(keep)
+        return True
+
+    def _append(self, vector: np.ndarray, entry: Dict[str, Any]):
+        n = len(self._entries)
+        if n == len(self._buffer):
+            grown = np.empty((max(min(2 * n, self.max_entries + 1), n + 1, 16), len(vector)), dtype=np.float32)
+            grown[:n] = self._buffer[:n]
+            self._buffer = grown
+        self._buffer[n] = vector
+        self._created = np.append(self._created, entry["created_at"])
+        self._entries.append(entry)
+
+    def _evict_lru(self):
+        # Swap the last row into the evicted slot: O(dim), no re-pack
+        victim = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+        last = len(self._entries) - 1
+        self._buffer[victim] = self._buffer[last]
+        self._created[victim] = self._created[last]
+        self._created = self._created[:last]
+        self._entries[victim] = self._entries[last]
+        self._entries.pop()
+        self.evictions += 1
+
+    # --- Public API ---
+
+    def lookup(self, embedding: List[float]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Returns (payload entry, similarity) for the closest cached query at or
+        above the threshold, else None.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        now = time.time()
+        with self._lock:
+            if self._expire(now):
+                self._changed()
+            if not self._entries or self._buffer.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            sims = self._vectors @ query
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = self._entries[best]
+            # last_used only orders eviction; not worth a disk write per hit
+            entry["last_used"] = now
+            return entry, similarity
+
+    def add(self, query: str, embedding: List[float], payload: Dict[str, Any]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if self._buffer.shape[1] != vector.shape[0]:
+                # Embedding model/dimensions changed (or first entry); old
+                # entries are unusable
+                self._reset(vector.shape[0])
+            self._append(vector, {"query": query, "payload": payload, "created_at": now, "last_used": now})
+            while len(self._entries) > self.max_entries:
+                self._evict_lru()
+            self._changed()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries)}
@@ -0,0 +1,266 @@
+import os
+import re
+import shutil
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+from app.core.config import settings
+from app.services import numpy_index
+from app.services.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Layout of SHARED_INDEX_DIR:
+#   gen-<n>/      one complete numpy + lexical index per generation; never
+#                 modified once published. A generation hard-links the
+#                 append-only files of the one it was built from, which
+#                 is sealed at its own sizes first (numpy_index.seal)
+#   CURRENT       name of the generation workers serve (atomic replace)
+#   PENDING       generation a writer is building; an interrupted writer's
+#                 generation is resumed by the next one, which keeps the
+#                 streaming ingestion checkpoint valid
+#   ingest.lock   flock held by the single process that ingests
+
+_GENERATION_RE = re.compile(r"^gen-(\d+)$")
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        # Filesystems without hard links
+        shutil.copy2(source, target)
+
+
+class StagedStore:
+    """
+    Store handed out by SharedIndex.writer. Reads go to the current
+    generation until the first write; that write stages the next
+    generation (see SharedIndex._next_generation) and everything after it
+    goes there. A run
+    that finds nothing to change therefore copies nothing.
+    """
+
+    _WRITES = ("add_products", "upsert_products", "delete_products", "load_snapshot")
+
+    def __init__(self, base: VectorStore, stage: Optional[Callable[[], VectorStore]] = None):
+        self._base = base
+        self._stage = stage
+        # A resumed pending generation is writable from the start
+        self.staged: Optional[VectorStore] = base if stage is None else None
+        self._stage_lock = threading.Lock()
+
+    def flush_lexical(self):
+        # Nothing written, nothing to flush (and the base is read-only)
+        return self.staged.flush_lexical() if self.staged is not None else None
+
+    def __getattr__(self, name: str) -> Any:
+        if name in self._WRITES and self.staged is None:
+            with self._stage_lock:
+                if self.staged is None:
+                    self.staged = self._stage()
+        return getattr(self.staged or self._base, name)
+
+
+class SharedIndex:
+    """
+    Index generations shared by the worker processes of one deployment.
+
+    Writers take the ingest lock and, once they have something to write,
+    build the next generation from the current one, so readers never see
+    a half-written index. The numpy index's append-only files (vectors,
+    records, codes) are hard-linked after sealing the current generation
+    at its sizes; everything else (the lexical index truncates its log in
+    place) is copied. Publishing replaces CURRENT; readers poll it and
+    swap the process's vector store to the new generation between
+    requests.
+    """
+
+    def __init__(self, root: str, keep_generations: int = 2):
+        if settings.VECTOR_BACKEND != "numpy":
+            raise ValueError(f"SHARED_INDEX_DIR needs VECTOR_BACKEND=numpy, not {settings.VECTOR_BACKEND}")
+        self.root = root
+        self.keep_generations = max(1, keep_generations)
+        self._lock_file = None
+        self._swap_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls) -> "SharedIndex":
+        return cls(settings.SHARED_INDEX_DIR, keep_generations=settings.SHARED_INDEX_KEEP_GENERATIONS)
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    # --- Pointers ---
+
+    def _read_pointer(self, name: str) -> Optional[str]:
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                generation = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return generation if generation and os.path.isdir(self._path(generation)) else None
+
+    def _write_pointer(self, name: str, generation: str):
+        tmp_path = self._path(f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(name))
+
+    def current(self) -> Optional[str]:
+        """
+        The published generation, or None before the first one.
+        """
+        return self._read_pointer("CURRENT")
+
+    def _generations(self) -> List[str]:
+        found = []
+        for name in os.listdir(self.root):
+            match = _GENERATION_RE.match(name)
+            if match:
+                found.append((int(match.group(1)), name))
+        return [name for _, name in sorted(found)]
+
+    # --- Readers ---
+
+    def open(self, generation: Optional[str]) -> VectorStore:
+        """
+        A read-only store over one generation. Before anything is published
+        workers serve an empty index (not ready, see /readyz).
+        """
+        path = self._path(generation) if generation else self._path(".empty")
+        return VectorStore(backend="numpy", index_dir=path, read_only=True, generation=generation)
+
+    def open_current(self) -> VectorStore:
+        return self.open(self.current())
+
+    def _reader(self) -> VectorStore:
+        # The process's own store when it already serves CURRENT
+        from app.services.clients import get_vector_store
+        store = get_vector_store()
+        current = self.current()
+        return store if store.generation == current else self.open(current)
+
+    def refresh(self) -> bool:
+        """
+        Switches this process to the published generation if it is behind.
+        Requests already holding the old store finish on it; it is released
+        once they are done. Returns True if the store was swapped.
+        """
+        # Imported here: clients builds this index through get_vector_store
+        from app.services.clients import get_vector_store
+        with self._swap_lock:
+            generation = self.current()
+            if generation is None or generation == get_vector_store().generation:
+                return False
+            store = self.open(generation)
+            get_vector_store.set_instance(store)
+        logger.info(f"Serving shared index generation {generation} ({store.count()} products).")
+        return True
+
+    async def watch(self, interval: float):
+        """
+        Polls CURRENT for the lifetime of the app (started by the lifespan).
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # A generation pruned mid-load, a torn read; next poll retries
+                logger.warning(f"Shared index refresh failed: {e}")
+
+    # --- Writer ---
+
+    def _acquire(self, blocking: bool) -> bool:
+        # POSIX advisory lock; released by the OS if the holder dies
+        import fcntl
+        lock_file = open(self._path("ingest.lock"), "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release(self):
+        import fcntl
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def _next_generation(self) -> str:
+        generations = self._generations()
+        number = int(_GENERATION_RE.match(generations[-1]).group(1)) + 1 if generations else 1
+        generation = f"gen-{number:06d}"
+        tmp_path = self._path(f"{generation}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        current = self.current()
+        if current:
+            source = self._path(current)
+            # Append-only files are shared by hard links; the rest is small
+            # or rewritten whole, so it is copied
+            numpy_index.seal(source)
+            shutil.copytree(source, tmp_path, ignore=shutil.ignore_patterns(numpy_index.SEAL_FILE, *numpy_index.APPEND_ONLY_FILES))
+            for name in numpy_index.APPEND_ONLY_FILES:
+                if os.path.exists(os.path.join(source, name)):
+                    _link_or_copy(os.path.join(source, name), os.path.join(tmp_path, name))
+        else:
+            os.makedirs(tmp_path)
+        os.replace(tmp_path, self._path(generation))
+        logger.info(f"Building shared index generation {generation} from {current or 'an empty index'}.")
+        return generation
+
+    def _writable(self, generation: str) -> VectorStore:
+        return VectorStore(backend="numpy", index_dir=self._path(generation), generation=generation)
+
+    def _stage(self) -> VectorStore:
+        generation = self._next_generation()
+        self._write_pointer("PENDING", generation)
+        return self._writable(generation)
+
+    def _publish(self, generation: str):
+        self._write_pointer("CURRENT", generation)
+        os.remove(self._path("PENDING"))
+        logger.info(f"Published shared index generation {generation}.")
+        # Superseded generations stay readable until workers have moved on
+        # (and on POSIX, mapped files outlive their deletion anyway)
+        for stale in self._generations()[:-self.keep_generations]:
+            if stale != generation:
+                shutil.rmtree(self._path(stale), ignore_errors=True)
+
+    @contextmanager
+    def writer(self, blocking: bool = True) -> Iterator[Optional[StagedStore]]:
+        """
+        Holds the ingest lock and yields a store that reads the current
+        generation and stages the next one on its first write (StagedStore),
+        so diffing an unchanged catalog copies nothing. When the block
+        completes a staged generation is published; if it raises, the
+        generation stays pending for the next writer to resume.
+
+        With blocking=False, yields None if another process is ingesting.
+        """
+        if not self._acquire(blocking):
+            yield None
+            return
+        try:
+            generation = self._read_pointer("PENDING")
+            if generation is not None:
+                logger.info(f"Resuming interrupted shared index generation {generation}.")
+                store = StagedStore(self._writable(generation))
+            else:
+                store = StagedStore(self._reader(), self._stage)
+            yield store
+            if store.staged is not None:
+                self._publish(store.staged.generation)
+            else:
+                logger.info("Shared index unchanged; nothing to publish.")
+        finally:
+            self._release()
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Portable catalog snapshot: a directory of columns plus a manifest.
+#
+#   manifest.json     format, embedding model and EMBEDDING_DIMENSIONS
+#                     setting, dim, count, per-file sha256
+#   ids.json          product ids, in row order
+#   vectors.f32       float32 little-endian (count x dim), row-major
+#   metadatas.jsonl   one metadata object per row
+#   documents.jsonl   one document string per row
+#
+# Vectors are memory-mapped on load, so importing never holds the matrix
+# in memory and never calls the embeddings API.
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+_COLUMNS = ("ids.json", "vectors.f32", "metadatas.jsonl", "documents.jsonl")
+
+Page = Tuple[List[str], np.ndarray, List[Dict[str, Any]], List[str]]
+
+
+class SnapshotError(ValueError):
+    """
+    The snapshot is unreadable, corrupt, or was built with another model.
+    """
+
+
+class _HashingWriter:
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.sha256.update(data)
+        self.bytes += len(data)
+
+    def close(self) -> Dict[str, Any]:
+        self.file.close()
+        return {"sha256": self.sha256.hexdigest(), "bytes": self.bytes}
+
+
+def write_snapshot(path: str, pages: Iterable[Page], model: str, dimensions: int = 0) -> Dict[str, Any]:
+    """
+    Writes the pages (ids, vectors, metadatas, documents) as a snapshot at
+    `path`, replacing any snapshot there. `dimensions` is the
+    EMBEDDING_DIMENSIONS setting (0 = the model's native size). Returns
+    the manifest.
+
+    Only a previous snapshot is ever replaced: any other existing path
+    (a file, or a non-empty directory without a manifest) is refused.
+    """
+    path = os.path.abspath(path)
+    if os.path.lexists(path) and not _replaceable(path):
+        raise SnapshotError(f"Refusing to overwrite {path}: it exists and is not a snapshot")
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    # Unique names next to the target, so nothing of the user's is reused
+    tmp_path = tempfile.mkdtemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=parent)
+    os.chmod(tmp_path, 0o755)  # mkdtemp's 0700 would carry over to the snapshot
+    try:
+        manifest = _write_columns(tmp_path, pages, model, dimensions)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    _swap_in(tmp_path, path)
+    logger.info(f"Snapshot written to {path}: {manifest['count']} products, dim {manifest['dim']}.")
+    return manifest
+
+
+def _write_columns(tmp_path: str, pages: Iterable[Page], model: str, dimensions: int) -> Dict[str, Any]:
+    writers = {name: _HashingWriter(os.path.join(tmp_path, name)) for name in _COLUMNS}
+    count = 0
+    dim = None
+    ids_sep = b"["
+    for ids, vectors, metadatas, documents in pages:
+        if not ids:
+            continue
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        if dim is None:
+            dim = vectors.shape[1]
+        for _id in ids:
+            writers["ids.json"].write(ids_sep + json.dumps(_id).encode("utf-8"))
+            ids_sep = b","
+        writers["vectors.f32"].write(vectors.tobytes())
+        writers["metadatas.jsonl"].write("".join(json.dumps(m) + "\n" for m in metadatas).encode("utf-8"))
+        writers["documents.jsonl"].write("".join(json.dumps(d) + "\n" for d in documents).encode("utf-8"))
+        count += len(ids)
+    writers["ids.json"].write(b"]" if count else b"[]")
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "embedding_model": model,
+        "embedding_dimensions": dimensions,
+        "dim": dim or 0,
+        "count": count,
+        "created_at": time.time(),
+        "files": {name: writer.close() for name, writer in writers.items()},
+    }
+    with open(os.path.join(tmp_path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _replaceable(path: str) -> bool:
+    """
+    True for a previous snapshot or an empty directory.
+    """
+    if not os.path.isdir(path) or os.path.islink(path):
+        return False
+    return not os.listdir(path) or os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _swap_in(tmp_path: str, path: str):
+    """
+    Moves the finished snapshot into place. An old snapshot is renamed
+    aside first and only deleted once the new one is in place, so a crash
+    leaves one of the two complete snapshots on disk.
+    """
+    if not os.path.lexists(path):
+        os.rename(tmp_path, path)
+        return
+    aside = tempfile.mkdtemp(prefix=f".{os.path.basename(path)}.", suffix=".old", dir=os.path.dirname(path))
+    old_path = os.path.join(aside, "snapshot")
+    os.rename(path, old_path)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        os.rename(old_path, path)
+        raise
+    shutil.rmtree(aside, ignore_errors=True)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 22), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """
+    A snapshot opened for import. File sizes are always checked; `verify`
+    also re-hashes every file against the manifest.
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        manifest_path = os.path.join(path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise SnapshotError(f"No snapshot manifest in {path}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format in {path}: {self.manifest.get('format')}")
+        self.model = self.manifest["embedding_model"]
+        self.dim = self.manifest["dim"]
+        self.count = self.manifest["count"]
+
+        for name in _COLUMNS:
+            expected = self.manifest["files"][name]
+            file_path = os.path.join(path, name)
+            if not os.path.exists(file_path) or os.path.getsize(file_path) != expected["bytes"]:
+                raise SnapshotError(f"Snapshot file {name} is missing or truncated")
+            if verify and _sha256(file_path) != expected["sha256"]:
+                raise SnapshotError(f"Snapshot file {name} does not match its checksum")
+
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        if len(self.ids) != self.count:
+            raise SnapshotError(f"Snapshot lists {len(self.ids)} ids for {self.count} products")
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        if self.count:
+            self.vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r", shape=(self.count, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+    def check_model(self, model: str, dimensions: int):
+        """
+        Refuses vectors from another embedding model or size: they would
+        not be comparable with the query embeddings. `dimensions` is the
+        effective query vector size (EMBEDDING_DIMENSIONS, or the model's
+        native size when that is 0).
+        """
+        if self.model != model:
+            raise SnapshotError(f"Snapshot was embedded with {self.model}, but EMBEDDING_MODEL is {model}")
+        if self.count and dimensions != self.dim:
+            exported = self.manifest.get("embedding_dimensions")
+            exported_with = f" (exported with EMBEDDING_DIMENSIONS={exported})" if exported is not None else ""
+            raise SnapshotError(
+                f"Snapshot vectors have {self.dim} dimensions{exported_with}, but this node's "
+                f"embeddings have {dimensions}"
+            )
+
+    def iter_pages(self, page_size: int) -> Iterator[Page]:
+        """
+        Rows in order, page by page; vectors are slices of the memory map.
+        """
+        with open(os.path.join(self.path, "metadatas.jsonl"), "r", encoding="utf-8") as metadatas, \
+                open(os.path.join(self.path, "documents.jsonl"), "r", encoding="utf-8") as documents:
+            for start in range(0, self.count, page_size):
+                end = min(start + page_size, self.count)
+                yield (
+                    self.ids[start:end],
+                    self.vectors[start:end],
+                    [json.loads(next(metadatas)) for _ in range(end - start)],
+                    [json.loads(next(documents)) for _ in range(end - start)],
+                )
+
+    def iter_raw_rows(self) -> Iterator[Tuple[str, str, str]]:
+        """
+        (id, metadata JSON, document JSON) per row, the JSON left unparsed
+        for stores that can take it as it is.
+        """
+        with open(os.path.join(self.path, "metadatas.jsonl"), "r", encoding="utf-8") as metadatas, \
+                open(os.path.join(self.path, "documents.jsonl"), "r", encoding="utf-8") as documents:
+            for _id, metadata, document in zip(self.ids, metadatas, documents):
+                yield _id, metadata.rstrip("\n"), document.rstrip("\n")
@@ -0,0 +1,86 @@
+import threading
+from typing import List, Dict, Any, Optional, Set, Iterable
+
+# Vibe tag filters. Stored metadata keeps vibes as one comma-joined string
+# (Chroma metadata must be flat), so the backends index tags themselves and
+# apply a filter before top-k selection instead of post-filtering results.
+#
+# A filter is {"include": [...], "exclude": [...]}: a product must carry
+# every included tag and none of the excluded ones.
+
+
+def normalize_tag(tag: str) -> str:
+    return " ".join(tag.lower().split())
+
+
+def parse_tags(vibes: Any) -> List[str]:
+    """
+    Normalized tags from a metadata "vibes" value (comma-joined string or list).
+    """
+    if not vibes:
+        return []
+    values = vibes if isinstance(vibes, list) else str(vibes).split(",")
+    return list(dict.fromkeys(t for t in (normalize_tag(str(v)) for v in values) if t))
+
+
+def tag_filter(include: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None) -> Optional[Dict[str, List[str]]]:
+    """
+    Builds a normalized filter, or None when it would not filter anything.
+    """
+    include = [t for t in (normalize_tag(t) for t in include or []) if t]
+    exclude = [t for t in (normalize_tag(t) for t in exclude or []) if t]
+    if not include and not exclude:
+        return None
+    return {"include": include, "exclude": exclude}
+
+
+class TagIndex:
+    """
+    Posting lists tag -> set of product ids, for backends that filter by
+    an id list (Chroma's query(ids=...)).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Set[str]] = {}
+        self._tags_by_id: Dict[str, List[str]] = {}
+
+    def upsert(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        with self._lock:
+            for _id, metadata in zip(ids, metadatas):
+                self._remove(_id)
+                tags = parse_tags((metadata or {}).get("vibes"))
+                self._tags_by_id[_id] = tags
+                for tag in tags:
+                    self._postings.setdefault(tag, set()).add(_id)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for _id in ids:
+                self._remove(_id)
+
+    def _remove(self, _id: str):
+        for tag in self._tags_by_id.pop(_id, []):
+            postings = self._postings.get(tag)
+            if postings is not None:
+                postings.discard(_id)
+                if not postings:
+                    del self._postings[tag]
+
+    def allowed_ids(self, tags: Dict[str, List[str]]) -> Set[str]:
+        """
+        Ids passing the filter. Include lists are intersected starting from
+        the rarest tag; exclude-only filters start from every id.
+        """
+        with self._lock:
+            include = sorted((self._postings.get(t, set()) for t in tags.get("include", [])), key=len)
+            allowed = set(include[0]) if include else set(self._tags_by_id)
+            for postings in include[1:]:
+                allowed &= postings
+            for tag in tags.get("exclude", []):
+                allowed -= self._postings.get(tag, set())
+            return allowed
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {tag: len(ids) for tag, ids in self._postings.items()}
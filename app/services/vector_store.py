@@ -1,17 +1,50 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Any
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+import numpy as np
 from app.core.config import settings
+from app.core.tracing import span
+from app.services.numpy_index import NumpyVectorIndex
+from app.services.lexical import LexicalIndex
+from app.services.tags import TagIndex
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-class VectorStore:
+# One backend instance per (backend, location) per process. The numpy index
+# holds its rows in memory, so separate instances would not see each
+# other's writes.
+_backends: Dict[tuple, Any] = {}
+_backends_lock = threading.Lock()
+
+class ChromaVectorIndex:
+    """
+    Chroma backend. Scores are raw squared-L2 distances (lower is better).
+    """
     def __init__(self):
+        # Imported here: chromadb is slow to import and unused by the numpy backend
+        import chromadb
         self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_DIR)
         self.collection = self.client.get_or_create_collection(name=settings.COLLECTION_NAME)
+        # Vibe tag postings, loaded from metadata on the first filtered search
+        self._tags: TagIndex = None
+        self._tags_lock = threading.Lock()
 
-    def add_products(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
+    def _tag_index(self) -> TagIndex:
+        if self._tags is None:
+            with self._tags_lock:
+                if self._tags is None:
+                    tags = TagIndex()
+                    metadatas = self.get_metadatas()
+                    tags.upsert(list(metadatas), list(metadatas.values()))
+                    self._tags = tags
+        return self._tags
+
+    def add(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
         """
         Add products to the ChromaDB collection.
         """
@@ -22,25 +55,167 @@ class VectorStore:
             metadatas=metadatas,
             documents=documents
         )
+        if self._tags is not None:
+            self._tags.upsert(ids, metadatas)
 
-    def search(self, query_embedding: List[float], n_results: int = 3, where: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
         """
-        Search for similar products.
+        Insert or overwrite products by id. Safe to repeat for the same batch.
+        """
+        logger.info(f"Upserting {len(ids)} documents to ChromaDB.")
+        self.collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            documents=documents
+        )
+        if self._tags is not None:
+            self._tags.upsert(ids, metadatas)
+
+    def delete(self, ids: List[str]):
+        """
+        Remove products by id, in chunks.
+        """
+        logger.info(f"Deleting {len(ids)} documents from ChromaDB.")
+        for start in range(0, len(ids), 1000):
+            self.collection.delete(ids=ids[start:start + 1000])
+        if self._tags is not None:
+            self._tags.delete(ids)
+
+    def get_content_hashes(self, page_size: int = 5000) -> Dict[str, str]:
+        """
+        Returns {id: content_hash} for every stored product.
+        Products ingested before content hashing map to "".
+        """
+        hashes = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for _id, meta in zip(page["ids"], page["metadatas"]):
+                hashes[_id] = (meta or {}).get("content_hash", "")
+            if len(page["ids"]) < page_size:
+                return hashes
+            offset += page_size
+
+    def get_metadatas(self, page_size: int = 5000) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns {id: metadata} for every stored product.
+        """
+        metadatas = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for _id, meta in zip(page["ids"], page["metadatas"]):
+                metadatas[_id] = meta or {}
+            if len(page["ids"]) < page_size:
+                return metadatas
+            offset += page_size
+
+    def get_vectors(self, ids: List[str]) -> np.ndarray:
+        """
+        Stored vectors for the ids, in order; zero rows for unknown ids.
+        """
+        if not ids:
+            return np.zeros((0, 0), dtype=np.float32)
+        page = self.collection.get(ids=list(dict.fromkeys(ids)), include=["embeddings"])
+        found = dict(zip(page["ids"], page["embeddings"]))
+        dim = len(next(iter(found.values()))) if found else 0
+        out = np.zeros((len(ids), dim), dtype=np.float32)
+        for i, _id in enumerate(ids):
+            if _id in found:
+                out[i] = found[_id]
+        return out
+
+    def iter_rows(self, page_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]], List[str]]]:
+        """
+        Every stored product as pages of (ids, vectors, metadatas, documents).
+        """
+        offset = 0
+        while True:
+            page = self.collection.get(include=["embeddings", "metadatas", "documents"], limit=page_size, offset=offset)
+            if page["ids"]:
+                yield (
+                    page["ids"],
+                    np.asarray(page["embeddings"], dtype=np.float32),
+                    [meta or {} for meta in page["metadatas"]],
+                    [doc or "" for doc in page["documents"]]
+                )
+            if len(page["ids"]) < page_size:
+                return
+            offset += page_size
+
+    def search_batch(self, query_embeddings: List[List[float]], n_results: int = 3, where: Dict[str, Any] = None,
+                     tags: Dict[str, List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several query vectors in a single Chroma round trip.
+        Returns one match list per query, in input order.
+        A tag filter becomes an id restriction, applied by Chroma before top-k.
         """
+        ids = None
+        if tags:
+            ids = list(self._tag_index().allowed_ids(tags))
+            if not ids:
+                return [[] for _ in query_embeddings]
+            n_results = min(n_results, len(ids))
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=query_embeddings,
             n_results=n_results,
-            where=where
+            where=where,
+            ids=ids
         )
-        
-        # Parse results into a friendly list of dicts
-        matches = []
-        if results['ids']:
-            ids = results['ids'][0]
-            metadatas = results['metadatas'][0]
-            distances = results['distances'][0]
-            documents = results['documents'][0]
+        return self._parse(results)
+
+    def search_ids(self, query_embeddings: List[List[float]], candidate_ids: List[List[str]], n_results: int = 3,
+                   where: Dict[str, Any] = None, tags: Dict[str, List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search limited to each query's own candidate ids. Chroma's query
+        takes one id list per call, so the candidates of every query are
+        fetched in a single get and scored here (squared L2, like Chroma).
+        """
+        allowed = self._tag_index().allowed_ids(tags) if tags else None
+        if allowed is not None:
+            candidate_ids = [[_id for _id in ids if _id in allowed] for ids in candidate_ids]
+        union = list(dict.fromkeys(_id for ids in candidate_ids for _id in ids))
+        if not union or n_results <= 0:
+            return [[] for _ in query_embeddings]
+        page = self.collection.get(ids=union, where=where, include=["embeddings", "metadatas", "documents"])
+        if not page["ids"]:
+            return [[] for _ in query_embeddings]
+        rows = {_id: i for i, _id in enumerate(page["ids"])}
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        squared_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+        batches = []
+        for embedding, ids in zip(query_embeddings, candidate_ids):
+            found = np.fromiter((rows[_id] for _id in dict.fromkeys(ids) if _id in rows), dtype=np.int64)
+            if not len(found):
+                batches.append([])
+                continue
+            query = np.asarray(embedding, dtype=np.float32)
+            distances = squared_norms[found] - 2.0 * (vectors[found] @ query) + query @ query
+            order = np.argsort(distances, kind="stable")[:n_results]
+            batches.append([
+                {
+                    "id": page["ids"][found[i]],
+                    "metadata": page["metadatas"][found[i]],
+                    "document": page["documents"][found[i]],
+                    "score": float(distances[i])
+                }
+                for i in order
+            ])
+        return batches
+
+    @staticmethod
+    def _parse(results) -> List[List[Dict[str, Any]]]:
+        # Parse results into a friendly list of dicts per query
+        batches = []
+        for q in range(len(results['ids'] or [])):
+            ids = results['ids'][q]
+            metadatas = results['metadatas'][q]
+            distances = results['distances'][q]
+            documents = results['documents'][q]
             
+            matches = []
             for i, _id in enumerate(ids):
                 # Chroma returns 'distance' by default for some spaces, but can return cosine similarity
                 # depending on init. Default is l2. 
@@ -50,6 +225,7 @@ class VectorStore:
                 # To get cosine similarity in Chroma, we usually need to specify metadata={"hnsw:space": "cosine"}
                 # and then score = 1 - distance.
                 # However, for this MVP, we'll just return the metadata + distance.
+                # Use similarity() when a comparable score is needed.
                 
                 matches.append({
                     "id": _id,
@@ -57,8 +233,326 @@ class VectorStore:
                     "document": documents[i],
                     "score": distances[i] # keeping raw distance for now
                 })
+            batches.append(matches)
         
-        return matches
-    
+        return batches
+
+    @staticmethod
+    def similarity(score: float) -> float:
+        """
+        Converts a raw Chroma score into cosine similarity (higher is better).
+        Chroma's default space is squared L2, and OpenAI embeddings are
+        unit-normalized, so ||a - b||^2 = 2 - 2cos(a, b).
+        """
+        return 1.0 - score / 2.0
+
     def count(self) -> int:
         return self.collection.count()
+
+
+class VectorStore:
+    """
+    Backend-agnostic product vector store.
+
+    VECTOR_BACKEND selects "chroma" (persistent Chroma collection) or
+    "numpy" (in-process memory-mapped matrix, cosine scores). Both expose
+    the same API; use similarity() to compare scores across backends.
+
+    Writes also maintain a BM25 lexical index next to the store. Given the
+    query text, SEARCH_MODE "hybrid" fuses BM25 and vector scores, and
+    "prefilter" limits the vector scan to BM25 candidates on large
+    catalogs.
+    """
+    def __init__(self, backend: str = None, index_dir: str = None, read_only: bool = False, generation: str = None):
+        self.backend_name = backend or settings.VECTOR_BACKEND
+        self.read_only = read_only
+        # Shared index generation this store serves (app.services.shared_index)
+        self.generation = generation
+        if index_dir is not None:
+            # One numpy index generation, owned by this store rather than the
+            # process-wide registry so superseded generations can be released
+            if self.backend_name != "numpy":
+                raise ValueError(f"Index generations need the numpy backend, not {self.backend_name}")
+            self.backend = self._numpy_index(index_dir, read_only=read_only)
+            self.lexical = self._open_lexical(
+                index_dir if os.path.isdir(index_dir) else None, self.backend, read_only=read_only,
+                persist_postings=True
+            ) if settings.LEXICAL_INDEX_ENABLED else None
+        else:
+            self.backend = self._shared_backend(self.backend_name)
+            self.lexical = self._shared_lexical(self.backend_name, self.backend) if settings.LEXICAL_INDEX_ENABLED else None
+        # Backend queries block; async callers run them on this bounded pool
+        # so they never stall the event loop.
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.VECTOR_STORE_MAX_WORKERS,
+            thread_name_prefix="vector-store"
+        )
+
+    @staticmethod
+    def _shared_backend(name: str):
+        if name == "numpy":
+            key = (name, settings.NUMPY_INDEX_DIR, settings.VECTOR_QUANTIZATION)
+            factory = lambda: VectorStore._numpy_index(settings.NUMPY_INDEX_DIR)
+        elif name == "chroma":
+            key = (name, settings.CHROMA_DB_DIR, settings.COLLECTION_NAME)
+            factory = ChromaVectorIndex
+        else:
+            raise ValueError(f"Unknown VECTOR_BACKEND: {name}")
+        with _backends_lock:
+            if key not in _backends:
+                _backends[key] = factory()
+            return _backends[key]
+
+    @staticmethod
+    def _numpy_index(path: str, read_only: bool = False) -> NumpyVectorIndex:
+        return NumpyVectorIndex(
+            path,
+            quantization=settings.VECTOR_QUANTIZATION,
+            pq_subspaces=settings.PQ_SUBSPACES,
+            rerank_candidates=settings.RERANK_CANDIDATES,
+            read_only=read_only
+        )
+
+    @staticmethod
+    def _open_lexical(path: Optional[str], backend, read_only: bool = False, persist_postings: bool = False) -> LexicalIndex:
+        # Shared generations persist their posting lists so read-only
+        # workers can map them (see LexicalIndex)
+        lexical = LexicalIndex(path, read_only=read_only, persist_postings=persist_postings)
+        if not read_only and lexical.count() != backend.count():
+            # Store ingested before the lexical index existed, or a
+            # crash between the two writes; rebuild from metadata
+            logger.info(f"Rebuilding lexical index ({lexical.count()} documents, {backend.count()} products).")
+            lexical.rebuild(backend.get_metadatas())
+        return lexical
+
+    @staticmethod
+    def _shared_lexical(name: str, backend) -> LexicalIndex:
+        if name == "numpy":
+            path = settings.NUMPY_INDEX_DIR
+        else:
+            path = os.path.join(settings.CHROMA_DB_DIR, "lexical", settings.COLLECTION_NAME)
+        key = ("lexical", name, path)
+        with _backends_lock:
+            if key not in _backends:
+                _backends[key] = VectorStore._open_lexical(path, backend)
+            return _backends[key]
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(
+                f"Vector store generation {self.generation} is read-only; ingest through the shared index writer"
+            )
+
+    def add_products(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
+        """
+        Add products to the store.
+        """
+        self._check_writable()
+        with span("vector_store.add", "vector_store", backend=self.backend_name, rows=len(ids)):
+            self.backend.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        if self.lexical is not None:
+            self.lexical.upsert(ids, metadatas)
+
+    def upsert_products(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], documents: List[str]):
+        """
+        Insert or overwrite products by id. Safe to repeat for the same batch.
+        """
+        self._check_writable()
+        with span("vector_store.upsert", "vector_store", backend=self.backend_name, rows=len(ids)):
+            self.backend.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        if self.lexical is not None:
+            self.lexical.upsert(ids, metadatas)
+
+    def load_snapshot(self, snapshot) -> bool:
+        """
+        Fills an empty numpy store straight from a catalog snapshot's files
+        (NumpyVectorIndex.adopt) and rebuilds the lexical index from its
+        metadata. Returns False without doing anything for other backends
+        or a store that already holds products; callers upsert instead.
+        """
+        self._check_writable()
+        if not isinstance(self.backend, NumpyVectorIndex) or self.backend.count() or not snapshot.count:
+            return False
+        with span("vector_store.load_snapshot", "vector_store", backend=self.backend_name, rows=snapshot.count):
+            self.backend.adopt(snapshot.vectors_path, snapshot.dim, snapshot.iter_raw_rows())
+        if self.lexical is not None:
+            self.lexical.rebuild(self.backend.get_metadatas())
+        return True
+
+    def delete_products(self, ids: List[str]):
+        self._check_writable()
+        with span("vector_store.delete", "vector_store", backend=self.backend_name, rows=len(ids)):
+            self.backend.delete(ids)
+        if self.lexical is not None:
+            self.lexical.delete(ids)
+
+    def flush_lexical(self) -> Optional[Dict[str, Any]]:
+        """
+        Snapshots the lexical index (called at the end of ingestion) and
+        returns its size stats.
+        """
+        if self.lexical is None:
+            return None
+        self.lexical.flush()
+        stats = self.lexical.stats()
+        logger.info(f"Lexical index: {stats}")
+        return stats
+
+    def get_content_hashes(self) -> Dict[str, str]:
+        """
+        Returns {id: content_hash} for every stored product.
+        """
+        with span("vector_store.get_content_hashes", "vector_store", backend=self.backend_name):
+            return self.backend.get_content_hashes()
+
+    def get_vectors(self, ids: List[str]) -> np.ndarray:
+        """
+        Stored vectors for the ids as one (len(ids), dim) array, e.g. for
+        diversity re-ranking of search results. Local; no embedding calls.
+        """
+        with span("vector_store.get_vectors", "vector_store", backend=self.backend_name, rows=len(ids)):
+            return self.backend.get_vectors(ids)
+
+    async def aget_vectors(self, ids: List[str]) -> np.ndarray:
+        """
+        get_vectors on the store's executor.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(context.run, self.get_vectors, ids))
+
+    def iter_products(self, page_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]], List[str]]]:
+        """
+        Every stored product as pages of (ids, vectors, metadatas, documents),
+        e.g. for a catalog snapshot (app.services.snapshot).
+        """
+        return self.backend.iter_rows(page_size)
+
+    def search(self, query_embedding: List[float], n_results: int = 3, where: Dict[str, Any] = None,
+               query_text: str = None, mode: str = None, tags: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Search for similar products.
+        """
+        query_texts = [query_text] if query_text is not None else None
+        return self.search_batch([query_embedding], n_results=n_results, where=where, query_texts=query_texts, mode=mode, tags=tags)[0]
+
+    def search_batch(self, query_embeddings: List[List[float]], n_results: int = 3, where: Dict[str, Any] = None,
+                     query_texts: List[str] = None, mode: str = None, tags: Dict[str, List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several query vectors in one backend call.
+        Returns one match list per query, in input order.
+
+        With query_texts, `mode` (default SEARCH_MODE) can bring in the
+        lexical index: "hybrid" or "prefilter". Fused results keep the raw
+        vector "score" and add "lexical_score" and "hybrid_score"; list
+        order follows the hybrid score.
+
+        `tags` ({"include": [...], "exclude": [...]}, see app.services.tags)
+        filters by vibe before top-k, so up to n_results matches come back
+        whenever that many products pass the filter.
+        """
+        mode = mode or settings.SEARCH_MODE
+        if mode not in ("vector", "hybrid", "prefilter"):
+            raise ValueError(f"Unknown SEARCH_MODE: {mode}")
+        if query_texts is None or mode == "vector" or self.lexical is None or not self.lexical.count():
+            with span("vector_store.search", "vector_store", backend=self.backend_name,
+                      queries=len(query_embeddings), n_results=n_results):
+                return self.backend.search_batch(query_embeddings, n_results=n_results, where=where, tags=tags)
+
+        if mode == "prefilter" and self.lexical.count() >= settings.LEXICAL_PREFILTER_MIN_PRODUCTS:
+            return self._prefiltered_search(query_embeddings, query_texts, n_results, where, tags)
+        return self._hybrid_search(query_embeddings, query_texts, n_results, where, tags)
+
+    def _lexical_search(self, query_texts: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        with span("lexical.search", "lexical", queries=len(query_texts), k=k):
+            return self.lexical.search_batch(query_texts, k)
+
+    def _hybrid_search(self, query_embeddings, query_texts, n_results, where, tags):
+        """
+        Vector top candidates plus BM25 top candidates; BM25 hits the
+        vector scan missed are scored exactly by id, then both are fused.
+        """
+        candidates = max(n_results, settings.HYBRID_CANDIDATES)
+        lexical_hits = self._lexical_search(query_texts, candidates)
+        with span("vector_store.search", "vector_store", backend=self.backend_name,
+                  queries=len(query_embeddings), n_results=candidates, mode="hybrid"):
+            vector_hits = self.backend.search_batch(query_embeddings, n_results=candidates, where=where, tags=tags)
+            missing = []
+            for vector, lexical in zip(vector_hits, lexical_hits):
+                seen = {m["id"] for m in vector}
+                missing.append([_id for _id, _ in lexical if _id not in seen])
+            if any(missing):
+                extra = self.backend.search_ids(query_embeddings, missing, n_results=candidates, where=where, tags=tags)
+                vector_hits = [v + e for v, e in zip(vector_hits, extra)]
+        return [self._fuse(v, l, n_results) for v, l in zip(vector_hits, lexical_hits)]
+
+    def _prefiltered_search(self, query_embeddings, query_texts, n_results, where, tags):
+        """
+        Scores only the BM25 candidates; queries with too few lexical hits
+        fall back to a full vector scan.
+        """
+        lexical_hits = self._lexical_search(query_texts, settings.LEXICAL_PREFILTER_CANDIDATES)
+        with span("vector_store.search", "vector_store", backend=self.backend_name,
+                  queries=len(query_embeddings), n_results=n_results, mode="prefilter"):
+            candidate_ids = [[_id for _id, _ in hits] for hits in lexical_hits]
+            vector_hits = self.backend.search_ids(
+                query_embeddings, candidate_ids, n_results=max(n_results, settings.HYBRID_CANDIDATES), where=where, tags=tags
+            )
+            short = [q for q, hits in enumerate(vector_hits) if len(hits) < n_results]
+            if short:
+                fallback = self.backend.search_batch([query_embeddings[q] for q in short], n_results=n_results, where=where, tags=tags)
+                for q, hits in zip(short, fallback):
+                    vector_hits[q] = hits
+        return [self._fuse(v, l, n_results) for v, l in zip(vector_hits, lexical_hits)]
+
+    def _fuse(self, vector_hits: List[Dict[str, Any]], lexical_hits: List[Tuple[str, float]], n_results: int) -> List[Dict[str, Any]]:
+        """
+        Weighted sum of cosine similarity and max-normalized BM25.
+        Only products with a vector score (i.e. passing `where`) are kept.
+        """
+        weight = settings.HYBRID_LEXICAL_WEIGHT
+        lexical = dict(lexical_hits)
+        top_lexical = max(lexical.values(), default=0.0) or 1.0
+        fused = {}
+        for match in vector_hits:
+            if match["id"] in fused:
+                continue
+            lexical_score = lexical.get(match["id"], 0.0)
+            fused[match["id"]] = {
+                **match,
+                "lexical_score": round(lexical_score, 4),
+                "hybrid_score": (1 - weight) * self.similarity(match["score"]) + weight * lexical_score / top_lexical,
+            }
+        return sorted(fused.values(), key=lambda m: m["hybrid_score"], reverse=True)[:n_results]
+
+    def similarity(self, score: float) -> float:
+        """
+        Converts a backend score into cosine similarity (higher is better).
+        """
+        return self.backend.similarity(score)
+
+    async def asearch(self, query_embedding: List[float], n_results: int = 3, where: Dict[str, Any] = None,
+                      query_text: str = None, mode: str = None, tags: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Async-safe search: runs the blocking query on the store's executor.
+        """
+        query_texts = [query_text] if query_text is not None else None
+        return (await self.asearch_batch([query_embedding], n_results=n_results, where=where, query_texts=query_texts, mode=mode, tags=tags))[0]
+
+    async def asearch_batch(self, query_embeddings: List[List[float]], n_results: int = 3, where: Dict[str, Any] = None,
+                            query_texts: List[str] = None, mode: str = None, tags: Dict[str, List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Async-safe batched search on the store's executor.
+        """
+        loop = asyncio.get_running_loop()
+        # run_in_executor does not carry contextvars over; copy them so the
+        # search span keeps the caller's request id
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(context.run, self.search_batch, query_embeddings=query_embeddings, n_results=n_results,
+                    where=where, query_texts=query_texts, mode=mode, tags=tags)
+        )
+    
+    def count(self) -> int:
+        return self.backend.count()
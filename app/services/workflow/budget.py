@@ -0,0 +1,49 @@
+import time
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import BUDGET_BREACHES
+
+logger = logging.getLogger(__name__)
+
+# A /chat request's latency budget travels in the graph state as its
+# monotonic start time plus the budget in ms. Each node with a deadline
+# takes a share of the budget measured from the start of the request, so
+# time lost upstream is taken from the nodes that follow.
+
+
+def start(budget_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Graph input fields for a request starting now; budget_ms None uses
+    CHAT_LATENCY_BUDGET_MS.
+    """
+    if budget_ms is None:
+        budget_ms = settings.CHAT_LATENCY_BUDGET_MS
+    return {"started_at": time.monotonic(), "latency_budget_ms": budget_ms}
+
+
+def remaining(state: Dict[str, Any], share: float = 1.0) -> Optional[float]:
+    """
+    Seconds left until the deadline at `share` of the budget (may be
+    negative), or None when the request has no budget.
+    """
+    budget_ms = state.get("latency_budget_ms")
+    started_at = state.get("started_at")
+    if not budget_ms or started_at is None:
+        return None
+    return started_at + budget_ms * share / 1000.0 - time.monotonic()
+
+
+def breach(state: Dict[str, Any], node: str, fallback: str, share: float = 1.0) -> Dict[str, Any]:
+    """
+    Logs and counts a missed deadline; returns the client event data.
+    """
+    budget_ms = round(state["latency_budget_ms"] * share)
+    elapsed_ms = round((time.monotonic() - state["started_at"]) * 1000)
+    BUDGET_BREACHES.labels(node=node).inc()
+    logger.warning(
+        f"Latency budget breached in {node}: {elapsed_ms}ms elapsed, budget {budget_ms}ms; "
+        f"falling back to {fallback}"
+    )
+    return {"node": node, "budget_ms": budget_ms, "elapsed_ms": elapsed_ms, "fallback": fallback}
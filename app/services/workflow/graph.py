@@ -1,12 +1,18 @@
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 
+from app.core.config import settings
 from app.services.workflow.state import GraphState
-from app.services.workflow.nodes import vibe_analyst_node, retriever_node, stylist_node
+from app.services.workflow.nodes import vibe_analyst_node, speculative_retriever_node, retriever_node, stylist_node
 
-def create_workflow():
+def create_workflow(speculative: bool = None):
     """
     Constructs the Vibe Matcher LangGraph.
+    In speculative mode a raw-query retrieval runs in parallel with the
+    analyst, and the refined retriever waits for both.
     """
+    if speculative is None:
+        speculative = settings.SPECULATIVE_RETRIEVAL
+
     workflow = StateGraph(GraphState)
     
     # Add Nodes
@@ -15,8 +21,14 @@ def create_workflow():
     workflow.add_node("stylist", stylist_node)
     
     # Define Edges
-    workflow.set_entry_point("vibe_analyst")
-    workflow.add_edge("vibe_analyst", "retriever")
+    if speculative:
+        workflow.add_node("speculative_retriever", speculative_retriever_node)
+        workflow.add_edge(START, "vibe_analyst")
+        workflow.add_edge(START, "speculative_retriever")
+        workflow.add_edge(["vibe_analyst", "speculative_retriever"], "retriever")
+    else:
+        workflow.set_entry_point("vibe_analyst")
+        workflow.add_edge("vibe_analyst", "retriever")
     workflow.add_edge("retriever", "stylist")
     workflow.add_edge("stylist", END)
     
@@ -1,33 +1,144 @@
-import json
+import time
+import asyncio
 import logging
 from typing import Dict, Any, List
 
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 
 from app.core.config import settings
+from app.core.metrics import STYLIST_TTFT_SECONDS, PITCH_CACHE_LOOKUPS, record_tokens
+from app.core.tracing import span, traced_node
 from app.services.workflow.state import GraphState
-from app.services.vector_store import VectorStore
-from app.services.embedding import EmbeddingService
+from app.services.workflow import budget
+from app.services.clients import get_llm, get_embedding_service, get_analyst_cache, get_pitch_cache
+from app.services.retrieval import retrieve_many
+from app.services.concurrency import OPENAI_CHAT, SingleFlight
+from app.services.embedding_cache import normalize_text
+from app.services.pitch_cache import pitch_key, vibe_key
 
 logger = logging.getLogger(__name__)
 
-# Initialize singletons for efficiency
-_llm = ChatOpenAI(model="gpt-4o", api_key=settings.OPENAI_API_KEY, temperature=0.7)
-_vector_store = VectorStore()
-_embedding_service = EmbeddingService()
+# Clients are shared singletons, built lazily on first use (app.services.clients)
+
+# Identical concurrent requests (a campaign going live) share one analyst
+# call and one stylist stream
+_analyst_flight = SingleFlight("analyst")
+_stylist_flight = SingleFlight("stylist")
+
+class _UsageRecorder(AsyncCallbackHandler):
+    """
+    Collects OpenAI token usage from the LLM runs inside a chain.
+    """
+    def __init__(self, model: str):
+        self.model = model
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    self.completion_tokens += usage.get("output_tokens", 0)
+
+    def record(self, attrs: Dict[str, Any]):
+        attrs["prompt_tokens"] = self.prompt_tokens
+        attrs["completion_tokens"] = self.completion_tokens
+        record_tokens(self.model, prompt=self.prompt_tokens, completion=self.completion_tokens)
+
+def _model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+async def _emit_token(text: str, config: RunnableConfig):
+    """
+    Sends a stylist token to both /chat stream modes: the "custom" stream
+    (lean) and a "stylist_token" callback event (astream_events).
+    """
+    get_stream_writer()({"type": "token", "data": text})
+    # Dispatching costs a callback manager per token; skip it when nothing
+    # listens (the lean stream registers no handlers)
+    if _has_listeners(config):
+        await adispatch_custom_event("stylist_token", {"text": text}, config=config)
+
+async def _emit_event(kind: str, data: Dict[str, Any], config: RunnableConfig):
+    """
+    Sends a client event (e.g. "budget_breach") from inside a node, to
+    both /chat stream modes.
+    """
+    get_stream_writer()({"type": kind, "data": data})
+    if _has_listeners(config):
+        await adispatch_custom_event(kind, data, config=config)
+
+def _has_listeners(config: RunnableConfig) -> bool:
+    callbacks = config.get("callbacks") if config else None
+    return bool(getattr(callbacks, "handlers", callbacks))
 
 # --- Vibe Analyst Node ---
 
-async def vibe_analyst_node(state: GraphState) -> Dict[str, Any]:
+@traced_node("vibe_analyst")
+async def vibe_analyst_node(state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
     """
     Vibe Analyst Agent: Break down the user's vague query.
     Uses Chain-of-Thought to extract attributes.
+    Past ANALYST_BUDGET_SHARE of the latency budget, retrieval goes ahead
+    on the raw query; the shared analysis keeps running and still fills
+    the semantic cache.
     """
     logger.info("--- Node: Vibe Analyst ---")
     query = state["user_query"]
+    timeout = budget.remaining(state, settings.ANALYST_BUDGET_SHARE)
+    if timeout is None:
+        return await analyze_query(query)
+    try:
+        return await asyncio.wait_for(analyze_query(query), timeout=max(0.0, timeout))
+    except asyncio.TimeoutError:
+        breach = budget.breach(state, "vibe_analyst", "raw_query", share=settings.ANALYST_BUDGET_SHARE)
+        await _emit_event("budget_breach", breach, config)
+        return {
+            "analyst_thoughts": "Analysis ran past its latency budget, using raw query.",
+            "refined_keywords": [query],
+            "analyst_failed": True
+        }
+
+async def analyze_query(query: str) -> Dict[str, Any]:
+    """
+    Runs the Vibe Analyst on one query (semantic cache first).
+    Shared by the graph node and the retrieval-only match endpoints.
+    Never raises: failures fall back to the raw query with analyst_failed set.
+    Concurrent calls for the same query share one analysis.
+    """
+    return dict(await _analyst_flight.do(normalize_text(query).casefold(), lambda: _analyze_query(query)))
+
+async def _analyze_query(query: str) -> Dict[str, Any]:
+
+    # Semantic cache: near-duplicate queries reuse an earlier analysis
+    query_embedding = None
+    analyst_cache = get_analyst_cache()
+    if analyst_cache is not None:
+        try:
+            query_embedding = await get_embedding_service().aembed_text(query)
+            hit = analyst_cache.lookup(query_embedding)
+        except Exception as e:
+            logger.warning(f"Analyst cache lookup failed: {e}")
+            hit = None
+        if hit:
+            entry, similarity = hit
+            logger.info(f"Analyst cache hit ({similarity:.3f}) for '{query}' via '{entry['query']}'")
+            return {
+                "analyst_thoughts": entry["payload"]["analyst_thoughts"],
+                "refined_keywords": entry["payload"]["refined_keywords"],
+                "analyst_cache": {
+                    "hit": True,
+                    "similarity": round(similarity, 4),
+                    "matched_query": entry["query"]
+                }
+            }
     
     # Chain of thought prompt
     system_prompt = """You are an expert Fashion Vibe Analyst. 
@@ -39,10 +150,10 @@ async def vibe_analyst_node(state: GraphState) -> Dict[str, Any]:
     3. SEARCH TERMS: A list of 3-5 concise search strings that would work well in a vector database.
     
     Respond in JSON format:
-    {
+    {{
         "thought_process": "Analysis description...",
         "search_terms": ["term1", "term2", "term3"]
-    }
+    }}
     """
     
     prompt = ChatPromptTemplate.from_messages([
@@ -50,49 +161,112 @@ async def vibe_analyst_node(state: GraphState) -> Dict[str, Any]:
         ("user", "{query}")
     ])
     
-    chain = prompt | _llm | JsonOutputParser()
+    llm = get_llm()
+    chain = prompt | llm | JsonOutputParser()
+    usage = _UsageRecorder(_model_name(llm))
     
     try:
-        # Use ainvoke for async
-        result = await chain.ainvoke({"query": query})
-        return {
+        async with OPENAI_CHAT.slot():
+            with span("analyst.llm", "openai", model=usage.model) as s:
+                # Use ainvoke for async
+                invocation = chain.ainvoke({"query": query}, config={"callbacks": [usage]})
+                if settings.ANALYST_TIMEOUT_SECONDS > 0:
+                    invocation = asyncio.wait_for(invocation, timeout=settings.ANALYST_TIMEOUT_SECONDS)
+                result = await invocation
+                usage.record(s)
+        output = {
             "analyst_thoughts": result.get("thought_process", ""),
             "refined_keywords": result.get("search_terms", [])
         }
+        if query_embedding is not None and output["refined_keywords"]:
+            analyst_cache.add(query, query_embedding, output)
+        return output
+    except asyncio.TimeoutError:
+        logger.error(f"Vibe Analyst timed out after {settings.ANALYST_TIMEOUT_SECONDS}s")
+        return {
+            "analyst_thoughts": "Analysis timed out, using raw query.",
+            "refined_keywords": [query],
+            "analyst_failed": True
+        }
     except Exception as e:
         logger.error(f"Vibe Analyst failed: {e}")
         return {
             "analyst_thoughts": "Failed to analyze, using raw query.",
-            "refined_keywords": [query]
+            "refined_keywords": [query],
+            "analyst_failed": True
         }
 
+# --- Speculative Retriever Node ---
+
+@traced_node("speculative_retriever")
+async def speculative_retriever_node(state: GraphState) -> Dict[str, Any]:
+    """
+    Speculative Retriever: searches on the raw user query while the analyst
+    is still running, so provisional products can stream immediately.
+    """
+    logger.info("--- Node: Speculative Retriever ---")
+    diversity = []
+    try:
+        # Same retrieval as the refined search (including diversity
+        # re-ranking), so a raw-query fallback answers the same way
+        results = (await retrieve_many([[state["user_query"]]], tags=state.get("vibe_filter"), diversity=diversity))[0]
+    except Exception as e:
+        # Speculation is best effort; the refined retrieval still runs
+        logger.warning(f"Speculative retrieval failed: {e}")
+        results = []
+    return {"provisional_products": results, "provisional_diversity": diversity[0] if diversity else None}
+
 # --- Retriever Node ---
 
-def retriever_node(state: GraphState) -> Dict[str, Any]:
+@traced_node("retriever")
+async def retriever_node(state: GraphState) -> Dict[str, Any]:
     """
     Retriever Node: Embeds search terms and queries ChromaDB.
+    In multi_query mode each term is searched separately (in one batched
+    round trip) and the rankings are fused, then re-ranked for diversity.
     """
     logger.info("--- Node: Retriever ---")
+    provisional = state.get("provisional_products")
+    if state.get("analyst_failed") and provisional:
+        # The analyst fell back to the raw query, which is exactly what the
+        # speculative search already answered
+        return {"retrieved_products": provisional, "retrieval_diversity": state.get("provisional_diversity")}
+
     keywords = state.get("refined_keywords", [])
     if not keywords:
         keywords = [state["user_query"]]
-        
-    # Combine keywords into a single rich query for embedding
-    combined_query = " ".join(keywords)
+    diversity = []
+    results = (await retrieve_many([keywords], tags=state.get("vibe_filter"), diversity=diversity))[0]
     
-    # Generate embedding
-    query_embedding = _embedding_service.embed_text(combined_query)
-    
-    # Search
-    results = _vector_store.search(query_embedding=query_embedding, n_results=3)
-    
-    return {"retrieved_products": results}
+    return {"retrieved_products": results, "retrieval_diversity": diversity[0] if diversity else None}
 
 # --- Stylist Node ---
 
-async def stylist_node(state: GraphState) -> Dict[str, Any]:
+def templated_pitch(user_query: str, products: List[Dict[str, Any]]) -> str:
+    """
+    A pitch built from product metadata alone, for when the stylist runs
+    out of latency budget.
+    """
+    lines = [f'Here is what we picked for "{user_query}":']
+    for p in products:
+        meta = p.get("metadata", {})
+        line = f"- {meta.get('name', 'Unknown')}"
+        if meta.get("desc"):
+            line += f": {meta['desc']}"
+        if meta.get("vibes"):
+            line += f" (Vibes: {meta['vibes']})"
+        lines.append(line)
+    return "\n".join(lines)
+
+@traced_node("stylist")
+async def stylist_node(state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
     """
     Stylist Agent: Generate a personalized sales pitch.
+    Tokens are emitted as they arrive (_emit_token); concurrent
+    requests with the same prompt follow one shared LLM stream, and a
+    cached pitch for the same products and vibe is replayed instead.
+    If the latency budget runs out first, the pitch is completed from
+    templated_pitch (the shared stream still finishes for the cache).
     """
     logger.info("--- Node: Stylist ---")
     user_query = state["user_query"]
@@ -101,6 +275,19 @@ async def stylist_node(state: GraphState) -> Dict[str, Any]:
     
     if not products:
         return {"stylist_pitch": "I couldn't find any items that match your specific vibe perfectly, but I'm always looking for new styles!"}
+
+    pitch_cache = get_pitch_cache()
+    cache_key = None
+    if pitch_cache is not None:
+        cache_key = pitch_key(products, vibe_key(state.get("refined_keywords") or [user_query]))
+        cached = await pitch_cache.aget(cache_key)
+        PITCH_CACHE_LOOKUPS.labels(result="hit" if cached else "miss").inc()
+        if cached:
+            # Replayed chunk by chunk so the client sees the usual token stream
+            with span("stylist.cache_replay", "node", chunks=len(cached)):
+                for chunk in cached:
+                    await _emit_token(chunk, config)
+            return {"stylist_pitch": "".join(cached)}
     
     # Format products for the prompt
     products_str = ""
@@ -126,13 +313,54 @@ async def stylist_node(state: GraphState) -> Dict[str, Any]:
         ("user", "Write the pitch.")
     ])
     
-    chain = prompt | _llm | StrOutputParser()
-    
-    # Use ainvoke for async
-    response = await chain.ainvoke({
+    llm = get_llm()
+    chain = prompt | llm | StrOutputParser()
+    inputs = {
         "user_query": user_query,
         "analyst_thoughts": analyst_thoughts,
         "products_str": products_str
-    })
+    }
+
+    async def generate():
+        usage = _UsageRecorder(_model_name(llm))
+        chunks = []
+        async with OPENAI_CHAT.slot():
+            with span("stylist.llm", "openai", model=usage.model) as s:
+                # Explicit callbacks detach the shared stream from the
+                # requesting graph run, which may be cancelled first
+                async for chunk in chain.astream(inputs, config={"callbacks": [usage]}):
+                    chunks.append(chunk)
+                    yield chunk
+                usage.record(s)
+        if cache_key is not None:
+            pitch_cache.put(cache_key, [p.get("id") for p in products], chunks, wait=False)
+
+    parts = []
+    with span("stylist.stream", "node") as s:
+        started = time.perf_counter()
+        timeout = budget.remaining(state)
+        try:
+            if timeout is not None and timeout <= 0:
+                # Already late: don't start an LLM call nobody will wait for
+                raise TimeoutError
+            async with asyncio.timeout(timeout):
+                async for chunk in _stylist_flight.stream((user_query, analyst_thoughts, products_str), generate):
+                    if not parts:
+                        ttft = time.perf_counter() - started
+                        s["ttft_ms"] = round(ttft * 1000, 3)
+                        STYLIST_TTFT_SECONDS.observe(ttft)
+                    parts.append(chunk)
+                    await _emit_token(chunk, config)
+        except TimeoutError:
+            if timeout is None:
+                raise
+            s["budget_breach"] = True
+            await _emit_event("budget_breach", budget.breach(state, "stylist", "template"), config)
+            fallback = templated_pitch(user_query, products)
+            if parts:
+                fallback = "\n\n" + fallback
+            parts.append(fallback)
+            await _emit_token(fallback, config)
+        s["chunks"] = len(parts)
     
-    return {"stylist_pitch": response}
+    return {"stylist_pitch": "".join(parts)}
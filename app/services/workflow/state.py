@@ -5,14 +5,29 @@ class GraphState(TypedDict):
     Represents the state of the Vibe Matcher graph.
     """
     user_query: str
+    # Vibe tag filter from the request ({"include": [...], "exclude": [...]})
+    vibe_filter: Optional[Dict[str, List[str]]]
+    # Latency budget: monotonic start time and budget in ms (0/None = none)
+    started_at: Optional[float]
+    latency_budget_ms: Optional[int]
     
     # Analyst Output
     # We store the structured breakdown of the vibe
     analyst_thoughts: Optional[str] 
     refined_keywords: Optional[List[str]]
+    # Set when the analysis came from the semantic cache
+    analyst_cache: Optional[Dict[str, Any]]
+    # Set when the analyst errored, timed out or ran out of budget and fell back to the raw query
+    analyst_failed: Optional[bool]
+    
+    # Speculative Retrieval Output (raw query, before analysis finishes)
+    provisional_products: Optional[List[Dict[str, Any]]]
+    provisional_diversity: Optional[Dict[str, Any]]
     
     # Retrieval Output
     retrieved_products: List[Dict[str, Any]]
+    # Diversity re-ranking summary (lambda, pool size, timings)
+    retrieval_diversity: Optional[Dict[str, Any]]
     
     # Stylist Output
     stylist_pitch: Optional[str]
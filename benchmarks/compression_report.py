@@ -0,0 +1,142 @@
+"""
+Recall@k vs. memory vs. latency report for the compressed numpy index.
+
+Compares reduced embedding dimensions (truncate + renormalize, which is what
+the text-embedding-3 `dimensions` parameter returns) crossed with
+none/int8/pq quantization against exact full-dimension search.
+
+Synthetic vectors are not Matryoshka-ordered like text-embedding-3 output,
+so dimension-reduction recall is only meaningful with --index-dir.
+
+Usage:
+    python -m benchmarks.compression_report                       # synthetic clustered corpus
+    python -m benchmarks.compression_report --index-dir vector_index  # real ingested vectors
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any
+
+import numpy as np
+
+from app.services.numpy_index import NumpyVectorIndex, FORMAT_VERSION
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """
+    Gaussian clusters; uniform random vectors have no neighbourhood
+    structure and make every quantizer look equally bad.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + 0.6 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def load_index_vectors(index_dir: str) -> np.ndarray:
+    with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format: {meta.get('format')}")
+    return np.fromfile(os.path.join(index_dir, "vectors.f32"), dtype=np.float32).reshape(-1, meta["dim"])
+
+
+def shorten(vectors: np.ndarray, dim: int) -> np.ndarray:
+    short = vectors[:, :dim]
+    return short / np.maximum(np.linalg.norm(short, axis=1, keepdims=True), 1e-12)
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: List[set], dim: int, quantization: str,
+             k: int, pq_subspaces: int, rerank: int, workdir: str) -> Dict[str, Any]:
+    path = os.path.join(workdir, f"{dim}-{quantization}")
+    index = NumpyVectorIndex(path, quantization=quantization, pq_subspaces=pq_subspaces, rerank_candidates=rerank)
+    vectors = shorten(corpus, dim)
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), 50000):
+        end = start + 50000
+        index.upsert(ids[start:end], vectors[start:end], [{}] * len(ids[start:end]), [""] * len(ids[start:end]))
+
+    short_queries = shorten(queries, dim)
+    latencies = []
+    recalls = []
+    for q, expected in zip(short_queries, truth):
+        started = time.perf_counter()
+        result = index.search_batch([q], n_results=k)[0]
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(expected & {m["id"] for m in result}) / k)
+
+    codes = index._view[2]
+    # Bytes scanned from RAM per vector; full-precision rows stay on disk
+    # when quantized and are only paged in for re-rank candidates
+    ram_bytes = codes.shape[1] * codes.itemsize if codes is not None else dim * 4
+    shutil.rmtree(path, ignore_errors=True)
+    return {
+        "dimensions": dim,
+        "quantization": quantization,
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "ram_bytes_per_vector": int(ram_bytes),
+        "ram_mb_per_million": round(ram_bytes * 1e6 / 2 ** 20, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", help="Use vectors from an existing numpy index instead of synthetic data")
+    parser.add_argument("--n", type=int, default=100000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic full dimension")
+    parser.add_argument("--dims", default="full,512,256", help="Comma-separated dimensions to test")
+    parser.add_argument("--quantizations", default="none,int8,pq")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-subspaces", type=int, default=64)
+    parser.add_argument("--rerank", type=int, default=100)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = load_index_vectors(args.index_dir) if args.index_dir else synthetic_corpus(args.n, args.dim, clusters=max(10, args.n // 200))
+    full_dim = corpus.shape[1]
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors so every query has true neighbours
+    picks = rng.choice(len(corpus), min(args.queries, len(corpus)), replace=False)
+    queries = corpus[picks] + 0.1 * rng.standard_normal((len(picks), full_dim)).astype(np.float32)
+
+    # Ground truth: exact cosine top-k at full dimension
+    normed = shorten(corpus, full_dim)
+    truth = []
+    for q in shorten(queries, full_dim):
+        scores = normed @ q
+        truth.append({str(i) for i in np.argpartition(-scores, args.k)[:args.k]})
+
+    dims = [full_dim if d == "full" else int(d) for d in args.dims.split(",")]
+    results = []
+    workdir = tempfile.mkdtemp(prefix="compression-report-")
+    try:
+        for dim in dims:
+            for quantization in args.quantizations.split(","):
+                subspaces = args.pq_subspaces
+                while dim % subspaces:
+                    subspaces //= 2
+                results.append(evaluate(corpus, queries, truth, dim, quantization, args.k, subspaces, args.rerank, workdir))
+                print(json.dumps(results[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "corpus": args.index_dir or f"synthetic n={args.n} dim={args.dim}",
+        "vectors": len(corpus),
+        "k": args.k,
+        "rerank_candidates": args.rerank,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Load generator for /api/v1/chat.
+
+At each --concurrency level, keeps that many NDJSON chat streams open
+until --requests have completed, then reports throughput and latency
+percentiles for:
+- ttfp:  time to first product (provisional_products or retrieved_products)
+- ttft:  time to first stylist token
+- total: time to the end of the stream
+
+Ramping through several levels finds a worker's ceiling: the level past
+which throughput stops growing while latency (and 503 load shedding)
+climbs. Run the app against benchmarks.openai_standin so no quota is
+spent; disable ANALYST_CACHE_ENABLED / PITCH_CACHE_ENABLED to measure the
+uncached path.
+
+Usage:
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --concurrency 1,8,32,64 --requests 200
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.suite import ITEMS, VIBES, percentiles
+
+PRODUCT_EVENTS = ("provisional_products", "retrieved_products")
+
+
+def chat_queries(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(VIBES)} {rng.choice(ITEMS)} for the weekend" for _ in range(n)]
+
+
+async def one_chat(client: httpx.AsyncClient, url: str, query: str) -> Dict[str, Any]:
+    """
+    Runs one chat stream; returns its timings (ms) and outcome.
+    """
+    started = time.perf_counter()
+    sample: Dict[str, Any] = {}
+    try:
+        async with client.stream("POST", url, json={"query": query}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                sample["outcome"] = str(response.status_code)
+                return sample
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                elapsed = (time.perf_counter() - started) * 1000
+                kind = event.get("type")
+                if kind in PRODUCT_EVENTS:
+                    sample.setdefault("ttfp_ms", elapsed)
+                elif kind == "token":
+                    sample.setdefault("ttft_ms", elapsed)
+                elif kind == "error":
+                    sample["outcome"] = "stream_error"
+    except httpx.HTTPError as e:
+        sample["outcome"] = type(e).__name__
+        return sample
+    sample["total_ms"] = (time.perf_counter() - started) * 1000
+    sample.setdefault("outcome", "ok")
+    return sample
+
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, requests: int,
+                    queries: List[str]) -> Dict[str, Any]:
+    """
+    `requests` chats with at most `concurrency` in flight.
+    """
+    remaining = iter(range(requests))
+    samples: List[Dict[str, Any]] = []
+
+    async def worker():
+        for i in remaining:
+            samples.append(await one_chat(client, url, queries[i % len(queries)]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+
+    ok = [s for s in samples if s["outcome"] == "ok"]
+    result: Dict[str, Any] = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(ok),
+        "outcomes": dict(Counter(s["outcome"] for s in samples)),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(ok) / seconds, 2) if seconds else 0.0,
+    }
+    for key in ("ttfp", "ttft", "total"):
+        values = [s[f"{key}_ms"] for s in ok if f"{key}_ms" in s]
+        result[key] = percentiles(values) if values else None
+    return result
+
+
+def _summary_line(level: Dict[str, Any]) -> str:
+    def p(key: str, q: str) -> str:
+        return f"{level[key][q]:8.1f}" if level[key] else "       -"
+    return (
+        f"{level['concurrency']:>5} {level['throughput_rps']:>8.2f} {level['ok']:>5}/{level['requests']:<5}"
+        f" {p('ttfp', 'p50_ms')} {p('ttfp', 'p99_ms')} {p('ttft', 'p50_ms')} {p('ttft', 'p95_ms')} {p('ttft', 'p99_ms')}"
+        f" {p('total', 'p50_ms')} {p('total', 'p99_ms')}"
+    )
+
+
+async def run(url: str, levels: List[int], requests: int, warmup: int, timeout: float,
+              seed: int) -> List[Dict[str, Any]]:
+    queries = chat_queries(max(requests, 100), seed=seed)
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        for query in queries[:warmup]:
+            await one_chat(client, url, query)
+        print("  conc      rps    ok/req   ttfp50   ttfp99   ttft50   ttft95   ttft99  total50  total99  (ms)")
+        report = []
+        for concurrency in levels:
+            level = await run_level(client, url, concurrency, requests, queries)
+            print(_summary_line(level))
+            report.append(level)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent NDJSON load generator for /api/v1/chat")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="App base URL")
+    parser.add_argument("--path", default="/api/v1/chat")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels, run in order")
+    parser.add_argument("--requests", type=int, default=100, help="Completed chats per level")
+    parser.add_argument("--warmup", type=int, default=3, help="Sequential chats before measuring")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    report = asyncio.run(run(args.url.rstrip("/") + args.path, levels, args.requests, args.warmup, args.timeout, args.seed))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "levels": report}, f, indent=2)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
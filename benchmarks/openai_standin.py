@@ -0,0 +1,191 @@
+"""
+Local OpenAI stand-in for load tests: no network, no quota.
+
+Serves the two endpoints the app uses, with configurable latency, token
+rate and injected failures:
+- POST /v1/embeddings         hashing-embedder vectors (float or base64)
+- POST /v1/chat/completions   canned analyst JSON / stylist pitch
+                              (benchmarks.standins), streamed as SSE chunks
+                              with a final usage chunk, or in one response
+- GET  /stats                 request and injected-failure counters
+
+Point the app at it with OPENAI_BASE_URL.
+
+Usage:
+    python -m benchmarks.openai_standin --port 9100 --first-token-ms 300 --token-ms 15 --rate-limit-ratio 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn app.main:app --port 8000
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --concurrency 1,8,32,64
+"""
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.standins import HashingEmbedder, canned_reply
+
+
+class StandinConfig:
+    def __init__(self, dim: int = 1536, embed_latency_ms: float = 50.0, first_token_ms: float = 300.0,
+                 token_ms: float = 15.0, tokens: int = 60, rate_limit_ratio: float = 0.0,
+                 error_ratio: float = 0.0, retry_after: float = 1.0, seed: Optional[int] = None):
+        self.dim = dim
+        self.embed_latency_ms = embed_latency_ms
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        self.retry_after = retry_after
+        self.seed = seed
+
+
+def _count_tokens(text: str) -> int:
+    # Rough, but stable: the app only uses usage for metrics
+    return max(1, len(str(text).split()))
+
+
+def create_app(config: StandinConfig) -> FastAPI:
+    app = FastAPI(title="OpenAI stand-in")
+    rng = random.Random(config.seed)
+    embedders: Dict[int, HashingEmbedder] = {}
+    stats = {"embeddings": 0, "chat": 0, "chat_streams": 0, "rate_limited": 0, "errors": 0}
+
+    def injected_failure() -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < config.rate_limit_ratio:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached (stand-in)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after": str(config.retry_after)}
+            )
+        if roll < config.rate_limit_ratio + config.error_ratio:
+            stats["errors"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Injected server error (stand-in)", "type": "server_error"}}
+            )
+        return None
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["embeddings"] += 1
+        failure = injected_failure()
+        if failure is not None:
+            return failure
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = body.get("dimensions") or config.dim
+        embedder = embedders.setdefault(dim, HashingEmbedder(dim))
+        if config.embed_latency_ms:
+            await asyncio.sleep(config.embed_latency_ms / 1000)
+
+        data = []
+        for i, text in enumerate(texts):
+            vector = embedder._vector(str(text))
+            if body.get("encoding_format") == "base64":
+                # The openai SDK asks for base64 by default
+                vector = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(_count_tokens(t) for t in texts)
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": data,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat"] += 1
+        failure = injected_failure()
+        if failure is not None:
+            return failure
+
+        messages: List[Dict[str, Any]] = body.get("messages", [])
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user = messages[-1].get("content", "") if messages else ""
+        chunks = canned_reply(str(system), str(user), config.tokens)
+        prompt_tokens = sum(_count_tokens(m.get("content", "")) for m in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(chunks), "total_tokens": prompt_tokens + len(chunks)}
+        completion_id = f"chatcmpl-standin-{stats['chat']}"
+        created = int(time.time())
+        model = body.get("model", "stand-in")
+
+        if not body.get("stream"):
+            await asyncio.sleep((config.first_token_ms + config.token_ms * (len(chunks) - 1)) / 1000)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(chunks)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        stats["chat_streams"] += 1
+
+        def frame(choices: List[Dict[str, Any]], **extra) -> str:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": choices, **extra}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            for i, text in enumerate(chunks):
+                await asyncio.sleep((config.first_token_ms if i == 0 else config.token_ms) / 1000)
+                delta = {"role": "assistant", "content": text} if i == 0 else {"content": text}
+                yield frame([{"index": 0, "delta": delta, "finish_reason": None}])
+            yield frame([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield frame([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding size when the request sets no dimensions")
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=15.0, help="Delay between streamed chunks")
+    parser.add_argument("--tokens", type=int, default=60, help="Chunks per stylist pitch")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of injected 429s, seconds")
+    parser.add_argument("--seed", type=int, help="Seed for failure injection")
+    args = parser.parse_args()
+
+    import uvicorn
+    config = StandinConfig(
+        dim=args.dim,
+        embed_latency_ms=args.embed_latency_ms,
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        tokens=args.tokens,
+        rate_limit_ratio=args.rate_limit_ratio,
+        error_ratio=args.error_ratio,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
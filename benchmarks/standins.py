@@ -0,0 +1,159 @@
+"""
+Deterministic, offline stand-ins for the OpenAI-backed clients.
+
+HashingEmbedder replaces EmbeddingService (signed feature hashing of word
+unigrams and bigrams), FakeStreamingChatModel replaces ChatOpenAI (canned
+analyst JSON / stylist pitch, streamed with configurable latency). Both
+are installed through the app.services.clients setters.
+"""
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.services import clients
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Drop-in for EmbeddingService. Texts sharing words land close together,
+    which is enough for retrieval to behave plausibly. `latency_ms` is
+    slept once per call to mimic an embeddings round trip.
+    """
+
+    def __init__(self, dim: int = 256, latency_ms: float = 0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.model = f"hashing-{dim}"
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        words = _WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in features or [text]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = float(np.linalg.norm(vec))
+        if norm == 0:
+            vec[0] = norm = 1.0
+        return (vec / norm).tolist()
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+    def embed_texts(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_text(self, text: str) -> List[float]:
+        return (await self.aembed_texts([text]))[0]
+
+    async def aembed_texts(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "texts": self.texts}
+
+
+def canned_reply(system: str, user: str, tokens: int) -> List[str]:
+    """
+    The stand-in reply as stream chunks: analyst JSON for the analyst
+    prompt, else a `tokens`-chunk pitch. Shared with the HTTP stand-in
+    (benchmarks.openai_standin).
+    """
+    if "Fashion Vibe Analyst" in system:
+        words = _WORD.findall(user.lower()) or ["fashion"]
+        reply = json.dumps({
+            "thought_process": f"The user wants a {' '.join(words)} look.",
+            "search_terms": [f"{w} outfit" for w in words[:3]] + [" ".join(words)],
+        })
+        # JSON is split into roughly word-sized chunks
+        return [reply[i:i + 8] for i in range(0, len(reply), 8)]
+    return [f"word{i} " for i in range(tokens)]
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Chat model stand-in. Answers the analyst prompt ("Fashion Vibe
+    Analyst"; the stylist prompt also mentions the Vibe Analyst) with JSON
+    search terms derived from the query and everything else with a
+    fixed-length pitch, emitting `tokens` chunks after `first_token_ms` and
+    then one every `token_ms`.
+    """
+    first_token_ms: float = 300.0
+    token_ms: float = 15.0
+    tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        system = str(messages[0].content) if messages else ""
+        user = str(messages[-1].content) if messages else ""
+        return canned_reply(system, user, self.tokens)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = self._reply(messages)
+        time.sleep((self.first_token_ms + self.token_ms * (len(chunks) - 1)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(chunks)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = self._reply(messages)
+        await asyncio.sleep((self.first_token_ms + self.token_ms * (len(chunks) - 1)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(chunks)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for i, text in enumerate(self._reply(messages)):
+            time.sleep((self.first_token_ms if i == 0 else self.token_ms) / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        for i, text in enumerate(self._reply(messages)):
+            await asyncio.sleep((self.first_token_ms if i == 0 else self.token_ms) / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+
+def install(embedder: Optional[HashingEmbedder] = None, llm: Optional[BaseChatModel] = None,
+            vector_store=None, analyst_cache: bool = False, pitch_cache: bool = False) -> Dict[str, Any]:
+    """
+    Points the shared clients at the stand-ins. The analyst and pitch
+    caches are off by default so repeated benchmark queries still exercise
+    the analyst and the stylist.
+    """
+    embedder = embedder or HashingEmbedder()
+    llm = llm or FakeStreamingChatModel()
+    clients.get_embedding_service.set_instance(embedder)
+    clients.get_llm.set_instance(llm)
+    if vector_store is not None:
+        clients.get_vector_store.set_instance(vector_store)
+    if not analyst_cache:
+        clients.get_analyst_cache.set_instance(None)
+    if not pitch_cache:
+        clients.get_pitch_cache.set_instance(None)
+    return {"embedding_service": embedder, "llm": llm, "vector_store": vector_store}
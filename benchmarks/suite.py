@@ -0,0 +1,424 @@
+"""
+Offline component benchmarks: no network, no API key.
+
+Embeddings come from a deterministic hashing embedder and the chat model
+is a fake streaming model with configurable latency (benchmarks.standins),
+so numbers reflect this codebase rather than OpenAI.
+
+Sections:
+- search:    VectorStore.search latency percentiles at each --sizes corpus
+             (numpy backend, synthetic clustered vectors)
+- ingestion: IngestionPipeline.run_streaming throughput over a generated
+             JSONL catalog
+- lexical:   BM25 index size and vector / hybrid / prefilter search latency
+- graph:     per-node and end-to-end latency of vibe_graph, plus stylist
+             time to first token
+- stream:    process CPU time, bytes and frames per /chat stream, for the
+             "events" (astream_events) and "lean" stream modes
+Each section also records the process peak RSS once it has finished.
+
+Usage:
+    python -m benchmarks.suite                                   # everything, saved under benchmarks/results/
+    python -m benchmarks.suite --sections search --sizes 10000,100000
+    python -m benchmarks.suite --compare benchmarks/results/OLD.json   # run and diff against a baseline
+    python -m benchmarks.suite --compare OLD.json NEW.json             # diff two saved reports
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import clients
+from benchmarks.compression_report import synthetic_corpus
+from benchmarks.standins import HashingEmbedder, FakeStreamingChatModel, install
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+GRAPH_NODES = ("vibe_analyst", "speculative_retriever", "retriever", "stylist")
+VIBES = ["cozy", "boho", "urban", "minimal", "cyberpunk", "preppy", "sporty", "vintage", "grunge", "romantic"]
+ITEMS = ["hoodie", "dress", "jacket", "sneakers", "skirt", "coat", "blazer", "jeans", "sweater", "boots"]
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples_ms)
+    return {
+        "n": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def fresh_numpy_store(path: str, lexical: bool = True):
+    """
+    A VectorStore over an empty numpy index at `path`.
+    """
+    from app.services import vector_store as vector_store_module
+    settings.NUMPY_INDEX_DIR = path
+    settings.LEXICAL_INDEX_ENABLED = lexical
+    # Drop indexes from earlier sections so their memory can be reclaimed
+    vector_store_module._backends.clear()
+    return vector_store_module.VectorStore(backend="numpy")
+
+
+def write_catalog(path: str, n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            vibes = [VIBES[j] for j in rng.choice(len(VIBES), 3, replace=False)]
+            item = ITEMS[i % len(ITEMS)]
+            f.write(json.dumps({
+                "id": f"p{i}",
+                "name": f"{vibes[0].title()} {item.title()} {i}",
+                "desc": f"A {vibes[0]} {item} with {vibes[1]} details for a {vibes[2]} look.",
+                "vibes": vibes,
+            }) + "\n")
+
+
+def bench_search(workdir: str, sizes: List[int], dim: int, queries: int, k: int) -> List[Dict[str, Any]]:
+    results = []
+    for n in sizes:
+        # Synthetic vectors have no text; the lexical section covers BM25
+        store = fresh_numpy_store(os.path.join(workdir, f"search-{n}"), lexical=False)
+        corpus = synthetic_corpus(n, dim, clusters=max(10, n // 200))
+        started = time.perf_counter()
+        for start in range(0, n, 50000):
+            chunk = corpus[start:start + 50000]
+            store.upsert_products(
+                ids=[f"v{i}" for i in range(start, start + len(chunk))],
+                embeddings=chunk,
+                metadatas=[{}] * len(chunk),
+                documents=[""] * len(chunk)
+            )
+        build_seconds = time.perf_counter() - started
+
+        rng = np.random.default_rng(1)
+        picks = rng.choice(n, min(queries, n), replace=False)
+        query_vectors = corpus[picks] + 0.1 * rng.standard_normal((len(picks), dim)).astype(np.float32)
+        del corpus
+        store.search(query_vectors[0].tolist(), n_results=k)  # warm up
+        latencies = []
+        for q in query_vectors:
+            q = q.tolist()
+            t = time.perf_counter()
+            store.search(q, n_results=k)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+        results.append({
+            "products": n,
+            "dim": dim,
+            "k": k,
+            "quantization": settings.VECTOR_QUANTIZATION,
+            "build_seconds": round(build_seconds, 3),
+            "latency": percentiles(latencies),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        print(json.dumps({"search": results[-1]}))
+        shutil.rmtree(os.path.join(workdir, f"search-{n}"), ignore_errors=True)
+    return results
+
+
+def bench_lexical(workdir: str, products: int, queries: int, k: int, embedder: HashingEmbedder) -> Dict[str, Any]:
+    """
+    Lexical index size and latency of vector vs. hybrid vs. prefilter
+    search over a generated catalog.
+    """
+    from app.services.catalog import product_metadata, product_text
+    source = os.path.join(workdir, "lexical-catalog.jsonl")
+    write_catalog(source, products, seed=4)
+    with open(source, "r", encoding="utf-8") as f:
+        catalog = [json.loads(line) for line in f]
+    store = fresh_numpy_store(os.path.join(workdir, "lexical"))
+    for start in range(0, products, 5000):
+        chunk = catalog[start:start + 5000]
+        store.upsert_products(
+            ids=[p["id"] for p in chunk],
+            embeddings=embedder.embed_texts([product_text(p) for p in chunk]),
+            metadatas=[product_metadata(p) for p in chunk],
+            documents=[product_text(p) for p in chunk]
+        )
+    index = store.flush_lexical()
+
+    rng = np.random.default_rng(5)
+    texts = [f"{VIBES[rng.integers(len(VIBES))]} {ITEMS[rng.integers(len(ITEMS))]}" for _ in range(queries)]
+    embeddings = embedder.embed_texts(texts)
+    result = {"products": products, "index": index}
+    for mode in ("vector", "hybrid", "prefilter"):
+        # Force the prefilter path regardless of catalog size
+        settings.LEXICAL_PREFILTER_MIN_PRODUCTS = 0 if mode == "prefilter" else 10 ** 12
+        latencies = []
+        for text, embedding in zip(texts, embeddings):
+            t = time.perf_counter()
+            store.search(embedding, n_results=k, query_text=text, mode=mode)
+            latencies.append((time.perf_counter() - t) * 1000)
+        result[mode] = percentiles(latencies)
+    latencies = []
+    for text in texts:
+        t = time.perf_counter()
+        store.lexical.search(text, settings.LEXICAL_PREFILTER_CANDIDATES)
+        latencies.append((time.perf_counter() - t) * 1000)
+    result["bm25_only"] = percentiles(latencies)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps({"lexical": {"index": index, "hybrid_p50_ms": result["hybrid"]["p50_ms"]}}))
+    return result
+
+
+def bench_ingestion(workdir: str, products: int, embedder: HashingEmbedder) -> Dict[str, Any]:
+    from app.services.ingestion import IngestionPipeline
+    source = os.path.join(workdir, "catalog.jsonl")
+    write_catalog(source, products)
+    settings.INGEST_CHECKPOINT_PATH = os.path.join(workdir, "ingest_checkpoint.json")
+    pipeline = IngestionPipeline(embedding_service=embedder, vector_store=fresh_numpy_store(os.path.join(workdir, "ingest")))
+
+    started = time.perf_counter()
+    stats = asyncio.run(pipeline.run_streaming(source, resume=False))
+    elapsed = time.perf_counter() - started
+    # Second pass: every product is unchanged, so this measures the diff path
+    started = time.perf_counter()
+    asyncio.run(pipeline.run_streaming(source, resume=False))
+    resync_elapsed = time.perf_counter() - started
+
+    result = {
+        "products": stats["products"],
+        "seconds": round(elapsed, 3),
+        "products_per_second": round(stats["products"] / elapsed, 1),
+        "unchanged_resync_seconds": round(resync_elapsed, 3),
+        "embedding_latency_ms": embedder.latency_ms,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(json.dumps({"ingestion": result}))
+    return result
+
+
+async def _graph_run(graph, query: str) -> Dict[str, float]:
+    started = time.perf_counter()
+    node_started: Dict[str, float] = {}
+    timings: Dict[str, float] = {}
+    async for event in graph.astream_events({"user_query": query}, version="v2"):
+        name = event.get("name")
+        now = time.perf_counter()
+        if name in GRAPH_NODES and event.get("metadata", {}).get("langgraph_node") == name:
+            if event["event"] == "on_chain_start":
+                node_started[name] = now
+            elif event["event"] == "on_chain_end":
+                timings[f"{name}_ms"] = (now - node_started[name]) * 1000
+        elif event["event"] == "on_custom_event" and name == "stylist_token" and "stylist_ttft_ms" not in timings:
+            timings["stylist_ttft_ms"] = (now - started) * 1000
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def _install_graph_catalog(workdir: str, name: str, catalog_size: int, embedder: HashingEmbedder):
+    """
+    Ingests a generated catalog into a fresh numpy store and points the
+    shared vector store at it (the stand-ins installed by main() stay).
+    """
+    from app.services.ingestion import IngestionPipeline
+    source = os.path.join(workdir, f"{name}-catalog.jsonl")
+    write_catalog(source, catalog_size, seed=2)
+    settings.INGEST_CHECKPOINT_PATH = os.path.join(workdir, f"{name}_checkpoint.json")
+    store = fresh_numpy_store(os.path.join(workdir, name))
+    asyncio.run(IngestionPipeline(embedding_service=embedder, vector_store=store).run_streaming(source, resume=False))
+    clients.get_vector_store.set_instance(store)
+
+
+def _chat_queries(runs: int) -> List[str]:
+    rng = np.random.default_rng(3)
+    return [f"{VIBES[rng.integers(len(VIBES))]} {ITEMS[rng.integers(len(ITEMS))]} for the weekend" for _ in range(runs)]
+
+
+def bench_graph(workdir: str, runs: int, catalog_size: int, embedder: HashingEmbedder) -> Dict[str, Any]:
+    from app.services.workflow.graph import create_workflow
+    _install_graph_catalog(workdir, "graph", catalog_size, embedder)
+
+    graph = create_workflow()
+    queries = _chat_queries(runs)
+
+    async def run_all():
+        return [await _graph_run(graph, q) for q in queries]
+
+    samples = asyncio.run(run_all())
+    result = {"runs": runs, "catalog_products": catalog_size, "speculative": settings.SPECULATIVE_RETRIEVAL}
+    for key in sorted({k for s in samples for k in s}):
+        result[key.replace("_ms", "")] = percentiles([s[key] for s in samples if key in s])
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps({"graph": {"total": result["total"]}}))
+    return result
+
+
+def bench_stream(workdir: str, runs: int, catalog_size: int, embedder: HashingEmbedder) -> Dict[str, Any]:
+    """
+    Process CPU time, bytes and frames per /chat stream for each
+    CHAT_STREAM_MODE, run through the endpoint's generator without HTTP.
+    """
+    from app.api.endpoints import chat_stream
+    from app.models.domain import MatchRequest
+    _install_graph_catalog(workdir, "stream", catalog_size, embedder)
+    queries = _chat_queries(runs)
+
+    async def run_mode(mode: str) -> Dict[str, Any]:
+        cpu, wall, sent, frames = [], [], [], []
+        for query in queries:
+            started, cpu_started = time.perf_counter(), time.process_time()
+            size = count = 0
+            async for frame in chat_stream(MatchRequest(query=query), mode=mode):
+                size += len(frame)
+                count += 1
+            cpu.append((time.process_time() - cpu_started) * 1000)
+            wall.append((time.perf_counter() - started) * 1000)
+            sent.append(size)
+            frames.append(count)
+        return {
+            "cpu": percentiles(cpu),
+            "total": percentiles(wall),
+            "bytes_per_chat": round(float(np.mean(sent)), 1),
+            "frames_per_chat": round(float(np.mean(frames)), 1),
+        }
+
+    # Spans would add their own logging cost to both modes
+    log_spans, settings.LOG_SPANS = settings.LOG_SPANS, False
+    try:
+        result = {mode: asyncio.run(run_mode(mode)) for mode in ("events", "lean")}
+    finally:
+        settings.LOG_SPANS = log_spans
+    result.update({
+        "runs": runs,
+        "token_frame_ms": settings.CHAT_TOKEN_FRAME_MS,
+        "token_frame_chars": settings.CHAT_TOKEN_FRAME_CHARS,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    print(json.dumps({"stream": {mode: result[mode]["cpu"] for mode in ("events", "lean")}}))
+    return result
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    label = item.get("products", len(flat))
+                    flat.update(_flatten(item, f"{prefix}{key}[{label}]."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Lines of "metric: old -> new (+x%)" for every timing, throughput and
+    memory metric present in both reports.
+    """
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(("_ms", "_seconds", "_per_second", "_mb")) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        lines.append(f"{key}: {old[key]} -> {new[key]} ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default="search,ingestion,lexical,graph,stream")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Corpus sizes for the search section")
+    parser.add_argument("--dim", type=int, default=256, help="Vector dimension for every section")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per corpus size")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ingest-products", type=int, default=20000)
+    parser.add_argument("--lexical-products", type=int, default=100000)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated latency per embeddings call")
+    parser.add_argument("--graph-runs", type=int, default=20)
+    parser.add_argument("--graph-catalog", type=int, default=2000)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=15.0)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<git revision>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="REPORT",
+                        help="Baseline report to diff against; with a second report, diff the two without running")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 1:
+        with open(args.compare[0], "r", encoding="utf-8") as f, open(args.compare[1], "r", encoding="utf-8") as g:
+            print("\n".join(compare(json.load(f), json.load(g))))
+        return
+
+    sections = args.sections.split(",")
+    embedder = HashingEmbedder(dim=args.dim, latency_ms=args.embed_latency_ms)
+    install(embedder=embedder, llm=FakeStreamingChatModel(
+        first_token_ms=args.llm_first_token_ms, token_ms=args.llm_token_ms, tokens=args.llm_tokens
+    ))
+
+    results: Dict[str, Any] = {}
+    workdir = tempfile.mkdtemp(prefix="vibe-bench-")
+    try:
+        # Smallest sections first: peak RSS is a process-wide high-water mark
+        if "graph" in sections:
+            results["graph"] = bench_graph(workdir, args.graph_runs, args.graph_catalog, embedder)
+        if "stream" in sections:
+            results["stream"] = bench_stream(workdir, args.graph_runs, args.graph_catalog, embedder)
+        if "ingestion" in sections:
+            results["ingestion"] = bench_ingestion(workdir, args.ingest_products, embedder)
+        if "lexical" in sections:
+            results["lexical"] = bench_lexical(workdir, args.lexical_products, args.queries, args.k, embedder)
+        if "search" in sections:
+            sizes = sorted(int(s) for s in args.sizes.split(","))
+            results["search"] = bench_search(workdir, sizes, args.dim, args.queries, args.k)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{revision or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -80,7 +80,8 @@ function App() {
                         else if (json.type === 'analyst_keywords') {
                             setCurrentKeywords(json.data);
                         }
-                        else if (json.type === 'retrieved_products') {
+                        else if (json.type === 'provisional_products' || json.type === 'retrieved_products') {
+                            // Provisional (raw-query) matches are replaced by the refined ones
                             setCurrentRetrievedProducts(json.data);
                         }
                         else if (json.type === 'token') {
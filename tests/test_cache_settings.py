@@ -0,0 +1,49 @@
+from app.core.config import Settings
+from app.services import embedding_cache, pitch_cache, semantic_cache
+
+
+def _env_settings(monkeypatch, tmp_path, **env):
+    # Settings read from the environment only, not from a local .env
+    monkeypatch.chdir(tmp_path)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return Settings()
+
+
+def test_embedding_cache_disk_tier_can_be_disabled_from_env(monkeypatch, tmp_path):
+    settings = _env_settings(monkeypatch, tmp_path, EMBEDDING_CACHE_DISK_ENABLED="false")
+    monkeypatch.setattr(embedding_cache, "settings", settings)
+
+    cache = embedding_cache.EmbeddingCache.from_settings()
+    assert cache._db is None
+    assert not (tmp_path / settings.EMBEDDING_CACHE_DB).exists()
+
+
+def test_empty_embedding_cache_db_env_is_ignored(monkeypatch, tmp_path):
+    settings = _env_settings(monkeypatch, tmp_path, EMBEDDING_CACHE_DB="")
+    assert settings.EMBEDDING_CACHE_DB == "embedding_cache.db"
+    monkeypatch.setattr(embedding_cache, "settings", settings)
+
+    cache = embedding_cache.EmbeddingCache.from_settings()
+    assert cache._db is not None
+    cache._db.close()
+
+
+def test_analyst_cache_can_stay_in_memory_from_env(monkeypatch, tmp_path):
+    settings = _env_settings(monkeypatch, tmp_path, ANALYST_CACHE_PERSIST="false")
+    monkeypatch.setattr(semantic_cache, "settings", settings)
+
+    cache = semantic_cache.SemanticCache.from_settings()
+    assert cache.path is None
+    cache.flush()
+    assert not (tmp_path / settings.ANALYST_CACHE_PATH).exists()
+
+
+def test_pitch_cache_can_stay_in_memory_from_env(monkeypatch, tmp_path):
+    settings = _env_settings(monkeypatch, tmp_path, PITCH_CACHE_PERSIST="false")
+    monkeypatch.setattr(pitch_cache, "settings", settings)
+
+    cache = pitch_cache.PitchCache.from_settings()
+    cache.put("key", ["p1"], ["A pitch."])
+    assert cache.get("key") is not None
+    assert not (tmp_path / settings.PITCH_CACHE_DB).exists()
@@ -0,0 +1,50 @@
+import asyncio
+import gc
+
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+def _fetcher(delay: float):
+    async def fetch(texts):
+        await asyncio.sleep(delay)
+        return {text: [float(len(text))] for text in texts}
+    return fetch
+
+
+def test_in_flight_batch_survives_garbage_collection():
+    async def main():
+        batcher = EmbeddingBatcher(_fetcher(0.05), max_batch=2, max_wait_ms=1000)
+        waiter = asyncio.ensure_future(batcher.embed(["a", "bb"]))
+        await asyncio.sleep(0.01)
+        assert len(batcher._sends) == 1
+        gc.collect()
+        assert await asyncio.wait_for(waiter, 1) == {"a": [1.0], "bb": [2.0]}
+        assert not batcher._sends
+
+    asyncio.run(main())
+
+
+def test_aclose_sends_pending_texts():
+    async def main():
+        batcher = EmbeddingBatcher(_fetcher(0), max_batch=10, max_wait_ms=60000)
+        waiter = asyncio.ensure_future(batcher.embed(["abc"]))
+        await asyncio.sleep(0)
+        await batcher.aclose()
+        assert await waiter == {"abc": [3.0]}
+
+    asyncio.run(main())
+
+
+def test_aclose_cancels_sends_past_the_timeout():
+    async def main():
+        batcher = EmbeddingBatcher(_fetcher(60), max_batch=1, max_wait_ms=1000)
+        waiter = asyncio.ensure_future(batcher.embed(["a"]))
+        await asyncio.sleep(0)
+        await batcher.aclose(timeout=0.01)
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not batcher._sends
+
+    asyncio.run(main())
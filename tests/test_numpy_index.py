@@ -0,0 +1,51 @@
+import numpy as np
+
+from app.services.numpy_index import NumpyVectorIndex
+
+
+def _chunk(rng, start, n, dim=32):
+    ids = [f"p{i}" for i in range(start, start + n)]
+    vectors = rng.standard_normal((n, dim)).astype(np.float32).tolist()
+    return ids, vectors, [{"name": _id} for _id in ids], ["" for _ in ids]
+
+
+def _ingest(index, rng, chunks, size):
+    for c in range(chunks):
+        ids, vectors, metadatas, documents = _chunk(rng, c * size, size)
+        index.upsert(ids, vectors, metadatas, documents)
+
+
+def test_quantizer_refits_as_chunks_arrive(tmp_path):
+    rng = np.random.default_rng(0)
+    index = NumpyVectorIndex(str(tmp_path), quantization="pq", pq_subspaces=8, train_sample=1000)
+    _ingest(index, rng, chunks=6, size=100)
+
+    # Trained on a sample of the whole index, not just the first chunk
+    assert index._quantizer.trained_rows > 100
+    assert index._quantizer.centroids.shape[1] > 100
+    assert index._codes_len == 600
+
+    # The refit quantizer and its codes survive a reopen
+    reopened = NumpyVectorIndex(str(tmp_path), quantization="pq", pq_subspaces=8, train_sample=1000)
+    assert reopened._quantizer.trained_rows == index._quantizer.trained_rows
+    np.testing.assert_array_equal(reopened._codes[:600], index._codes[:600])
+
+
+def test_quantizer_stops_refitting_at_train_sample(tmp_path):
+    rng = np.random.default_rng(0)
+    index = NumpyVectorIndex(str(tmp_path), quantization="int8", train_sample=200)
+    _ingest(index, rng, chunks=10, size=100)
+
+    assert index._quantizer.trained_rows == 200
+    assert index._codes_len == 1000
+
+
+def test_refit_codes_match_a_fresh_encode(tmp_path):
+    rng = np.random.default_rng(0)
+    index = NumpyVectorIndex(str(tmp_path), quantization="int8", train_sample=1000)
+    _ingest(index, rng, chunks=4, size=100)
+
+    vectors = np.asarray(index._view[0])
+    np.testing.assert_array_equal(index._codes[:400], index._quantizer.encode(vectors))
+    ids, vectors, _, _ = _chunk(np.random.default_rng(0), 0, 1)
+    assert index.search_batch(vectors, n_results=1)[0][0]["id"] == ids[0]